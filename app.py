@@ -1,29 +1,400 @@
 """
 Aplicação Flask para gerenciamento de produtos
 """
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from produto_manager import ProdutoManager
+from flask import (
+    Flask,
+    Response,
+    before_render_template,
+    g,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    flash,
+    jsonify,
+    session,
+    stream_with_context,
+    template_rendered,
+)
+from flask.json.provider import DefaultJSONProvider
+from collections.abc import Mapping
+from produto_manager import ProdutoManager, CAMPOS_PRODUTO, TAMANHO_PAGINA_PADRAO
+from cache_respostas import CacheRespostas
+import codec
+import metricas
+from perfilador import CAPACIDADE_PADRAO, PerfiladorRequisicoes
+from reservas import TTL_RESERVA_PADRAO, ReservaInexistente
+from eventos import CAPACIDADE_PADRAO as CAPACIDADE_EVENTOS
+from eventos import EventosPerdidos
+from eventos import formatar as formatar_evento
+from idempotencia import CAPACIDADE_PADRAO as CAPACIDADE_IDEMPOTENCIA
+from idempotencia import TTL_PADRAO as TTL_IDEMPOTENCIA
+from idempotencia import TAMANHO_MAXIMO_CHAVE, CacheIdempotencia, ConflitoIdempotencia
+from idempotencia import impressao as impressao_requisicao
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional
+import csv
+import hmac
+import io
 import os
+import time
+
+
+class ProvedorJson(DefaultJSONProvider):
+    """Provedor JSON que serializa os produtos do gerenciador como objetos"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+    def response(self, *args, **kwargs):
+        with metricas.fase("json"):
+            return super().response(*args, **kwargs)
+
 
 app = Flask(__name__)
+app.json = ProvedorJson(app)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
 
+# Maior página aceita pelos endpoints de listagem
+LIMITE_MAXIMO_PAGINA = 1000
+
 # Inicializa o gerenciador de produtos
-manager = ProdutoManager()
+# PRODUTOS_ARQUIVO escolhe o armazenamento (.json ou .db para SQLite) e
+# PRODUTOS_JOURNAL=1 ativa o modo journal (log de alterações + compactação)
+# e PRODUTOS_FSYNC define quando as gravações vão para o disco ("sempre",
+# "nunca" ou um intervalo como "100ms"). PRODUTOS_GRUPO_MS ativa a gravação
+# em grupo, juntando as alterações de até esse intervalo em uma gravação
+# (no máximo PRODUTOS_GRUPO_TAMANHO registros); use com um único worker.
+# PRODUTOS_RESERVA_TTL é a validade (em segundos) das reservas de estoque
+# feitas na prévia da compra; as reservas são compartilhadas pelos workers
+# em um log ao lado do arquivo de dados (PRODUTOS_ARQUIVO + ".reservas").
+# PRODUTOS_EVENTOS_CAPACIDADE é quantos eventos de alteração ficam
+# disponíveis para retomada em /api/eventos
+_atraso_grupo = os.environ.get("PRODUTOS_GRUPO_MS")
+manager = ProdutoManager(
+    os.environ.get("PRODUTOS_ARQUIVO", "produtos.json"),
+    journal=os.environ.get("PRODUTOS_JOURNAL") == "1",
+    fsync=os.environ.get("PRODUTOS_FSYNC", "sempre"),
+    atraso_gravacao=float(_atraso_grupo) / 1000 if _atraso_grupo else None,
+    tamanho_lote_gravacao=int(os.environ.get("PRODUTOS_GRUPO_TAMANHO", 256)),
+    ttl_reserva=float(os.environ.get("PRODUTOS_RESERVA_TTL", TTL_RESERVA_PADRAO)),
+    capacidade_eventos=int(os.environ.get("PRODUTOS_EVENTOS_CAPACIDADE", CAPACIDADE_EVENTOS)),
+)
+
+
+# PRODUTOS_SERVER_TIMING=0 omite o cabeçalho Server-Timing das respostas
+# (as métricas continuam em /metrics)
+SERVER_TIMING = os.environ.get("PRODUTOS_SERVER_TIMING", "1") != "0"
+
+DURACAO_REQUISICOES = metricas.REGISTRO.histograma(
+    "produtos_requisicao_duracao_segundos", "Duração das requisições por rota", ("rota", "metodo")
+)
+REQUISICOES = metricas.REGISTRO.contador(
+    "produtos_requisicoes_total", "Requisições atendidas", ("rota", "metodo", "status")
+)
+
+
+@app.before_request
+def iniciar_medicao():
+    """Marca o início da requisição e passa a acumular as fases dela"""
+    g.inicio_requisicao = time.perf_counter()
+    metricas.iniciar_requisicao()
+
+
+# Perfis de requisições (opcional): PRODUTOS_PERFIL_FRACAO executa essa
+# fração das requisições sob cProfile e PRODUTOS_PERFIL_LENTO_MS guarda a
+# amostragem de pilhas de toda requisição que durar pelo menos esse tempo.
+# Os últimos PRODUTOS_PERFIL_CAPACIDADE perfis ficam em /admin/perfis, que
+# exige o cabeçalho X-Admin-Token igual a PRODUTOS_ADMIN_TOKEN
+def _criar_perfilador():
+    fracao = float(os.environ.get("PRODUTOS_PERFIL_FRACAO", 0))
+    lento = os.environ.get("PRODUTOS_PERFIL_LENTO_MS")
+    if not fracao and not lento:
+        return None
+    return PerfiladorRequisicoes(
+        fracao,
+        float(lento) / 1000 if lento else None,
+        int(os.environ.get("PRODUTOS_PERFIL_CAPACIDADE", CAPACIDADE_PADRAO)),
+    )
+
+
+perfilador = _criar_perfilador()
+TOKEN_ADMIN = os.environ.get("PRODUTOS_ADMIN_TOKEN")
+
+
+@app.before_request
+def iniciar_perfil():
+    """Começa o perfil da requisição, se ela for sorteada ou houver limite de latência"""
+    if (
+        perfilador is not None
+        and not request.path.startswith("/admin/")
+        and request.path != "/api/eventos"
+    ):
+        g.coleta_perfil = perfilador.iniciar()
+
+
+@app.teardown_request
+def concluir_perfil(erro=None):
+    """Encerra o perfil da requisição (depois da resposta, inclusive em streaming)"""
+    coleta = g.pop("coleta_perfil", None)
+    if coleta is not None:
+        perfilador.concluir(
+            coleta,
+            request.method,
+            request.full_path.rstrip("?"),
+            request.url_rule.rule if request.url_rule else "<desconhecida>",
+            500 if erro is not None else g.get("status_resposta", 0),
+        )
+
+
+@app.before_request
+def sincronizar_catalogo():
+    """Aplica as alterações gravadas por outros workers antes de cada requisição"""
+    with metricas.fase("sincronizar"):
+        manager.sincronizar()
+
+
+@app.after_request
+def registrar_medicao(resposta):
+    """Registra a duração da requisição por rota e informa as fases em Server-Timing"""
+    total = time.perf_counter() - g.pop("inicio_requisicao", time.perf_counter())
+    fases = metricas.encerrar_requisicao()
+    rota = request.url_rule.rule if request.url_rule else "<desconhecida>"
+    DURACAO_REQUISICOES.observar(total, rota, request.method)
+    REQUISICOES.incrementar(1, rota, request.method, str(resposta.status_code))
+    g.status_resposta = resposta.status_code
+    if SERVER_TIMING:
+        resposta.headers["Server-Timing"] = metricas.server_timing(fases, total)
+    return resposta
+
+
+@before_render_template.connect_via(app)
+def _iniciar_renderizacao(sender, template, context, **extra):
+    g.inicio_renderizacao = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _registrar_renderizacao(sender, template, context, **extra):
+    inicio = g.pop("inicio_renderizacao", None)
+    if inicio is not None:
+        metricas.registrar_fase("render", time.perf_counter() - inicio)
+
+
+# Respostas das listagens, reaproveitadas enquanto o catálogo não muda
+cache = CacheRespostas()
+
+metricas.REGISTRO.medidor(
+    "produtos_catalogo_produtos", "Produtos no catálogo", lambda: len(manager.produtos)
+)
+metricas.REGISTRO.medidor(
+    "produtos_cache_respostas_entradas", "Respostas no cache de listagens", lambda: len(cache)
+)
+
+# Cabeçalhos que não são repetidos nas respostas servidas do cache
+_CABECALHOS_NAO_GUARDADOS = {
+    "content-length",
+    "etag",
+    "last-modified",
+    "server-timing",
+    "set-cookie",
+    "vary",
+}
+
+
+def _mensagens_pendentes() -> bool:
+    """Indica se a sessão tem mensagens flash a exibir na próxima página"""
+    return app.config["SESSION_COOKIE_NAME"] in request.cookies and bool(session.get("_flashes"))
+
+
+def _cabecalhos(resposta):
+    """Cabeçalhos de uma resposta a guardar no cache"""
+    return [(k, v) for k, v in resposta.headers if k.lower() not in _CABECALHOS_NAO_GUARDADOS]
+
+
+def _guardar_ao_final(corpo, cabecalhos, chave: str, versao: int):
+    """Repassa um corpo em streaming e o guarda no cache ao final, se couber"""
+    partes = []
+    tamanho = 0
+    for parte in corpo:
+        if isinstance(parte, str):
+            parte = parte.encode("utf-8")
+        if partes is not None:
+            tamanho += len(parte)
+            if tamanho <= cache.tamanho_maximo_corpo:
+                partes.append(parte)
+            else:
+                partes = None
+        yield parte
+    if partes is not None:
+        cache.guardar(chave, versao, b"".join(partes), cabecalhos)
+
+
+def em_cache(view):
+    """
+    Reaproveita as respostas de uma listagem enquanto o catálogo não muda
+
+    Respostas 200 são guardadas por rota e query string junto com a versão
+    do catálogo e um ETag calculado sobre o corpo. Requisições com
+    If-None-Match ou If-Modified-Since recebem 304 quando nada mudou.
+    Respostas em streaming seguem em streaming e são guardadas ao final, se
+    couberem no cache. Páginas com mensagens flash pendentes não usam o
+    cache.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _mensagens_pendentes():
+            return view(*args, **kwargs)
+
+        chave = request.full_path
+        versao = manager.versao
+        entrada = cache.obter(chave, versao)
+        if entrada is not None:
+            resposta = app.response_class(entrada.corpo, headers=entrada.cabecalhos)
+        else:
+            resposta = app.make_response(view(*args, **kwargs))
+            if resposta.status_code != 200:
+                return resposta
+            if resposta.is_streamed:
+                resposta.response = _guardar_ao_final(
+                    resposta.response, _cabecalhos(resposta), chave, versao
+                )
+                return resposta
+            entrada = cache.guardar(chave, versao, resposta.get_data(), _cabecalhos(resposta))
+            if entrada is None:
+                return resposta
+
+        resposta.set_etag(entrada.etag)
+        resposta.last_modified = datetime.fromtimestamp(manager.modificado_em, timezone.utc)
+        return resposta.make_conditional(request)
+
+    return wrapper
+
+
+# Respostas dos POST da API por Idempotency-Key, persistidas ao lado do
+# arquivo de dados; PRODUTOS_IDEMPOTENCIA_CAPACIDADE e
+# PRODUTOS_IDEMPOTENCIA_TTL (em segundos) limitam quantas e por quanto tempo
+idempotencia = CacheIdempotencia(
+    manager.data_file + ".idempotencia",
+    int(os.environ.get("PRODUTOS_IDEMPOTENCIA_CAPACIDADE", CAPACIDADE_IDEMPOTENCIA)),
+    float(os.environ.get("PRODUTOS_IDEMPOTENCIA_TTL", TTL_IDEMPOTENCIA)),
+)
+
+
+def idempotente(view):
+    """
+    Executa a operação uma única vez por Idempotency-Key
+
+    Uma requisição repetida com a mesma chave (e o mesmo método, caminho e
+    corpo) recebe a resposta da primeira, com o cabeçalho
+    Idempotent-Replayed, sem executar a operação de novo. Respostas 5xx não
+    são guardadas, permitindo nova tentativa. Sem o cabeçalho, a requisição
+    segue normalmente.
+
+    Com o cabeçalho, o corpo é lido por inteiro para calcular a impressão e
+    fica em g.corpo; views que leem o stream devem usar _fluxo_corpo().
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        chave = request.headers.get("Idempotency-Key")
+        if chave is None:
+            return view(*args, **kwargs)
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return jsonify({"error": "Idempotency-Key inválida"}), 400
+
+        g.corpo = request.get_data()
+        impressao = impressao_requisicao(request.method, request.path, g.corpo)
+        try:
+            guardada = idempotencia.iniciar(chave, impressao)
+        except ConflitoIdempotencia as e:
+            return jsonify({"error": str(e)}), e.status
+        if guardada is not None:
+            resposta = app.response_class(
+                guardada.corpo, status=guardada.status, content_type=guardada.tipo
+            )
+            resposta.headers["Idempotent-Replayed"] = "true"
+            return resposta
+
+        try:
+            resposta = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            idempotencia.cancelar(chave)
+            raise
+        if resposta.status_code >= 500:
+            idempotencia.cancelar(chave)
+        else:
+            idempotencia.concluir(
+                chave, impressao, resposta.status_code, resposta.get_data(), resposta.content_type
+            )
+        return resposta
+
+    return wrapper
+
+
+def _fluxo_corpo():
+    """Stream do corpo da requisição, mesmo que idempotente() já o tenha lido"""
+    corpo = g.get("corpo")
+    return request.stream if corpo is None else io.BytesIO(corpo)
+
+
+def _parametros_listagem():
+    """
+    Lê os parâmetros de paginação e projeção da query string
+
+    Returns:
+        Tupla (limite, cursor, campos); cada item é None quando ausente
+
+    Raises:
+        ValueError: Se limit ou cursor não forem inteiros
+    """
+    try:
+        limite = request.args.get("limit")
+        limite = min(int(limite), LIMITE_MAXIMO_PAGINA) if limite else None
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise ValueError("Parâmetros limit e cursor devem ser inteiros")
+
+    fields = request.args.get("fields")
+    campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+    return limite, cursor, campos
+
+
+def _listar_pagina_html(ordem: str, ordenado: bool = False):
+    """Renderiza uma página da listagem de produtos"""
+    try:
+        _, cursor, _ = _parametros_listagem()
+        pagina = manager.paginar_produtos(ordem, TAMANHO_PAGINA_PADRAO, cursor)
+    except ValueError:
+        flash("Página não encontrada!", "error")
+        return redirect(url_for(request.endpoint))
+
+    return render_template(
+        "index.html",
+        produtos=pagina["produtos"],
+        ordenado=ordenado,
+        cursor=cursor,
+        proximo_cursor=pagina["proximo_cursor"],
+    )
 
 
 @app.route("/")
+@em_cache
 def index():
     """Página inicial com lista de produtos"""
-    produtos = manager.listar_produtos()
-    return render_template("index.html", produtos=produtos)
+    return _listar_pagina_html("id")
 
 
 @app.route("/alfabetica")
+@em_cache
 def listar_alfabetica():
     """Lista produtos em ordem alfabética"""
-    produtos = manager.listar_produtos_alfabetica()
-    return render_template("index.html", produtos=produtos, ordenado=True)
+    return _listar_pagina_html("alfabetica", ordenado=True)
 
 
 @app.route("/adicionar", methods=["GET", "POST"])
@@ -47,6 +418,67 @@ def adicionar_produto():
     return render_template("adicionar.html")
 
 
+def _reserva_da_sessao(produto_id: int, token: Optional[str] = None) -> Optional[str]:
+    """
+    Troca o token da reserva do produto guardado na sessão
+
+    Returns:
+        Token guardado antes da troca (None remove sem guardar outro)
+    """
+    reservas = dict(session.get("reservas", {}))
+    anterior = reservas.pop(str(produto_id), None)
+    if token:
+        reservas[str(produto_id)] = token
+    if reservas or "reservas" in session:
+        session["reservas"] = reservas
+    return anterior
+
+
+def _previa_compra(produto, quantidade: int, anterior: Optional[str] = None):
+    """
+    Exibe a prévia da compra; havendo estoque, reserva as unidades até a
+    confirmação (ou até a reserva vencer)
+
+    A reserva da prévia anterior do mesmo produto (informada no formulário
+    ou guardada na sessão) é cancelada antes, para que calcular de novo não
+    acumule reservas.
+    """
+    for token in {anterior, _reserva_da_sessao(produto.id)} - {None, ""}:
+        manager.cancelar_reserva(token)
+    resultado = manager.comprar_produto(produto.id, quantidade)
+    if resultado["disponivel"]:
+        resultado = manager.reservar_produto(produto.id, quantidade)
+        _reserva_da_sessao(produto.id, resultado["token"])
+    return render_template(
+        "comprar.html",
+        produto=produto,
+        quantidade=quantidade,
+        total=resultado["total"],
+        disponivel=resultado["disponivel"],
+        reserva=resultado.get("token"),
+        expira_em=resultado.get("expira_em"),
+        preview=True,
+    )
+
+
+def _confirmar_compra(produto_id: int, quantidade: int, token: Optional[str]):
+    """
+    Efetua a compra da página, usando a reserva da prévia quando ela é deste
+    produto e desta quantidade
+
+    Sem reserva válida (vencida, de outro produto ou de outra quantidade),
+    a reserva da prévia guardada na sessão é devolvida e a compra é feita
+    se ainda houver estoque.
+    """
+    anterior = _reserva_da_sessao(produto_id)
+    try:
+        return manager.confirmar_reserva(token or "", produto_id, quantidade)
+    except ReservaInexistente:
+        if anterior:
+            manager.cancelar_reserva(anterior)
+        return manager.comprar_produto(produto_id, quantidade, True)
+
+
 @app.route("/comprar/<int:produto_id>", methods=["GET", "POST"])
 def comprar_produto(produto_id):
     """Processa a compra de um produto"""
@@ -58,26 +490,24 @@ def comprar_produto(produto_id):
 
     if request.method == "POST":
         try:
+            token = request.form.get("reserva")
+            if request.form.get("cancelar") == "true":
+                _reserva_da_sessao(produto_id)
+                manager.cancelar_reserva(token or "")
+                flash("Reserva cancelada.", "success")
+                return redirect(url_for("comprar_produto", produto_id=produto_id))
+
             quantidade = int(request.form.get("quantidade", 0))
             confirmar = request.form.get("confirmar") == "true"
 
-            resultado = manager.comprar_produto(produto_id, quantidade, confirmar)
-
             if confirmar:
+                resultado = _confirmar_compra(produto_id, quantidade, token)
                 flash(
                     f'Compra realizada com sucesso! Total: R$ {resultado["total"]:.2f}', "success"
                 )
                 return redirect(url_for("index"))
             else:
-                # Exibe prévia da compra
-                return render_template(
-                    "comprar.html",
-                    produto=produto,
-                    quantidade=quantidade,
-                    total=resultado["total"],
-                    disponivel=resultado["disponivel"],
-                    preview=True,
-                )
+                return _previa_compra(produto, quantidade, token)
 
         except ValueError as e:
             flash(f"Erro: {str(e)}", "error")
@@ -88,21 +518,165 @@ def comprar_produto(produto_id):
 
 
 # API Endpoints (opcional, para facilitar integração)
+# Filtros por faixa aceitos pelas listagens da API: parâmetro -> conversão
+FILTROS_FAIXA = {
+    "valor_min": float,
+    "valor_max": float,
+    "quantidade_min": int,
+    "quantidade_max": int,
+}
+
+
+def _parametros_filtro():
+    """
+    Lê os filtros por faixa de valor e quantidade da query string
+
+    Returns:
+        Dict com os filtros informados, no formato de consultar_produtos
+
+    Raises:
+        ValueError: Se algum filtro não for numérico
+    """
+    filtros = {}
+    for nome, converter in FILTROS_FAIXA.items():
+        valor = request.args.get(nome)
+        if valor:
+            try:
+                filtros[nome] = converter(valor)
+            except ValueError:
+                raise ValueError(f"Parâmetro {nome} inválido: {valor}")
+    return filtros
+
+
+def _api_listar(ordem: str):
+    """
+    Lista produtos na ordem pedida (ou na de ?sort=), paginando quando há
+    limit ou cursor
+
+    Com filtros por faixa ou ordem por valor ou quantidade, a listagem usa
+    os índices de consultar_produtos.
+    """
+    try:
+        limite, cursor, campos = _parametros_listagem()
+        filtros = _parametros_filtro()
+        ordem = request.args.get("sort") or ordem
+        if filtros or ordem not in ("id", "alfabetica"):
+            paginado = limite is not None or cursor is not None
+            pagina = manager.consultar_produtos(
+                **filtros,
+                ordem=ordem,
+                limite=(limite or TAMANHO_PAGINA_PADRAO) if paginado else None,
+                cursor=cursor,
+                campos=campos,
+            )
+            return jsonify(pagina if paginado else pagina["produtos"])
+        if limite is None and cursor is None:
+            return _exportar("json", ordem, campos)
+
+        pagina = manager.paginar_produtos(ordem, limite or TAMANHO_PAGINA_PADRAO, cursor, campos)
+        return jsonify(pagina)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @app.route("/api/produtos", methods=["GET"])
+@em_cache
 def api_listar_produtos():
     """API: Lista todos os produtos"""
-    produtos = manager.listar_produtos()
-    return jsonify(produtos)
+    return _api_listar("id")
 
 
 @app.route("/api/produtos/alfabetica", methods=["GET"])
+@em_cache
 def api_listar_alfabetica():
     """API: Lista produtos em ordem alfabética"""
-    produtos = manager.listar_produtos_alfabetica()
-    return jsonify(produtos)
+    return _api_listar("alfabetica")
+
+
+def _exportar_json(lotes, campos):
+    """Gera um array JSON, um lote por vez"""
+    separador = b"["
+    for lote in lotes:
+        yield separador + b",".join(map(codec.codificar, lote))
+        separador = b","
+    yield b"[]" if separador == b"[" else b"]"
+
+
+def _exportar_ndjson(lotes, campos):
+    """Gera um objeto JSON por linha"""
+    for lote in lotes:
+        yield b"".join(codec.codificar(p) + b"\n" for p in lote)
+
+
+def _exportar_csv(lotes, campos):
+    """Gera CSV com cabeçalho"""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos or CAMPOS_PRODUTO, lineterminator="\n")
+    escritor.writeheader()
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Formatos de exportação: tipo de conteúdo e gerador do corpo
+FORMATOS_EXPORTACAO = {
+    "json": ("application/json", _exportar_json),
+    "ndjson": ("application/x-ndjson", _exportar_ndjson),
+    "csv": ("text/csv", _exportar_csv),
+}
+
+
+def _exportar(formato: str, ordem: str, campos):
+    """
+    Monta uma resposta em streaming com o catálogo inteiro
+
+    Os produtos são lidos em lotes com manager.iterar_produtos e enviados à
+    medida que são serializados, sem montar a lista nem o corpo completo.
+
+    Raises:
+        ValueError: Se o formato, a ordem ou algum campo for inválido
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato inválido: {formato}")
+    tipo, gerar = FORMATOS_EXPORTACAO[formato]
+    lotes = manager.iterar_produtos(ordem, campos)
+    return Response(stream_with_context(gerar(lotes, campos)), mimetype=tipo)
+
+
+@app.route("/api/produtos/exportar", methods=["GET"])
+def api_exportar_produtos():
+    """API: Exporta o catálogo inteiro em JSON, NDJSON ou CSV"""
+    try:
+        _, _, campos = _parametros_listagem()
+        formato = request.args.get("formato", "json")
+        ordem = request.args.get("ordem", "id")
+        resposta = _exportar(formato, ordem, campos)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if formato == "csv":
+        resposta.headers["Content-Disposition"] = "attachment; filename=produtos.csv"
+    return resposta
+
+
+@app.route("/api/produtos/busca", methods=["GET"])
+def api_buscar_produtos():
+    """API: Pesquisa produtos pelo nome"""
+    try:
+        termo = request.args.get("q", "")
+        modo = request.args.get("modo", "tokens")
+        limite = request.args.get("limit", type=int)
+        produtos = manager.pesquisar(termo, modo, limite)
+        return jsonify(produtos)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/produtos", methods=["POST"])
+@idempotente
 def api_adicionar_produto():
     """API: Adiciona um novo produto"""
     try:
@@ -115,7 +689,65 @@ def api_adicionar_produto():
         return jsonify({"error": str(e)}), 500
 
 
+def _registros_do_lote():
+    """
+    Lê os registros do corpo de POST /api/produtos/lote
+
+    Aceita um array JSON (application/json), um objeto JSON por linha
+    (application/x-ndjson) ou CSV com cabeçalho produto,quantidade,valor
+    (text/csv). NDJSON e CSV são lidos do stream, linha a linha.
+
+    Returns:
+        Iterável de registros
+
+    Raises:
+        ValueError: Se o corpo JSON não for um array
+        TypeError: Se o tipo de conteúdo não for suportado
+    """
+    tipo = request.mimetype
+    if tipo == "application/json":
+        registros = request.get_json()
+        if not isinstance(registros, list):
+            raise ValueError("O corpo deve ser um array JSON de produtos")
+        return registros
+
+    texto = io.TextIOWrapper(_fluxo_corpo(), encoding="utf-8-sig")
+    if tipo in ("application/x-ndjson", "application/jsonl"):
+        return (_decodificar_linha(linha) for linha in texto if linha.strip())
+    if tipo == "text/csv":
+        return csv.DictReader(texto)
+    raise TypeError(f"Tipo de conteúdo não suportado: {tipo}")
+
+
+def _decodificar_linha(linha: str):
+    """Decodifica uma linha NDJSON; linhas inválidas seguem como texto"""
+    try:
+        return codec.decodificar(linha)
+    except ValueError:
+        return linha
+
+
+@app.route("/api/produtos/lote", methods=["POST"])
+@idempotente
+def api_adicionar_lote():
+    """API: Adiciona produtos em lote (JSON, NDJSON ou CSV)"""
+    try:
+        resultado = manager.adicionar_produtos_em_lote(_registros_do_lote())
+    except TypeError as e:
+        return jsonify({"error": str(e)}), 415
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    resposta = {
+        "adicionados": len(resultado["adicionados"]),
+        "ids": [p["id"] for p in resultado["adicionados"]],
+        "erros": resultado["erros"],
+    }
+    return jsonify(resposta), 201 if resultado["adicionados"] else 400
+
+
 @app.route("/api/comprar", methods=["POST"])
+@idempotente
 def api_comprar_produto():
     """API: Processa compra de produto"""
     try:
@@ -130,6 +762,246 @@ def api_comprar_produto():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/pedidos", methods=["POST"])
+@idempotente
+def api_comprar_pedido():
+    """API: Processa um pedido com vários produtos"""
+    try:
+        data = request.get_json()
+        itens = [(item["produto_id"], item["quantidade"]) for item in data["itens"]]
+        resultado = manager.comprar_produtos(itens, data.get("confirmar", False))
+        return jsonify(resultado), 200
+    except (KeyError, TypeError):
+        return jsonify({"error": "Informe itens com produto_id e quantidade"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/reservas", methods=["POST"])
+@idempotente
+def api_reservar_produto():
+    """API: Reserva estoque de um produto até a confirmação da compra"""
+    try:
+        data = request.get_json()
+        resultado = manager.reservar_produto(
+            data["produto_id"], data["quantidade"], data.get("ttl")
+        )
+        return jsonify(resultado), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/reservas/<token>/confirmar", methods=["POST"])
+@idempotente
+def api_confirmar_reserva(token):
+    """API: Efetua a compra reservada"""
+    try:
+        return jsonify(manager.confirmar_reserva(token)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/reservas/<token>", methods=["DELETE"])
+def api_cancelar_reserva(token):
+    """API: Cancela uma reserva, devolvendo as unidades ao estoque disponível"""
+    if not manager.cancelar_reserva(token):
+        return jsonify({"error": "Reserva inexistente ou expirada"}), 404
+    return "", 204
+
+
+def _parametro_inteiro(nome: str, padrao=None):
+    """
+    Lê um parâmetro inteiro da query string
+
+    Raises:
+        ValueError: Se o parâmetro não for inteiro
+    """
+    valor = request.args.get(nome)
+    if not valor:
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"Parâmetro {nome} deve ser inteiro")
+
+
+@app.route("/api/estatisticas", methods=["GET"])
+@em_cache
+def api_estatisticas():
+    """API: Totais do estoque (unidades, valor total e preços)"""
+    return jsonify(manager.resumo_estoque())
+
+
+@app.route("/api/estatisticas/estoque-baixo", methods=["GET"])
+@em_cache
+def api_estoque_baixo():
+    """API: Produtos com quantidade abaixo de ?limite= (padrão 5)"""
+    try:
+        limite = _parametro_inteiro("limite", 5)
+        maximo = _parametro_inteiro("limit")
+        if maximo is not None:
+            maximo = min(maximo, LIMITE_MAXIMO_PAGINA)
+        return jsonify(manager.produtos_estoque_baixo(limite, maximo))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/estatisticas/maior-valor", methods=["GET"])
+@em_cache
+def api_maior_valor():
+    """API: Produtos com maior valor em estoque (padrão: 10)"""
+    try:
+        n = min(_parametro_inteiro("limit", 10), LIMITE_MAXIMO_PAGINA)
+        return jsonify(manager.produtos_maior_valor(n))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/estatisticas/precos", methods=["GET"])
+@em_cache
+def api_histograma_precos():
+    """API: Histograma dos preços unitários (?faixas=, padrão 10)"""
+    try:
+        faixas = min(_parametro_inteiro("faixas", 10), LIMITE_MAXIMO_PAGINA)
+        return jsonify(manager.histograma_precos(faixas))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# Intervalo (em segundos) entre comentários de keep-alive em /api/eventos,
+# no qual também são aplicadas as alterações gravadas por outros workers
+INTERVALO_PING_EVENTOS = 15.0
+
+# Duração máxima (em segundos) de uma conexão em /api/eventos; o
+# EventSource reconecta sozinho e retoma pelo Last-Event-ID. Enquanto
+# aberta, a conexão ocupa uma thread do worker
+DURACAO_MAXIMA_EVENTOS = float(os.environ.get("PRODUTOS_EVENTOS_DURACAO", 60))
+
+# Eventos enviados por vez em /api/eventos
+EVENTOS_POR_ENVIO = 100
+
+
+def _transmitir_eventos(sequencia: Optional[int]):
+    """
+    Gera os eventos posteriores à sequência até DURACAO_MAXIMA_EVENTOS
+
+    Sem eventos novos, envia um comentário a cada INTERVALO_PING_EVENTOS
+    (mantendo a conexão aberta em proxies) e sincroniza o catálogo com os
+    outros workers, o que publica as alterações deles. Se o cliente ficou
+    para trás além do buffer ou retoma um id de outro worker (sequência
+    None), envia "reset" com a sequência atual: o cliente deve reler o
+    catálogo.
+    """
+    epoca = manager.eventos.epoca
+    fim = time.monotonic() + DURACAO_MAXIMA_EVENTOS
+    while True:
+        restante = fim - time.monotonic()
+        if restante <= 0:
+            return
+        try:
+            eventos = manager.eventos.eventos_desde(
+                sequencia, min(INTERVALO_PING_EVENTOS, restante), EVENTOS_POR_ENVIO
+            )
+        except EventosPerdidos:
+            sequencia = manager.eventos.sequencia
+            yield formatar_evento(epoca, sequencia, "reset", {})
+            continue
+        if eventos:
+            yield b"".join(formatar_evento(epoca, *evento) for evento in eventos)
+            sequencia = eventos[-1].sequencia
+        else:
+            yield b": ping\n\n"
+            manager.sincronizar()
+
+
+@app.route("/api/eventos", methods=["GET"])
+def api_eventos():
+    """
+    API: Alterações do catálogo em Server-Sent Events
+
+    Sem parâmetros, envia as alterações a partir da conexão; com o
+    cabeçalho Last-Event-ID (enviado pelo EventSource ao reconectar) ou
+    ?desde=, retoma depois do evento informado (id época:sequência). A conexão é encerrada
+    após DURACAO_MAXIMA_EVENTOS; para muitos clientes, prefira a rota da
+    aplicação ASGI, que não ocupa uma thread por conexão.
+    """
+    try:
+        desde = request.headers.get("Last-Event-ID") or request.args.get("desde")
+        sequencia = (
+            manager.eventos.sequencia if not desde else manager.eventos.sequencia_do_id(desde)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    resposta = Response(_transmitir_eventos(sequencia), mimetype="text/event-stream")
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
+
+
+@app.route("/metrics", methods=["GET"])
+def exportar_metricas():
+    """Métricas no formato texto do Prometheus"""
+    return Response(
+        metricas.REGISTRO.exportar(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _autorizar_admin():
+    """
+    Verifica o token dos endpoints administrativos
+
+    Returns:
+        Resposta de erro, ou None se a requisição está autorizada
+    """
+    if perfilador is None or not TOKEN_ADMIN:
+        return jsonify({"error": "Recurso não encontrado"}), 404
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), TOKEN_ADMIN.encode()):
+        return jsonify({"error": "Token de administração inválido"}), 401
+    return None
+
+
+@app.route("/admin/perfis", methods=["GET"])
+def admin_listar_perfis():
+    """Admin: Lista os perfis guardados, do mais recente ao mais antigo"""
+    erro = _autorizar_admin()
+    if erro:
+        return erro
+    return jsonify(
+        [
+            {
+                "id": perfil.id,
+                "inicio": datetime.fromtimestamp(perfil.inicio, timezone.utc).isoformat(),
+                "metodo": perfil.metodo,
+                "caminho": perfil.caminho,
+                "rota": perfil.rota,
+                "status": perfil.status,
+                "duracao_ms": round(perfil.duracao * 1000, 3),
+                "tipo": perfil.tipo,
+            }
+            for perfil in perfilador.perfis()
+        ]
+    )
+
+
+@app.route("/admin/perfis/<int:perfil_id>", methods=["GET"])
+def admin_obter_perfil(perfil_id):
+    """Admin: Relatório de um perfil (pstats ou pilhas no formato folded)"""
+    erro = _autorizar_admin()
+    if erro:
+        return erro
+    perfil = perfilador.obter(perfil_id)
+    if perfil is None:
+        return jsonify({"error": "Perfil não encontrado"}), 404
+    return Response(perfil.relatorio, content_type="text/plain; charset=utf-8")
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
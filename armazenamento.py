@@ -0,0 +1,836 @@
+"""
+Repositórios de persistência usados pelo gerenciador de produtos
+
+ArmazenamentoJson grava em um arquivo JSON (opcionalmente com journal de
+alterações) e ArmazenamentoSqlite grava em um banco SQLite em modo WAL.
+Ambos coordenam vários processos (workers do gunicorn) com uma seção
+crítica exclusiva e um contador de geração incrementado a cada gravação,
+usado para saber quando o estado em memória ficou desatualizado.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import codec
+import metricas
+from indices import normalizar
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows não tem flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Tamanho padrão (em bytes) a partir do qual o journal é compactado
+LIMITE_JOURNAL_PADRAO = 1024 * 1024
+
+# Política padrão de fsync: "sempre", "nunca" ou um intervalo como "100ms"
+FSYNC_PADRAO = "sempre"
+
+# Extensões de arquivo tratadas como banco SQLite por criar_armazenamento
+EXTENSOES_SQLITE = (".db", ".sqlite", ".sqlite3")
+
+# Extensões de arquivo gravadas com o snapshot binário (codec.SnapshotBinario)
+EXTENSOES_BINARIO = (".bin",)
+
+
+class Armazenamento(ABC):
+    """
+    Interface de persistência do ProdutoManager
+
+    As alterações são descritas por registros no formato
+    {"op": "adicionar", "produto": {...}} ou
+    {"op": "estoque", "id": ..., "quantidade": ...}. Produtos recebidos
+    para gravar podem ser qualquer Mapping (dicts ou produto.Produto).
+
+    Repositórios com consultas_indexadas respondem também buscar_por_id,
+    buscar_por_chave e pagina direto do que está persistido, sem a
+    transação, e o gerenciador passa a usá-los nas buscas e listagens.
+    """
+
+    consultas_indexadas = False
+
+    @abstractmethod
+    def carregar(self) -> List[Dict]:
+        """
+        Lê todos os produtos persistidos
+
+        Returns:
+            Lista de produtos em ordem de ID
+        """
+
+    @abstractmethod
+    def transacao(self):
+        """
+        Seção crítica exclusiva entre threads e processos (reentrante)
+
+        Deve ser usada como gerenciador de contexto em volta de alterado(),
+        carregar() e gravar().
+        """
+
+    @abstractmethod
+    def alterado(self) -> bool:
+        """Indica se outro processo gravou desde a última leitura ou gravação"""
+
+    def alteracoes(self) -> Optional[List[Dict]]:
+        """
+        Lê apenas o que outros processos gravaram desde a última leitura
+
+        Chamado na transação quando alterado() indica mudança.
+
+        Returns:
+            Registros a aplicar sobre o estado em memória, ou None quando a
+            leitura incremental não é possível e é preciso usar carregar()
+        """
+        return None
+
+    @abstractmethod
+    def gravar(self, registros: List[Dict], produtos: List[Dict]):
+        """
+        Persiste um conjunto de alterações
+
+        Args:
+            registros: Alterações a persistir
+            produtos: Estado completo já com as alterações aplicadas
+        """
+
+    def buscar_por_id(self, produto_id: int) -> Optional[Dict]:
+        """Lê um produto pelo ID (só com consultas_indexadas)"""
+        raise NotImplementedError
+
+    def buscar_por_chave(self, chave: str) -> List[Dict]:
+        """
+        Lê os produtos cujo nome normalizado (indices.normalizar) é igual à
+        chave, em ordem de ID (só com consultas_indexadas)
+        """
+        raise NotImplementedError
+
+    def pagina(self, ordem: str, limite: Optional[int], apos: Optional[int]) -> List[Dict]:
+        """
+        Lê os produtos seguintes a um ID, na ordem pedida (só com
+        consultas_indexadas)
+
+        Args:
+            ordem: "id" ou "alfabetica" (nome normalizado e ID)
+            limite: Número máximo de produtos (None lê todos)
+            apos: ID do último produto já lido (None começa do início)
+
+        Raises:
+            ValueError: Se o produto apos não existir
+        """
+        raise NotImplementedError
+
+    def precisa_compactar(self) -> bool:
+        """Indica se o armazenamento pede uma compactação"""
+        return False
+
+    def iniciar_compactacao(self) -> Optional[Tuple]:
+        """
+        Marca o ponto de corte de uma compactação (chamado na transação)
+
+        Returns:
+            Marca a repassar para concluir_compactacao, ou None se não há
+            nada a compactar
+        """
+        return None
+
+    def concluir_compactacao(self, estado: List[Dict], marca: Tuple):
+        """
+        Grava o estado copiado em iniciar_compactacao como novo snapshot
+
+        Args:
+            estado: Cópia dos produtos no ponto de corte
+            marca: Valor retornado por iniciar_compactacao
+        """
+
+    def fechar(self):
+        """Libera arquivos e conexões abertos"""
+
+
+def interpretar_fsync(politica: str) -> Optional[float]:
+    """
+    Converte uma política de fsync no intervalo entre sincronizações
+
+    Args:
+        politica: "sempre" (fsync a cada gravação), "nunca" (fica a cargo do
+            sistema operacional) ou um intervalo em milissegundos, como
+            "100ms" ou "100" (fsync no máximo a cada intervalo)
+
+    Returns:
+        Intervalo em segundos (0 para "sempre") ou None para "nunca"
+
+    Raises:
+        ValueError: Se a política não for reconhecida
+    """
+    valor = politica.strip().lower()
+    if valor == "sempre":
+        return 0.0
+    if valor == "nunca":
+        return None
+    try:
+        milissegundos = float(valor[:-2] if valor.endswith("ms") else valor)
+    except ValueError:
+        raise ValueError(f"Política de fsync inválida: {politica}")
+    if milissegundos < 0:
+        raise ValueError(f"Política de fsync inválida: {politica}")
+    return milissegundos / 1000
+
+
+def _fsync_diretorio(caminho: str):
+    """Grava no disco a entrada de diretório de um arquivo renomeado"""
+    try:
+        descritor = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    except OSError:  # pragma: no cover - Windows não abre diretórios
+        return
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+
+def criar_armazenamento(
+    data_file: str,
+    journal: bool = False,
+    limite_journal: int = LIMITE_JOURNAL_PADRAO,
+    fsync: str = FSYNC_PADRAO,
+) -> Armazenamento:
+    """
+    Escolhe o repositório pela extensão do arquivo de dados
+
+    Args:
+        data_file: Caminho do arquivo (.db/.sqlite/.sqlite3 usam SQLite,
+            .bin usa o snapshot binário e as demais o snapshot JSON)
+        journal: Ativa o journal de alterações do repositório JSON
+        limite_journal: Tamanho do journal que dispara a compactação
+        fsync: Política de fsync (ver interpretar_fsync)
+
+    Returns:
+        Repositório de produtos
+    """
+    if data_file.lower().endswith(EXTENSOES_SQLITE):
+        return ArmazenamentoSqlite(data_file, fsync=fsync)
+    binario = data_file.lower().endswith(EXTENSOES_BINARIO)
+    formato = codec.SnapshotBinario() if binario else codec.SnapshotJson()
+    return ArmazenamentoJson(data_file, journal, limite_journal, formato, fsync)
+
+
+def migrar(origem: str, destino: str) -> int:
+    """
+    Copia o catálogo de um arquivo de dados para outro
+
+    Os formatos são escolhidos pela extensão, como em criar_armazenamento
+    (por exemplo produtos.json -> produtos.bin ou produtos.db). O journal da
+    origem é reaplicado na leitura e a origem não é alterada.
+
+    Args:
+        origem: Arquivo de dados atual
+        destino: Novo arquivo de dados
+
+    Returns:
+        Número de produtos copiados
+
+    Raises:
+        ValueError: Se o destino já tiver produtos
+    """
+    fonte = criar_armazenamento(origem, journal=True)
+    alvo = criar_armazenamento(destino)
+    try:
+        with fonte.transacao():
+            produtos = fonte.carregar()
+        with alvo.transacao():
+            if alvo.carregar():
+                raise ValueError(f"O destino já contém produtos: {destino}")
+            alvo.gravar([{"op": "adicionar", "produto": p} for p in produtos], produtos)
+    finally:
+        fonte.fechar()
+        alvo.fechar()
+    return len(produtos)
+
+
+def _linha_journal(registro: Dict) -> bytes:
+    """Serializa um registro do journal em uma linha JSON compacta"""
+    return codec.codificar(registro) + b"\n"
+
+
+class ArmazenamentoJson(Armazenamento):
+    """
+    Repositório em arquivo JSON
+
+    O snapshot é um array JSON compacto ou, com formato
+    codec.SnapshotBinario, registros binários de tamanho fixo; o journal é
+    sempre JSON, uma alteração por linha. No modo padrão cada gravação
+    reescreve o snapshot inteiro, em um arquivo temporário que substitui o
+    anterior com rename; o snapshot substituído fica em data_file + ".bak" e
+    é usado se o atual estiver corrompido. No modo
+    journal cada alteração é anexada a um log (data_file + ".log"),
+    reaplicado na leitura e compactado em um novo snapshot quando passa de
+    limite_journal bytes. A coordenação entre processos usa flock no
+    arquivo data_file + ".lock", que também guarda o contador de geração.
+
+    A política de fsync decide quando snapshot e journal são forçados para
+    o disco: a cada gravação, no máximo a cada intervalo (por uma thread
+    temporizada) ou nunca.
+    """
+
+    def __init__(
+        self,
+        data_file: str,
+        journal: bool = False,
+        limite_journal: int = LIMITE_JOURNAL_PADRAO,
+        formato=None,
+        fsync: str = FSYNC_PADRAO,
+    ):
+        self.data_file = data_file
+        self.formato = formato or codec.SnapshotJson()
+        self.backup_file = data_file + ".bak"
+        self.intervalo_fsync = interpretar_fsync(fsync)
+        self._fsync_pendente: set = set()
+        self._temporizador_fsync: Optional[threading.Timer] = None
+        self._lock_fsync = threading.Lock()
+        self.journal_file = data_file + ".log"
+        self.lock_file = data_file + ".lock"
+        self.journal = journal
+        self.limite_journal = limite_journal
+        self._lock = threading.RLock()
+        self._profundidade = 0
+        self._arquivo_lock = None
+        self._pid = None
+        self._geracao: Optional[int] = None
+        self._log = None
+        self._tamanho_log = 0
+        self._snapshot: Optional[Tuple] = None
+
+    @contextmanager
+    def transacao(self) -> Iterator[None]:
+        with self._lock:
+            if self._profundidade == 0:
+                self._travar()
+            self._profundidade += 1
+            try:
+                yield
+            finally:
+                self._profundidade -= 1
+                if self._profundidade == 0 and fcntl is not None:
+                    fcntl.flock(self._arquivo_lock.fileno(), fcntl.LOCK_UN)
+
+    def _travar(self):
+        """Abre o arquivo de lock (por processo) e obtém o flock"""
+        if self._pid != os.getpid():
+            # Após um fork o descritor herdado compartilharia o flock do pai
+            self._arquivo_lock = os.fdopen(
+                os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644), "r+b"
+            )
+            self._pid = os.getpid()
+        if fcntl is not None:
+            fcntl.flock(self._arquivo_lock.fileno(), fcntl.LOCK_EX)
+
+    def _ler_geracao(self) -> int:
+        """Lê o contador de geração gravado no arquivo .lock"""
+        if fcntl is None:
+            # Sem flock não há coordenação entre processos
+            return self._geracao or 0
+        dados = os.pread(self._arquivo_lock.fileno(), 8, 0)
+        return struct.unpack("<Q", dados)[0] if len(dados) == 8 else 0
+
+    def _registrar_geracao(self):
+        """Incrementa o contador de geração após uma gravação"""
+        self._geracao = self._ler_geracao() + 1
+        if fcntl is not None:
+            os.pwrite(self._arquivo_lock.fileno(), struct.pack("<Q", self._geracao), 0)
+
+    def alterado(self) -> bool:
+        return self._geracao is None or self._ler_geracao() != self._geracao
+
+    def carregar(self) -> List[Dict]:
+        produtos: List[Dict] = []
+        if os.path.exists(self.data_file):
+            produtos = self._ler_snapshot()
+
+        if self._log is not None:
+            # O journal pode ter sido substituído por outro processo
+            self._log.close()
+            self._log = None
+        self._tamanho_log = 0
+
+        if os.path.exists(self.journal_file):
+            produtos = self._reaplicar_journal(produtos)
+            if not self.journal:
+                # Fora do modo journal o log é incorporado ao snapshot
+                self._salvar_dados(produtos)
+                os.remove(self.journal_file)
+
+        self._snapshot = self._identificar_snapshot()
+        self._geracao = self._ler_geracao()
+        return produtos
+
+    def _ler_snapshot(self) -> List[Dict]:
+        """
+        Lê o snapshot, recorrendo ao backup se ele estiver corrompido
+
+        O arquivo corrompido é preservado em data_file + ".corrompido"
+        para análise. Sem backup válido o catálogo começa vazio, mas o
+        arquivo original não é sobrescrito.
+        """
+        try:
+            return self.formato.ler(self.data_file)
+        except ValueError as erro:
+            logger.error("Snapshot corrompido em %s: %s", self.data_file, erro)
+
+        produtos: List[Dict] = []
+        try:
+            produtos = self.formato.ler(self.backup_file)
+            logger.warning("Catálogo restaurado do backup %s", self.backup_file)
+        except (OSError, ValueError):
+            logger.error("Sem backup válido em %s; o catálogo começa vazio", self.backup_file)
+        os.replace(self.data_file, self.data_file + ".corrompido")
+        if produtos:
+            shutil.copyfile(self.backup_file, self.data_file)
+        return produtos
+
+    def _identificar_snapshot(self) -> Optional[Tuple]:
+        """Identifica a versão do arquivo de dados (inode, tamanho e mtime)"""
+        try:
+            estado = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return estado.st_ino, estado.st_size, estado.st_mtime_ns
+
+    def alteracoes(self) -> Optional[List[Dict]]:
+        """
+        Lê do journal só as linhas anexadas desde a última leitura
+
+        Só é possível no modo journal e enquanto o snapshot for o mesmo; uma
+        compactação feita por outro processo troca o snapshot e exige a
+        leitura completa.
+        """
+        if (
+            not self.journal
+            or self._geracao is None
+            or self._identificar_snapshot() != self._snapshot
+        ):
+            return None
+        try:
+            with open(self.journal_file, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self._tamanho_log:
+                    return None
+                f.seek(self._tamanho_log)
+                trecho = f.read()
+        except FileNotFoundError:
+            return None
+
+        registros = []
+        for linha in trecho.splitlines():
+            try:
+                registros.append(codec.decodificar(linha))
+            except ValueError:
+                # Última linha incompleta (queda durante a escrita)
+                break
+        self._tamanho_log += len(trecho)
+        self._geracao = self._ler_geracao()
+        return registros
+
+    def _reaplicar_journal(self, produtos: List[Dict]) -> List[Dict]:
+        """Reaplica sobre o snapshot as alterações registradas no journal"""
+        por_id = {p["id"]: p for p in produtos}
+        with open(self.journal_file, "rb") as f:
+            for linha in f:
+                try:
+                    registro = codec.decodificar(linha)
+                except ValueError:
+                    # Última linha incompleta (queda durante a escrita)
+                    break
+                if registro["op"] == "adicionar":
+                    produto = registro["produto"]
+                    por_id.setdefault(produto["id"], {}).update(produto)
+                elif registro["op"] == "estoque" and registro["id"] in por_id:
+                    por_id[registro["id"]]["quantidade"] = registro["quantidade"]
+        self._tamanho_log = os.path.getsize(self.journal_file)
+        return sorted(por_id.values(), key=lambda p: p["id"])
+
+    def _salvar_dados(self, produtos: List[Dict]):
+        """Salva o snapshot no arquivo de dados de forma atômica"""
+        self._substituir_snapshot(self._escrever_temporario(self.formato.codificar(produtos)))
+
+    def _escrever_temporario(self, conteudo: bytes, arquivo: str = "snapshot") -> str:
+        """
+        Grava um conteúdo em um arquivo temporário ao lado do arquivo de dados
+
+        Args:
+            conteudo: Bytes a gravar
+            arquivo: Arquivo substituído ("snapshot" ou "journal"), usado na
+                contagem de bytes gravados
+
+        Returns:
+            Caminho do arquivo temporário, a ser renomeado sobre o definitivo
+        """
+        temporario = f"{self.data_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(conteudo)
+            if self.intervalo_fsync == 0:
+                # O conteúdo precisa estar no disco antes do rename
+                f.flush()
+                os.fsync(f.fileno())
+        metricas.BYTES_GRAVADOS.incrementar(len(conteudo), arquivo)
+        return temporario
+
+    def _substituir_snapshot(self, temporario: str):
+        """Troca o snapshot pelo temporário, mantendo o anterior como backup"""
+        if os.path.exists(self.data_file):
+            # O backup é um hard link: o arquivo de dados nunca deixa de existir
+            ligacao = temporario + ".bak"
+            try:
+                os.link(self.data_file, ligacao)
+            except OSError:  # pragma: no cover - sistema de arquivos sem hard links
+                shutil.copyfile(self.data_file, ligacao)
+            os.replace(ligacao, self.backup_file)
+        os.replace(temporario, self.data_file)
+        self._sincronizar_disco(self.data_file)
+
+    def _sincronizar_disco(self, caminho: str, descritor: Optional[int] = None):
+        """
+        Aplica a política de fsync a um arquivo alterado
+
+        Com a política "sempre", um arquivo recém-renomeado (sem descritor)
+        já foi sincronizado antes do rename e só o diretório é sincronizado.
+
+        Args:
+            caminho: Arquivo alterado (snapshot ou journal)
+            descritor: Descritor já aberto do arquivo, se houver
+        """
+        if self.intervalo_fsync is None:
+            return
+        if self.intervalo_fsync > 0:
+            with self._lock_fsync:
+                self._fsync_pendente.add(caminho)
+                if self._temporizador_fsync is None:
+                    self._temporizador_fsync = threading.Timer(
+                        self.intervalo_fsync, self._fsync_pendentes
+                    )
+                    self._temporizador_fsync.daemon = True
+                    self._temporizador_fsync.start()
+            return
+
+        if descritor is not None:
+            os.fsync(descritor)
+        else:
+            _fsync_diretorio(caminho)
+
+    def _fsync_pendentes(self):
+        """Força para o disco os arquivos alterados desde o último fsync"""
+        with self._lock_fsync:
+            caminhos, self._fsync_pendente = self._fsync_pendente, set()
+            self._temporizador_fsync = None
+        for caminho in caminhos:
+            try:
+                descritor = os.open(caminho, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(descritor)
+            finally:
+                os.close(descritor)
+            _fsync_diretorio(caminho)
+
+    def gravar(self, registros: List[Dict], produtos: List[Dict]):
+        if not self.journal:
+            self._salvar_dados(produtos)
+            self._registrar_geracao()
+            return
+
+        if self._log is None:
+            self._log = open(self.journal_file, "ab")
+        linhas = b"".join(_linha_journal(registro) for registro in registros)
+        self._log.write(linhas)
+        metricas.BYTES_GRAVADOS.incrementar(len(linhas), "journal")
+        self._log.flush()
+        self._sincronizar_disco(self.journal_file, self._log.fileno())
+        self._tamanho_log += len(linhas)
+        self._registrar_geracao()
+
+    def precisa_compactar(self) -> bool:
+        return self.journal and self._tamanho_log >= self.limite_journal
+
+    def iniciar_compactacao(self) -> Optional[Tuple]:
+        if not os.path.exists(self.journal_file):
+            return None
+        return self._tamanho_log, os.stat(self.journal_file).st_ino
+
+    def concluir_compactacao(self, estado: List[Dict], marca: Tuple):
+        """
+        Grava o snapshot fora da seção crítica e troca o journal dentro dela
+
+        Apenas os registros escritos após a marca permanecem no journal. Se
+        outro processo compactar o journal nesse intervalo, o snapshot
+        gravado é descartado.
+        """
+        offset, inode = marca
+        temporario = self._escrever_temporario(self.formato.codificar(estado))
+
+        with self.transacao():
+            if not os.path.exists(self.journal_file) or os.stat(self.journal_file).st_ino != inode:
+                os.remove(temporario)
+                return
+            self._substituir_snapshot(temporario)
+            self._snapshot = self._identificar_snapshot()
+
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            with open(self.journal_file, "rb") as f:
+                f.seek(offset)
+                restante = f.read()
+            os.replace(self._escrever_temporario(restante, "journal"), self.journal_file)
+            self._sincronizar_disco(self.journal_file)
+            self._tamanho_log = len(restante)
+            self._registrar_geracao()
+
+    def fechar(self):
+        with self._lock_fsync:
+            if self._temporizador_fsync is not None:
+                self._temporizador_fsync.cancel()
+        self._fsync_pendentes()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._arquivo_lock is not None:
+            self._arquivo_lock.close()
+            self._arquivo_lock = None
+            self._pid = None
+
+
+class ArmazenamentoSqlite(Armazenamento):
+    """
+    Repositório em banco SQLite
+
+    O banco usa WAL, de modo que leituras não bloqueiam a gravação, e cada
+    processo reutiliza uma única conexão. As transações de escrita começam
+    com BEGIN IMMEDIATE, que serializa os workers no próprio SQLite, e as
+    consultas usam SQL parametrizado (cacheado como prepared statement
+    pelo módulo sqlite3). As alterações atualizam só as linhas afetadas.
+
+    Buscas por ID e por nome e páginas em ordem de ID ou alfabética são
+    consultas indexadas (chave primária e índice do nome normalizado) em
+    conexões só de leitura, uma por thread: no WAL elas não esperam pelas
+    gravações nem pelo lock da conexão de escrita.
+
+    A política de fsync é traduzida para PRAGMA synchronous: "sempre" usa
+    FULL (fsync a cada commit), um intervalo usa NORMAL (fsync nos
+    checkpoints do WAL) e "nunca" usa OFF.
+    """
+
+    consultas_indexadas = True
+
+    def __init__(self, caminho: str, timeout: float = 30.0, fsync: str = FSYNC_PADRAO):
+        self.caminho = caminho
+        self.timeout = timeout
+        intervalo = interpretar_fsync(fsync)
+        self.synchronous = "FULL" if intervalo == 0 else "OFF" if intervalo is None else "NORMAL"
+        self._lock = threading.RLock()
+        self._profundidade = 0
+        self._conexao_aberta: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._geracao: Optional[int] = None
+        self._leitura = threading.local()
+        # Conexões de leitura abertas pelas threads deste processo
+        self._conexoes_leitura: List[sqlite3.Connection] = []
+        self._pid_leitura = None
+        with self.transacao():
+            self._criar_esquema()
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Retorna a conexão do processo, abrindo-a se necessário"""
+        if self._pid != os.getpid():
+            # Conexões SQLite não podem ser usadas depois de um fork
+            self._conexao_aberta = sqlite3.connect(
+                self.caminho, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            self._conexao_aberta.execute("PRAGMA journal_mode=WAL")
+            self._conexao_aberta.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._pid = os.getpid()
+        return self._conexao_aberta
+
+    def _conexao_leitura(self) -> sqlite3.Connection:
+        """Retorna a conexão só de leitura da thread, abrindo-a se necessário"""
+        conexao = getattr(self._leitura, "conexao", None)
+        if conexao is None or self._leitura.pid != os.getpid():
+            conexao = sqlite3.connect(
+                self.caminho, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            conexao.execute("PRAGMA query_only=ON")
+            self._leitura.conexao, self._leitura.pid = conexao, os.getpid()
+            with self._lock:
+                if self._pid_leitura != os.getpid():
+                    # As conexões herdadas no fork não são usadas nem fechadas
+                    self._conexoes_leitura, self._pid_leitura = [], os.getpid()
+                self._conexoes_leitura.append(conexao)
+        return conexao
+
+    def _criar_esquema(self):
+        """Cria as tabelas e índices se não existirem"""
+        conexao = self._conexao()
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS produtos ("
+            " id INTEGER PRIMARY KEY,"
+            " produto TEXT NOT NULL,"
+            " quantidade INTEGER NOT NULL,"
+            " valor REAL NOT NULL,"
+            " geracao INTEGER NOT NULL DEFAULT 0)"
+        )
+        colunas = [linha[1] for linha in conexao.execute("PRAGMA table_info(produtos)")]
+        if "geracao" not in colunas:
+            # Bancos criados antes da leitura incremental
+            conexao.execute("ALTER TABLE produtos ADD COLUMN geracao INTEGER NOT NULL DEFAULT 0")
+        if "chave" not in colunas:
+            # Bancos criados antes das consultas por nome normalizado
+            conexao.execute("ALTER TABLE produtos ADD COLUMN chave TEXT NOT NULL DEFAULT ''")
+            conexao.executemany(
+                "UPDATE produtos SET chave = ? WHERE id = ?",
+                [
+                    (normalizar(nome), i)
+                    for i, nome in conexao.execute("SELECT id, produto FROM produtos")
+                ],
+            )
+        conexao.execute("DROP INDEX IF EXISTS idx_produtos_produto")
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_produtos_geracao ON produtos (geracao)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_produtos_chave ON produtos (chave, id)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor INTEGER)")
+        conexao.execute("INSERT OR IGNORE INTO meta (chave, valor) VALUES ('geracao', 0)")
+
+    @contextmanager
+    def transacao(self) -> Iterator[None]:
+        with self._lock:
+            conexao = self._conexao()
+            if self._profundidade == 0:
+                conexao.execute("BEGIN IMMEDIATE")
+            self._profundidade += 1
+            try:
+                yield
+            except BaseException:
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    conexao.execute("ROLLBACK")
+                raise
+            self._profundidade -= 1
+            if self._profundidade == 0:
+                conexao.execute("COMMIT")
+
+    def _ler_geracao(self) -> int:
+        """Lê o contador de geração da tabela meta"""
+        linha = self._conexao().execute("SELECT valor FROM meta WHERE chave = 'geracao'")
+        return linha.fetchone()[0]
+
+    def alterado(self) -> bool:
+        # A conexão é compartilhada pelas threads do processo
+        with self._lock:
+            return self._geracao is None or self._ler_geracao() != self._geracao
+
+    def alteracoes(self) -> Optional[List[Dict]]:
+        """Lê as linhas gravadas em gerações posteriores à última leitura"""
+        if self._geracao is None:
+            return None
+        cursor = self._conexao().execute(
+            "SELECT id, produto, quantidade, valor FROM produtos WHERE geracao > ? ORDER BY id",
+            (self._geracao,),
+        )
+        registros = [
+            {
+                "op": "adicionar",
+                "produto": {"id": i, "produto": nome, "quantidade": quantidade, "valor": valor},
+            }
+            for i, nome, quantidade, valor in cursor
+        ]
+        self._geracao = self._ler_geracao()
+        return registros
+
+    def carregar(self) -> List[Dict]:
+        cursor = self._conexao().execute(
+            "SELECT id, produto, quantidade, valor FROM produtos ORDER BY id"
+        )
+        produtos = [
+            {"id": i, "produto": nome, "quantidade": quantidade, "valor": valor}
+            for i, nome, quantidade, valor in cursor
+        ]
+        self._geracao = self._ler_geracao()
+        return produtos
+
+    def gravar(self, registros: List[Dict], produtos: List[Dict]):
+        conexao = self._conexao()
+        # Cada linha alterada guarda a geração em que mudou, o que permite aos
+        # outros processos ler só as linhas novas (alteracoes)
+        geracao = self._ler_geracao() + 1
+        inseridos = [
+            (p["id"], p["produto"], normalizar(p["produto"]), p["quantidade"], p["valor"], geracao)
+            for p in (r["produto"] for r in registros if r["op"] == "adicionar")
+        ]
+        estoques = [(r["quantidade"], geracao, r["id"]) for r in registros if r["op"] == "estoque"]
+        if inseridos:
+            conexao.executemany(
+                "INSERT OR REPLACE INTO produtos (id, produto, chave, quantidade, valor, geracao)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                inseridos,
+            )
+        if estoques:
+            conexao.executemany(
+                "UPDATE produtos SET quantidade = ?, geracao = ? WHERE id = ?", estoques
+            )
+        conexao.execute("UPDATE meta SET valor = ? WHERE chave = 'geracao'", (geracao,))
+        self._geracao = geracao
+
+    def _consultar(self, sql: str, parametros: Tuple = ()) -> List[Dict]:
+        """Executa uma consulta de produtos na conexão de leitura da thread"""
+        cursor = self._conexao_leitura().execute(
+            f"SELECT id, produto, quantidade, valor FROM produtos {sql}", parametros
+        )
+        return [
+            {"id": i, "produto": nome, "quantidade": quantidade, "valor": valor}
+            for i, nome, quantidade, valor in cursor
+        ]
+
+    def buscar_por_id(self, produto_id: int) -> Optional[Dict]:
+        produtos = self._consultar("WHERE id = ?", (produto_id,))
+        return produtos[0] if produtos else None
+
+    def buscar_por_chave(self, chave: str) -> List[Dict]:
+        return self._consultar("WHERE chave = ? ORDER BY chave, id", (chave,))
+
+    def pagina(self, ordem: str, limite: Optional[int], apos: Optional[int]) -> List[Dict]:
+        if ordem not in ("id", "alfabetica"):
+            raise ValueError(f"Ordem inválida: {ordem}")
+        condicao, parametros = "", ()
+        if apos is not None:
+            linha = (
+                self._conexao_leitura()
+                .execute("SELECT chave FROM produtos WHERE id = ?", (apos,))
+                .fetchone()
+            )
+            if linha is None:
+                raise ValueError(f"Cursor inválido: {apos}")
+            if ordem == "id":
+                condicao, parametros = "WHERE id > ?", (apos,)
+            else:
+                condicao, parametros = "WHERE (chave, id) > (?, ?)", (linha[0], apos)
+        ordenacao = "id" if ordem == "id" else "chave, id"
+        return self._consultar(
+            f"{condicao} ORDER BY {ordenacao} LIMIT ?",
+            (*parametros, -1 if limite is None else limite),
+        )
+
+    def fechar(self):
+        with self._lock:
+            if self._pid_leitura == os.getpid():
+                for conexao in self._conexoes_leitura:
+                    conexao.close()
+            self._conexoes_leitura, self._pid_leitura = [], None
+            self._leitura = threading.local()
+        if self._conexao_aberta is not None and self._pid == os.getpid():
+            self._conexao_aberta.close()
+        self._conexao_aberta = None
+        self._pid = None
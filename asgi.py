@@ -0,0 +1,461 @@
+"""
+API assíncrona (ASGI) do gerenciador de produtos
+
+Expõe os mesmos contratos de /api/produtos, /api/comprar, /api/pedidos e
+/api/eventos da aplicação Flask, mas as gravações são executadas em um pool
+de threads (ver produto_manager_assincrono), então um único worker atende
+muitos clientes enquanto outros esperam pelo disco, e as conexões de
+/api/eventos esperam no loop, sem ocupar threads. Os POST aceitam
+Idempotency-Key, com o mesmo log de respostas da aplicação Flask. Não depende de framework;
+qualquer servidor ASGI serve a aplicação, por exemplo:
+
+    uvicorn asgi:app --workers 1
+"""
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+
+import codec
+from app import (
+    DURACAO_MAXIMA_EVENTOS,
+    EVENTOS_POR_ENVIO,
+    FILTROS_FAIXA,
+    INTERVALO_PING_EVENTOS,
+    LIMITE_MAXIMO_PAGINA,
+    idempotencia,
+    manager,
+)
+from eventos import BarramentoEventos, EventosPerdidos
+from eventos import formatar as formatar_evento
+from idempotencia import TAMANHO_MAXIMO_CHAVE, CacheIdempotencia, ConflitoIdempotencia
+from idempotencia import impressao as impressao_requisicao
+from produto_manager import TAMANHO_PAGINA_PADRAO
+from produto_manager_assincrono import ProdutoManagerAssincrono
+
+# Resposta de um handler: status e corpo a serializar em JSON (ou um
+# iterador assíncrono de partes já serializadas, enviado em streaming, ou
+# um _CorpoPronto)
+Resposta = Tuple[int, object]
+
+
+class _CorpoPronto(NamedTuple):
+    """Corpo já serializado, enviado como está (respostas idempotentes)"""
+
+    corpo: bytes
+    tipo: bytes
+    cabecalhos: Tuple[Tuple[bytes, bytes], ...] = ()
+
+
+class _Requisicao:
+    """Dados de uma requisição HTTP recebida pelo servidor ASGI"""
+
+    __slots__ = ("metodo", "caminho", "parametros", "corpo", "cabecalhos")
+
+    def __init__(
+        self,
+        metodo: str,
+        caminho: str,
+        parametros: Dict[str, str],
+        corpo: bytes,
+        cabecalhos: Optional[Dict[str, str]] = None,
+    ):
+        self.metodo = metodo
+        self.caminho = caminho
+        self.parametros = parametros
+        self.corpo = corpo
+        # Nomes em minúsculas
+        self.cabecalhos = cabecalhos or {}
+
+    def json(self):
+        """
+        Decodifica o corpo JSON
+
+        Raises:
+            ValueError: Se o corpo não for JSON válido
+        """
+        return codec.decodificar(self.corpo or b"null")
+
+
+def _parametros_listagem(parametros: Dict[str, str]):
+    """
+    Lê os parâmetros de paginação e projeção, como a aplicação Flask
+
+    Returns:
+        Tupla (limite, cursor, campos); cada item é None quando ausente
+
+    Raises:
+        ValueError: Se limit ou cursor não forem inteiros
+    """
+    try:
+        limite = parametros.get("limit")
+        limite = min(int(limite), LIMITE_MAXIMO_PAGINA) if limite else None
+        cursor = parametros.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        raise ValueError("Parâmetros limit e cursor devem ser inteiros")
+
+    fields = parametros.get("fields")
+    campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+    return limite, cursor, campos
+
+
+def _parametros_filtro(parametros: Dict[str, str]) -> Dict:
+    """
+    Lê os filtros por faixa de valor e quantidade, como a aplicação Flask
+
+    Raises:
+        ValueError: Se algum filtro não for numérico
+    """
+    filtros = {}
+    for nome, converter in FILTROS_FAIXA.items():
+        valor = parametros.get(nome)
+        if valor:
+            try:
+                filtros[nome] = converter(valor)
+            except ValueError:
+                raise ValueError(f"Parâmetro {nome} inválido: {valor}")
+    return filtros
+
+
+async def _enviar(
+    send,
+    status: int,
+    corpo: bytes,
+    tipo: bytes = b"application/json",
+    cabecalhos: Tuple[Tuple[bytes, bytes], ...] = (),
+):
+    """Envia uma resposta completa"""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", tipo),
+                (b"content-length", str(len(corpo)).encode()),
+                *cabecalhos,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _enviar_em_partes(
+    send, status: int, partes: AsyncIterator[bytes], tipo: bytes = b"application/json"
+):
+    """Envia uma resposta em streaming, uma parte do corpo por mensagem"""
+    await send(
+        {"type": "http.response.start", "status": status, "headers": [(b"content-type", tipo)]}
+    )
+    async for parte in partes:
+        await send({"type": "http.response.body", "body": parte, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class _AvisoEventos:
+    """
+    Acorda as conexões de /api/eventos de um loop a cada publicação
+
+    Registra uma única função no barramento, que agenda o aviso no loop
+    (publicar acontece nas threads do pool); as conexões esperam em um
+    asyncio.Event trocado a cada aviso.
+    """
+
+    def __init__(self, barramento: BarramentoEventos, loop: asyncio.AbstractEventLoop):
+        self.barramento = barramento
+        self.loop = loop
+        self._novo = asyncio.Event()
+        barramento.ouvir(self._publicado)
+
+    def _publicado(self):
+        """Chamado na thread que publicou"""
+        try:
+            self.loop.call_soon_threadsafe(self._avisar)
+        except RuntimeError:
+            # Loop encerrado: ninguém mais espera por este aviso
+            pass
+
+    def _avisar(self):
+        self._novo.set()
+        self._novo = asyncio.Event()
+
+    async def aguardar(self, timeout: float):
+        """Espera a próxima publicação por no máximo timeout segundos"""
+        try:
+            await asyncio.wait_for(self._novo.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def encerrar(self):
+        """Retira o aviso do barramento"""
+        self.barramento.deixar_de_ouvir(self._publicado)
+
+
+class _FluxoEventos:
+    """Corpo em streaming de /api/eventos (text/event-stream)"""
+
+    tipo = b"text/event-stream"
+
+    def __init__(self, gerenciador: ProdutoManagerAssincrono, aviso: _AvisoEventos, sequencia):
+        self.gerenciador = gerenciador
+        self.aviso = aviso
+        self.sequencia = sequencia
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """
+        Gera os eventos posteriores à sequência até DURACAO_MAXIMA_EVENTOS,
+        como a rota da aplicação Flask
+        """
+        barramento = self.aviso.barramento
+        sequencia = self.sequencia
+        fim = time.monotonic() + DURACAO_MAXIMA_EVENTOS
+        while True:
+            try:
+                eventos = barramento.eventos_desde(sequencia, 0, EVENTOS_POR_ENVIO)
+            except EventosPerdidos:
+                sequencia = barramento.sequencia
+                yield formatar_evento(barramento.epoca, sequencia, "reset", {})
+                continue
+            if eventos:
+                yield b"".join(formatar_evento(barramento.epoca, *evento) for evento in eventos)
+                sequencia = eventos[-1].sequencia
+                continue
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                return
+            # Lê o evento novo antes de esperar: um aviso agendado depois
+            # da leitura acima ainda acorda esta espera
+            await self.aviso.aguardar(min(INTERVALO_PING_EVENTOS, restante))
+            if barramento.sequencia == sequencia:
+                yield b": ping\n\n"
+                await self.gerenciador.sincronizar()
+
+
+async def _corpo_json(lotes: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    """Gera um array JSON, um lote por vez"""
+    separador = b"["
+    async for lote in lotes:
+        yield separador + b",".join(map(codec.codificar, lote))
+        separador = b","
+    yield b"[]" if separador == b"[" else b"]"
+
+
+class AplicacaoAsgi:
+    """
+    Aplicação ASGI com as rotas da API de produtos
+
+    Cada rota é um método que recebe a requisição e retorna (status,
+    dados); erros de validação (ValueError) viram 400 e os demais 500,
+    como na aplicação Flask.
+    """
+
+    def __init__(
+        self,
+        gerenciador: ProdutoManagerAssincrono,
+        idempotencia: Optional[CacheIdempotencia] = None,
+    ):
+        """
+        Args:
+            gerenciador: Gerenciador usado pelas rotas
+            idempotencia: Respostas por Idempotency-Key dos POST (None usa
+                um cache só em memória)
+        """
+        self.gerenciador = gerenciador
+        self.idempotencia = CacheIdempotencia() if idempotencia is None else idempotencia
+        self.rotas: Dict[str, Dict[str, Callable[[_Requisicao], Awaitable[Resposta]]]] = {
+            "/api/produtos": {"GET": self.listar_produtos, "POST": self.adicionar_produto},
+            "/api/produtos/alfabetica": {"GET": self.listar_alfabetica},
+            "/api/produtos/busca": {"GET": self.buscar_produtos},
+            "/api/comprar": {"POST": self.comprar_produto},
+            "/api/pedidos": {"POST": self.comprar_pedido},
+            "/api/eventos": {"GET": self.transmitir_eventos},
+        }
+        self._aviso: Optional[_AvisoEventos] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            requisicao = await self._ler_requisicao(scope, receive)
+            status, dados = await self.tratar(requisicao)
+            if hasattr(dados, "__aiter__"):
+                await _enviar_em_partes(
+                    send, status, dados, getattr(dados, "tipo", b"application/json")
+                )
+            elif isinstance(dados, _CorpoPronto):
+                await _enviar(send, status, *dados)
+            else:
+                await _enviar(send, status, codec.codificar(dados))
+
+    async def _ciclo_de_vida(self, receive, send):
+        """Trata as mensagens de início e encerramento do servidor"""
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                self.gerenciador.fechar()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _ler_requisicao(scope, receive) -> _Requisicao:
+        """Lê o corpo completo e a query string de uma requisição HTTP"""
+        partes: List[bytes] = []
+        while True:
+            mensagem = await receive()
+            partes.append(mensagem.get("body", b""))
+            if not mensagem.get("more_body"):
+                break
+        consulta = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return _Requisicao(
+            scope["method"],
+            scope["path"],
+            {chave: valores[-1] for chave, valores in consulta.items()},
+            b"".join(partes),
+            {
+                nome.decode("latin-1").lower(): valor.decode("latin-1")
+                for nome, valor in scope.get("headers", [])
+            },
+        )
+
+    async def tratar(self, requisicao: _Requisicao) -> Resposta:
+        """Encaminha a requisição à rota e converte erros em respostas JSON"""
+        metodos = self.rotas.get(requisicao.caminho.rstrip("/") or "/")
+        if metodos is None:
+            return 404, {"error": "Recurso não encontrado"}
+        rota = metodos.get(requisicao.metodo)
+        if rota is None:
+            return 405, {"error": "Método não permitido"}
+
+        chave = requisicao.cabecalhos.get("idempotency-key")
+        if requisicao.metodo == "POST" and chave is not None:
+            return await self._tratar_idempotente(requisicao, rota, chave)
+        return await self._executar(requisicao, rota)
+
+    async def _executar(self, requisicao: _Requisicao, rota) -> Resposta:
+        """Executa a rota após sincronizar com os outros workers"""
+        await self.gerenciador.sincronizar()
+        try:
+            return await rota(requisicao)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def _tratar_idempotente(self, requisicao: _Requisicao, rota, chave: str) -> Resposta:
+        """
+        Executa a rota uma única vez por Idempotency-Key, como o decorador
+        idempotente da aplicação Flask
+
+        O cache lê e anexa ao log sob flock, então é usado em uma thread.
+        """
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return 400, {"error": "Idempotency-Key inválida"}
+        impressao = impressao_requisicao(requisicao.metodo, requisicao.caminho, requisicao.corpo)
+        try:
+            guardada = await asyncio.to_thread(self.idempotencia.iniciar, chave, impressao)
+        except ConflitoIdempotencia as e:
+            return e.status, {"error": str(e)}
+        if guardada is not None:
+            return guardada.status, _CorpoPronto(
+                guardada.corpo, guardada.tipo.encode(), ((b"idempotent-replayed", b"true"),)
+            )
+
+        try:
+            status, dados = await self._executar(requisicao, rota)
+        except BaseException:
+            await asyncio.to_thread(self.idempotencia.cancelar, chave)
+            raise
+        if status >= 500:
+            await asyncio.to_thread(self.idempotencia.cancelar, chave)
+            return status, dados
+        corpo = codec.codificar(dados)
+        await asyncio.to_thread(
+            self.idempotencia.concluir, chave, impressao, status, corpo, "application/json"
+        )
+        return status, _CorpoPronto(corpo, b"application/json")
+
+    async def _listar(self, requisicao: _Requisicao, ordem: str) -> Resposta:
+        """Lista produtos na ordem pedida, paginando quando há limit ou cursor"""
+        limite, cursor, campos = _parametros_listagem(requisicao.parametros)
+        filtros = _parametros_filtro(requisicao.parametros)
+        ordem = requisicao.parametros.get("sort") or ordem
+        if filtros or ordem not in ("id", "alfabetica"):
+            paginado = limite is not None or cursor is not None
+            pagina = await self.gerenciador.consultar_produtos(
+                **filtros,
+                ordem=ordem,
+                limite=(limite or TAMANHO_PAGINA_PADRAO) if paginado else None,
+                cursor=cursor,
+                campos=campos,
+            )
+            return 200, pagina if paginado else pagina["produtos"]
+        if limite is None and cursor is None:
+            return 200, _corpo_json(self.gerenciador.iterar_produtos(ordem, campos))
+        pagina = await self.gerenciador.paginar_produtos(
+            ordem, limite or TAMANHO_PAGINA_PADRAO, cursor, campos
+        )
+        return 200, pagina
+
+    async def listar_produtos(self, requisicao: _Requisicao) -> Resposta:
+        """API: Lista todos os produtos"""
+        return await self._listar(requisicao, "id")
+
+    async def listar_alfabetica(self, requisicao: _Requisicao) -> Resposta:
+        """API: Lista produtos em ordem alfabética"""
+        return await self._listar(requisicao, "alfabetica")
+
+    async def buscar_produtos(self, requisicao: _Requisicao) -> Resposta:
+        """API: Pesquisa produtos pelo nome"""
+        parametros = requisicao.parametros
+        try:
+            limite = int(parametros["limit"])
+        except (KeyError, ValueError):
+            limite = None
+        termo = parametros.get("q", "")
+        return 200, self.gerenciador.pesquisar(termo, parametros.get("modo", "tokens"), limite)
+
+    async def adicionar_produto(self, requisicao: _Requisicao) -> Resposta:
+        """API: Adiciona um novo produto"""
+        data = requisicao.json()
+        produto = await self.gerenciador.adicionar_produto(
+            data["produto"], data["quantidade"], data["valor"]
+        )
+        return 201, produto
+
+    async def comprar_produto(self, requisicao: _Requisicao) -> Resposta:
+        """API: Processa compra de produto"""
+        data = requisicao.json()
+        resultado = await self.gerenciador.comprar_produto(
+            data["produto_id"], data["quantidade"], data.get("confirmar", False)
+        )
+        return 200, resultado
+
+    async def comprar_pedido(self, requisicao: _Requisicao) -> Resposta:
+        """API: Processa um pedido com vários produtos"""
+        data = requisicao.json()
+        try:
+            itens = [(item["produto_id"], item["quantidade"]) for item in data["itens"]]
+        except (KeyError, TypeError):
+            return 400, {"error": "Informe itens com produto_id e quantidade"}
+        return 200, await self.gerenciador.comprar_produtos(itens, data.get("confirmar", False))
+
+    def _aviso_eventos(self) -> _AvisoEventos:
+        """Aviso de publicações do loop em execução (recriado se o loop mudou)"""
+        loop = asyncio.get_running_loop()
+        if self._aviso is None or self._aviso.loop is not loop:
+            if self._aviso is not None:
+                self._aviso.encerrar()
+            self._aviso = _AvisoEventos(self.gerenciador.manager.eventos, loop)
+        return self._aviso
+
+    async def transmitir_eventos(self, requisicao: _Requisicao) -> Resposta:
+        """API: Alterações do catálogo em Server-Sent Events"""
+        barramento = self.gerenciador.manager.eventos
+        desde = requisicao.cabecalhos.get("last-event-id") or requisicao.parametros.get("desde")
+        sequencia = barramento.sequencia if not desde else barramento.sequencia_do_id(desde)
+        return 200, _FluxoEventos(self.gerenciador, self._aviso_eventos(), sequencia)
+
+
+app = AplicacaoAsgi(ProdutoManagerAssincrono(manager), idempotencia)
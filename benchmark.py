@@ -0,0 +1,609 @@
+"""
+Benchmarks do módulo produto_manager
+
+Mede cada método do gerenciador (operações por segundo, percentis de
+latência e memória alocada), a aplicação Flask sob carga de várias threads
+chamando a interface WSGI diretamente, e as comparações entre
+implementações alternativas. Os resultados podem ser gravados em JSON e
+comparados com os de outro commit.
+
+Uso:
+    python benchmark.py
+    python benchmark.py --tamanhos 1000 100000 --grupos metodos wsgi
+    python benchmark.py --json atual.json --comparar base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import codec
+from produto import Produto
+from produto_manager import ProdutoManager
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000, 1_000_000]
+
+# Maior catálogo usado nos benchmarks que gravam o arquivo a cada operação
+TAMANHO_MAXIMO_DISCO = 100_000
+
+# Grupos de benchmarks que podem ser escolhidos em --grupos
+GRUPOS = ("metodos", "wsgi", "comparacoes")
+
+# Variação tolerada por --comparar antes de apontar uma regressão
+TOLERANCIA_PADRAO = 0.2
+
+
+def gerar_catalogo(tamanho: int, semente: int = 42) -> List[Dict]:
+    """
+    Gera um catálogo sintético de produtos
+
+    Args:
+        tamanho: Quantidade de produtos
+        semente: Semente do gerador aleatório
+
+    Returns:
+        Lista de produtos no formato do produtos.json
+    """
+    rnd = random.Random(semente)
+    return [
+        {
+            "id": i,
+            "produto": f"Produto {rnd.randrange(tamanho * 10):08d}",
+            "quantidade": rnd.randrange(1000),
+            "valor": round(rnd.uniform(1, 5000), 2),
+        }
+        for i in range(1, tamanho + 1)
+    ]
+
+
+def criar_manager(tamanho: int, diretorio: str) -> ProdutoManager:
+    """Cria um gerenciador em memória com um catálogo sintético"""
+    manager = ProdutoManager(os.path.join(diretorio, f"bench_{tamanho}.json"))
+    manager.produtos = gerar_catalogo(tamanho)
+    manager.proximo_id = tamanho + 1
+    return manager
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Executa a função repetidamente e retorna o tempo médio em microssegundos"""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def resumir(latencias: List[float], duracao: Optional[float] = None) -> Dict[str, float]:
+    """
+    Resume uma amostra de latências
+
+    Args:
+        latencias: Duração de cada operação, em segundos
+        duracao: Tempo total de parede; informado quando as operações
+            rodaram em paralelo (caso contrário, é a soma das latências)
+
+    Returns:
+        Dict com operações por segundo e percentis (p50, p90, p99 e máximo)
+        em microssegundos
+    """
+    percentis = statistics.quantiles(latencias, n=100, method="inclusive")
+    return {
+        "operacoes": len(latencias),
+        "ops_por_segundo": len(latencias) / (duracao or sum(latencias)),
+        "p50_us": percentis[49] * 1e6,
+        "p90_us": percentis[89] * 1e6,
+        "p99_us": percentis[98] * 1e6,
+        "max_us": max(latencias) * 1e6,
+    }
+
+
+def medir_latencias(funcao: Callable[[], object], repeticoes: int) -> Dict[str, float]:
+    """Executa a função repetidamente, cronometrando cada chamada (ver resumir)"""
+    relogio = time.perf_counter
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = relogio()
+        funcao()
+        latencias.append(relogio() - inicio)
+    return resumir(latencias)
+
+
+def memoria_alocada(funcao: Callable[[], object]) -> float:
+    """Pico de memória (em KiB) alocada durante uma chamada da função"""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        funcao()
+        return (tracemalloc.get_traced_memory()[1] - base) / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_metodos(tamanho: int, diretorio: str) -> Dict[str, Dict[str, float]]:
+    """
+    Mede os métodos do gerenciador sobre um catálogo sintético
+
+    As repetições diminuem com o tamanho do catálogo. Os métodos que gravam
+    no arquivo só são medidos até TAMANHO_MAXIMO_DISCO produtos.
+
+    Returns:
+        Dict método -> resumo (ver resumir) com o pico de memória alocada
+        em uma chamada (memoria_kib)
+    """
+    manager = criar_manager(tamanho, diretorio)
+    rnd = random.Random(7)
+    nomes = [p.produto for p in rnd.sample(manager.produtos, min(tamanho, 1024))]
+    leituras = max(100, min(20_000, 20_000_000 // tamanho))
+    listagens = max(3, min(200, 2_000_000 // tamanho))
+
+    metodos = {
+        "buscar_produto_por_id": (
+            lambda: manager.buscar_produto_por_id(rnd.randrange(1, tamanho + 1)),
+            leituras,
+        ),
+        "buscar_produto_por_nome": (
+            lambda: manager.buscar_produto_por_nome(rnd.choice(nomes)),
+            leituras,
+        ),
+        "pesquisar": (lambda: manager.pesquisar(rnd.choice(nomes)[:10], "prefixo", 20), leituras),
+        "paginar_produtos": (
+            lambda: manager.paginar_produtos("alfabetica", 50, rnd.randrange(1, tamanho + 1)),
+            leituras,
+        ),
+        "listar_produtos_alfabetica": (manager.listar_produtos_alfabetica, listagens),
+    }
+    if tamanho <= TAMANHO_MAXIMO_DISCO:
+        # Grava o catálogo para que cada gravação tenha o custo real
+        manager.produtos = [dict(p, quantidade=10**9) for p in manager.produtos]
+        with manager._transacao():
+            manager.armazenamento.gravar([], manager.produtos)
+        gravacoes = max(5, min(200, 2_000_000 // tamanho))
+        metodos["adicionar_produto"] = (
+            lambda: manager.adicionar_produto("Produto novo", 1, 9.9),
+            gravacoes,
+        )
+        metodos["comprar_produto"] = (
+            lambda: manager.comprar_produto(rnd.randrange(1, tamanho + 1), 1, confirmar=True),
+            gravacoes,
+        )
+
+    resultados = {}
+    for nome, (funcao, repeticoes) in metodos.items():
+        resultados[nome] = medir_latencias(funcao, repeticoes)
+        resultados[nome]["memoria_kib"] = memoria_alocada(funcao)
+    manager.fechar()
+    return resultados
+
+
+def _carga_wsgi(app, requisitar, threads: int, requisicoes: int) -> Dict[str, float]:
+    """
+    Dispara requisições de várias threads, cada uma com seu cliente WSGI
+
+    Raises:
+        RuntimeError: Se alguma requisição não retornar 200
+    """
+    latencias: List[float] = []
+    erros: List[Exception] = []
+
+    def cliente():
+        try:
+            conexao = app.test_client()
+            for _ in range(requisicoes):
+                inicio = time.perf_counter()
+                resposta = requisitar(conexao)
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    raise RuntimeError(
+                        f"Resposta {resposta.status_code}: {resposta.get_data()[:200]!r}"
+                    )
+        except Exception as e:
+            erros.append(e)
+
+    clientes = [threading.Thread(target=cliente) for _ in range(threads)]
+    inicio = time.perf_counter()
+    for thread in clientes:
+        thread.start()
+    for thread in clientes:
+        thread.join()
+    if erros:
+        raise erros[0]
+    return resumir(latencias, time.perf_counter() - inicio)
+
+
+def bench_wsgi(
+    tamanho: int, diretorio: str, threads: int = 8, requisicoes: int = 100
+) -> Dict[str, Dict[str, float]]:
+    """
+    Carga na aplicação Flask com várias threads chamando a interface WSGI
+
+    Cada thread usa o cliente de teste do Flask, que monta o ambiente WSGI
+    e chama a aplicação no mesmo processo, sem rede. O gerenciador usa o
+    modo journal, como em produção com muitas compras.
+
+    Args:
+        tamanho: Produtos no catálogo
+        diretorio: Diretório dos arquivos de dados
+        threads: Clientes simultâneos
+        requisicoes: Requisições por cliente em cada cenário
+
+    Returns:
+        Dict cenário -> resumo (ver resumir)
+
+    Raises:
+        RuntimeError: Se alguma requisição não retornar 200
+    """
+    os.environ.setdefault("PRODUTOS_ARQUIVO", os.path.join(diretorio, "wsgi_padrao.json"))
+    import app as aplicacao
+
+    manager = ProdutoManager(os.path.join(diretorio, f"wsgi_{tamanho}.json"), journal=True)
+    manager.adicionar_produtos_em_lote(dict(p, quantidade=10**9) for p in gerar_catalogo(tamanho))
+    nomes = [p.produto for p in random.sample(manager.produtos, min(tamanho, 1024))]
+    anterior, aplicacao.manager = aplicacao.manager, manager
+    aplicacao.cache.limpar()
+
+    cenarios = {
+        "GET /api/produtos?limit=50": lambda cliente: cliente.get(
+            f"/api/produtos?limit=50&cursor={random.randrange(1, tamanho + 1)}"
+        ),
+        "GET /api/produtos/busca": lambda cliente: cliente.get(
+            "/api/produtos/busca", query_string={"q": random.choice(nomes), "limit": 20}
+        ),
+        "POST /api/comprar": lambda cliente: cliente.post(
+            "/api/comprar",
+            json={
+                "produto_id": random.randrange(1, tamanho + 1),
+                "quantidade": 1,
+                "confirmar": True,
+            },
+        ),
+    }
+
+    resultados = {}
+    try:
+        for nome, requisitar in cenarios.items():
+            resultados[nome] = _carga_wsgi(aplicacao.app, requisitar, threads, requisicoes)
+    finally:
+        aplicacao.manager = anterior
+        aplicacao.cache.limpar()
+        manager.fechar()
+    return resultados
+
+
+def bench_buscar_por_id(tamanho: int, diretorio: str, repeticoes: int = 100_000) -> float:
+    """Latência média de buscar_produto_por_id sobre IDs aleatórios"""
+    manager = criar_manager(tamanho, diretorio)
+    ids = [random.randrange(1, tamanho + 1) for _ in range(1024)]
+    posicao = iter(ids * (repeticoes // len(ids) + 1))
+    return medir(lambda: manager.buscar_produto_por_id(next(posicao)), repeticoes)
+
+
+def bench_listar_alfabetica(tamanho: int, diretorio: str, repeticoes: int = 10) -> float:
+    """Latência média de listar_produtos_alfabetica"""
+    manager = criar_manager(tamanho, diretorio)
+    return medir(manager.listar_produtos_alfabetica, repeticoes)
+
+
+def bench_pedido(tamanho: int, diretorio: str, itens: int = 20, repeticoes: int = 20) -> tuple:
+    """
+    Compara um pedido de vários itens com as mesmas compras feitas uma a uma
+
+    Usa um catálogo gravado em disco, de modo que o custo de persistência
+    entra na medição.
+
+    Returns:
+        Tupla (ms por pedido com comprar_produto, ms por pedido com comprar_produtos)
+    """
+    manager = ProdutoManager(os.path.join(diretorio, f"pedido_{tamanho}.json"))
+    manager.adicionar_produtos_em_lote(dict(p, quantidade=10**9) for p in gerar_catalogo(tamanho))
+    pedido = [(random.randrange(1, tamanho + 1), 1) for _ in range(itens)]
+
+    def individual():
+        for produto_id, quantidade in pedido:
+            manager.comprar_produto(produto_id, quantidade, confirmar=True)
+
+    def em_lote():
+        manager.comprar_produtos(pedido, confirmar=True)
+
+    return medir(individual, repeticoes) / 1000, medir(em_lote, repeticoes) / 1000
+
+
+def bench_gravacao_em_grupo(
+    tamanho: int, diretorio: str, threads: int = 32, compras: int = 20
+) -> Dict[str, float]:
+    """
+    Vazão de compras simultâneas gravando a cada compra e em grupo
+
+    Cada uma das threads confirma compras de produtos aleatórios em um
+    catálogo gravado em disco (snapshot JSON com fsync a cada gravação).
+
+    Returns:
+        Dict modo -> compras por segundo
+    """
+    modos = {"por compra": None, "em grupo (2 ms)": 0.002}
+    resultados = {}
+    for nome, atraso in modos.items():
+        arquivo = os.path.join(diretorio, f"grupo_{tamanho}_{len(resultados)}.json")
+        manager = ProdutoManager(arquivo, atraso_gravacao=atraso)
+        manager.adicionar_produtos_em_lote(
+            dict(p, quantidade=10**9) for p in gerar_catalogo(tamanho)
+        )
+
+        def comprar():
+            for _ in range(compras):
+                manager.comprar_produto(random.randrange(1, tamanho + 1), 1, confirmar=True)
+
+        trabalhadores = [threading.Thread(target=comprar) for _ in range(threads)]
+        inicio = time.perf_counter()
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        resultados[nome] = threads * compras / (time.perf_counter() - inicio)
+        manager.fechar()
+    return resultados
+
+
+def bench_sincronizar(tamanho: int, diretorio: str, repeticoes: int = 20) -> tuple:
+    """
+    Custo de um worker acompanhar as gravações de outro (modo journal)
+
+    Returns:
+        Tupla (µs sem alterações, ms aplicando uma compra incrementalmente,
+        ms relendo o catálogo inteiro)
+    """
+    arquivo = os.path.join(diretorio, f"sincronizar_{tamanho}.json")
+    escritor = ProdutoManager(arquivo, journal=True, limite_journal=2**40)
+    escritor.adicionar_produtos_em_lote(
+        dict(p, quantidade=10**9) for p in gerar_catalogo(tamanho)
+    )
+    leitor = ProdutoManager(arquivo, journal=True, limite_journal=2**40)
+
+    sem_alteracoes = medir(leitor.sincronizar, repeticoes * 100)
+
+    def incremental():
+        escritor.comprar_produto(random.randrange(1, tamanho + 1), 1, confirmar=True)
+        inicio = time.perf_counter()
+        leitor.sincronizar()
+        return time.perf_counter() - inicio
+
+    aplicar = sum(incremental() for _ in range(repeticoes)) / repeticoes * 1000
+
+    def completo():
+        with leitor._transacao():
+            leitor._carregar_dados()
+
+    releitura = medir(completo, max(1, repeticoes // 10)) / 1000
+    escritor.fechar()
+    leitor.fechar()
+    return sem_alteracoes, aplicar, releitura
+
+
+def bench_snapshot(tamanho: int, diretorio: str, repeticoes: int = 3) -> Dict[str, tuple]:
+    """
+    Tempo de gravar e ler o snapshot em cada formato
+
+    Compara o formato anterior (json da biblioteca padrão com indent=2) com
+    o snapshot JSON compacto do codec em uso e com o snapshot binário.
+
+    Returns:
+        Dict formato -> (ms para gravar, ms para ler)
+    """
+    produtos = gerar_catalogo(tamanho)
+    caminho = os.path.join(diretorio, f"snapshot_{tamanho}")
+
+    def gravar_anterior():
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(produtos, f, ensure_ascii=False, indent=2)
+
+    def ler_anterior():
+        with open(caminho, "r", encoding="utf-8") as f:
+            json.load(f)
+
+    def gravar(formato):
+        with open(caminho, "wb") as f:
+            f.write(formato.codificar(produtos))
+
+    formatos = {
+        f"json ({codec.NOME_CODEC})": codec.SnapshotJson(),
+        "binario": codec.SnapshotBinario(),
+    }
+    resultados = {
+        "json indent=2": (medir(gravar_anterior, repeticoes), medir(ler_anterior, repeticoes))
+    }
+    for nome, formato in formatos.items():
+        gravacao = medir(lambda: gravar(formato), repeticoes)
+        resultados[nome] = (gravacao, medir(lambda: formato.ler(caminho), repeticoes))
+    return {nome: (g / 1000, l / 1000) for nome, (g, l) in resultados.items()}
+
+
+def bench_memoria(tamanho: int) -> tuple:
+    """
+    Compara a memória de um catálogo em dicts com a de um catálogo em Produto
+
+    Returns:
+        Tupla (MiB com dicts, MiB com Produto)
+    """
+    medidas = []
+    for converter in (dict, Produto.de_dict):
+        tracemalloc.start()
+        catalogo = [converter(p) for p in gerar_catalogo(tamanho)]
+        medidas.append(tracemalloc.get_traced_memory()[0] / 2**20)
+        tracemalloc.stop()
+        del catalogo
+    return tuple(medidas)
+
+
+def metadados() -> Dict[str, Optional[str]]:
+    """Identifica o ambiente e o commit em que os benchmarks rodaram"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "codec": codec.NOME_CODEC,
+    }
+
+
+def _medidas(resultados: Dict, prefixo: str = "") -> Dict[str, Dict[str, float]]:
+    """Achata os resultados em caminho ("grupo/tamanho/nome") -> medidas"""
+    medidas = {}
+    for chave, valor in resultados.items():
+        caminho = f"{prefixo}{chave}"
+        if isinstance(valor, dict) and "ops_por_segundo" in valor:
+            medidas[caminho] = valor
+        elif isinstance(valor, dict):
+            medidas.update(_medidas(valor, caminho + "/"))
+    return medidas
+
+
+def comparar(base: Dict, atual: Dict, tolerancia: float = TOLERANCIA_PADRAO) -> List[Dict]:
+    """
+    Compara dois resultados gravados com --json
+
+    Uma medida regrediu quando a vazão caiu ou a latência p50 subiu mais
+    que a tolerância. Medidas que só existem em um dos resultados são
+    ignoradas.
+
+    Args:
+        base: Resultado de referência (por exemplo, do commit anterior)
+        atual: Resultado a avaliar
+        tolerancia: Variação relativa aceita (0.2 = 20%)
+
+    Returns:
+        Lista de regressões: {"medida", "base", "atual", "variacao"}
+    """
+    anteriores = _medidas(base["resultados"])
+    regressoes = []
+    for caminho, medida in _medidas(atual["resultados"]).items():
+        anterior = anteriores.get(caminho)
+        if anterior is None:
+            continue
+        for nome, pior_se_maior in (("ops_por_segundo", False), ("p50_us", True)):
+            variacao = medida[nome] / anterior[nome] - 1 if anterior[nome] else 0.0
+            if (variacao if pior_se_maior else -variacao) > tolerancia:
+                regressoes.append(
+                    {
+                        "medida": f"{caminho} {nome}",
+                        "base": anterior[nome],
+                        "atual": medida[nome],
+                        "variacao": variacao,
+                    }
+                )
+    return regressoes
+
+
+def _imprimir_resumos(titulo: str, resumos: Dict[int, Dict[str, Dict[str, float]]]):
+    """Imprime uma tabela de resumos por tamanho de catálogo"""
+    print(
+        f"\n{'produtos':>10} | {titulo:<30} | {'ops/s':>10} | {'p50 (µs)':>10} | "
+        f"{'p90 (µs)':>10} | {'p99 (µs)':>10} | {'memória (KiB)':>13}"
+    )
+    for tamanho, por_nome in resumos.items():
+        for nome, r in por_nome.items():
+            memoria = f"{r['memoria_kib']:>13.1f}" if "memoria_kib" in r else f"{'-':>13}"
+            print(
+                f"{tamanho:>10} | {nome:<30} | {r['ops_por_segundo']:>10.0f} | "
+                f"{r['p50_us']:>10.1f} | {r['p90_us']:>10.1f} | {r['p99_us']:>10.1f} | {memoria}"
+            )
+
+
+def executar_comparacoes(tamanhos: List[int], diretorio: str):
+    """Imprime as tabelas que comparam implementações alternativas"""
+    print(f"\n{'produtos':>10} | buscar_produto_por_id (µs) | listar_produtos_alfabetica (µs)")
+    for tamanho in tamanhos:
+        busca = bench_buscar_por_id(tamanho, diretorio)
+        listagem = bench_listar_alfabetica(tamanho, diretorio)
+        print(f"{tamanho:>10} | {busca:>26.3f} | {listagem:>31.1f}")
+
+    print(f"\n{'produtos':>10} | 20 compras individuais (ms) | pedido com 20 itens (ms)")
+    for tamanho in [t for t in tamanhos if t <= TAMANHO_MAXIMO_DISCO]:
+        individual, em_lote = bench_pedido(tamanho, diretorio)
+        print(f"{tamanho:>10} | {individual:>27.2f} | {em_lote:>24.2f}")
+
+    print(f"\n{'produtos':>10} | {'gravação':<16} | compras/s (32 threads)")
+    for tamanho in [t for t in tamanhos if t <= TAMANHO_MAXIMO_DISCO]:
+        for nome, vazao in bench_gravacao_em_grupo(
+            tamanho, diretorio, compras=max(1, 20_000 // tamanho)
+        ).items():
+            print(f"{tamanho:>10} | {nome:<16} | {vazao:>22.0f}")
+
+    print(
+        f"\n{'produtos':>10} | sincronizar sem alterações (µs) | incremental (ms) | completo (ms)"
+    )
+    for tamanho in [t for t in tamanhos if t <= TAMANHO_MAXIMO_DISCO]:
+        parado, incremental, completo = bench_sincronizar(tamanho, diretorio)
+        print(f"{tamanho:>10} | {parado:>31.2f} | {incremental:>16.3f} | {completo:>13.1f}")
+
+    print(f"\n{'produtos':>10} | {'snapshot':<15} | gravar (ms) | ler (ms)")
+    for tamanho in tamanhos:
+        for nome, (gravacao, leitura) in bench_snapshot(tamanho, diretorio).items():
+            print(f"{tamanho:>10} | {nome:<15} | {gravacao:>11.1f} | {leitura:>8.1f}")
+
+    print(f"\n{'produtos':>10} | memória com dicts (MiB) | memória com Produto (MiB)")
+    for tamanho in tamanhos:
+        dicts, compactos = bench_memoria(tamanho)
+        print(f"{tamanho:>10} | {dicts:>23.1f} | {compactos:>25.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO)
+    parser.add_argument("--grupos", nargs="+", choices=GRUPOS, default=list(GRUPOS))
+    parser.add_argument("--threads", type=int, default=8, help="clientes no benchmark WSGI")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava os resultados em JSON")
+    parser.add_argument("--comparar", metavar="ARQUIVO", help="JSON de referência a comparar")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    args = parser.parse_args()
+
+    resultados: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as diretorio:
+        if "metodos" in args.grupos:
+            resultados["metodos"] = {t: bench_metodos(t, diretorio) for t in args.tamanhos}
+            _imprimir_resumos("método", resultados["metodos"])
+        if "wsgi" in args.grupos:
+            resultados["wsgi"] = {
+                t: bench_wsgi(t, diretorio, args.threads)
+                for t in args.tamanhos
+                if t <= TAMANHO_MAXIMO_DISCO
+            }
+            _imprimir_resumos(f"WSGI ({args.threads} threads)", resultados["wsgi"])
+        if "comparacoes" in args.grupos:
+            executar_comparacoes(args.tamanhos, diretorio)
+
+    saida = {"metadados": metadados(), "resultados": resultados}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        # Ida e volta pelo JSON para que os tamanhos virem texto, como na base
+        regressoes = comparar(base, json.loads(json.dumps(saida)), args.tolerancia)
+        print(f"\nRegressões acima de {args.tolerancia:.0%}: {len(regressoes)}")
+        for r in regressoes:
+            print(f"  {r['medida']}: {r['base']:.1f} -> {r['atual']:.1f} ({r['variacao']:+.0%})")
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
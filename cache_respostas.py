@@ -0,0 +1,97 @@
+"""
+Cache de respostas HTTP validado pela versão do catálogo
+"""
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Número máximo de respostas guardadas (chaves distintas de rota e query string)
+TAMANHO_CACHE_PADRAO = 256
+
+# Maior corpo de resposta (em bytes) guardado no cache
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+
+
+class RespostaEmCache(NamedTuple):
+    """Resposta guardada: corpo já serializado, ETag e cabeçalhos originais"""
+
+    versao: int
+    corpo: bytes
+    etag: str
+    cabecalhos: List[Tuple[str, str]]
+
+
+def calcular_etag(corpo: bytes) -> str:
+    """Calcula um ETag forte a partir do conteúdo da resposta"""
+    return hashlib.blake2b(corpo, digest_size=16).hexdigest()
+
+
+class CacheRespostas:
+    """
+    Cache de respostas por chave, válido enquanto a versão não muda
+
+    Cada entrada guarda a versão do catálogo em que foi gerada; uma
+    consulta com outra versão descarta a entrada. Quando o cache enche, as
+    entradas mais antigas são removidas primeiro. O ETag é calculado sobre o
+    corpo, então respostas iguais em workers diferentes têm o mesmo ETag.
+    """
+
+    def __init__(
+        self, tamanho: int = TAMANHO_CACHE_PADRAO, tamanho_maximo_corpo: int = TAMANHO_MAXIMO_CORPO
+    ):
+        self.tamanho = tamanho
+        self.tamanho_maximo_corpo = tamanho_maximo_corpo
+        self._entradas: Dict[str, RespostaEmCache] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def limpar(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._entradas.clear()
+
+    def obter(self, chave: str, versao: int) -> Optional[RespostaEmCache]:
+        """
+        Retorna a resposta guardada para a chave, se ainda for da versão atual
+
+        Args:
+            chave: Identificação da requisição (rota e query string)
+            versao: Versão atual do catálogo
+
+        Returns:
+            Resposta guardada ou None
+        """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada.versao != versao:
+                del self._entradas[chave]
+                entrada = None
+            return entrada
+
+    def guardar(
+        self, chave: str, versao: int, corpo: bytes, cabecalhos: List[Tuple[str, str]]
+    ) -> Optional[RespostaEmCache]:
+        """
+        Guarda uma resposta gerada na versão informada
+
+        Args:
+            chave: Identificação da requisição (rota e query string)
+            versao: Versão do catálogo lida antes de gerar a resposta
+            corpo: Corpo serializado
+            cabecalhos: Cabeçalhos a repetir nas respostas servidas do cache
+
+        Returns:
+            Entrada guardada, ou None se o corpo exceder tamanho_maximo_corpo
+        """
+        if len(corpo) > self.tamanho_maximo_corpo:
+            return None
+
+        entrada = RespostaEmCache(versao, corpo, calcular_etag(corpo), cabecalhos)
+        with self._lock:
+            self._entradas.pop(chave, None)
+            while len(self._entradas) >= self.tamanho:
+                del self._entradas[next(iter(self._entradas))]
+            self._entradas[chave] = entrada
+        return entrada
@@ -0,0 +1,159 @@
+"""
+Codificação dos dados persistidos e exportados
+
+O JSON usa orjson ou msgspec quando instalados e o módulo json da
+biblioteca padrão caso contrário (a variável PRODUTOS_CODEC força um
+deles). Todos produzem JSON compacto em UTF-8, serializam qualquer Mapping
+(como produto.Produto) como objeto e sinalizam erros de leitura com
+ValueError.
+
+O snapshot do catálogo pode ser gravado em JSON ou em um formato binário
+de registros de tamanho fixo, lido sem interpretar texto.
+"""
+import json
+import os
+import struct
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - dependência opcional
+    msgspec = None
+
+
+def _codificar_json(obj: Any) -> bytes:
+    """Codifica com o módulo json da biblioteca padrão"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=dict).encode("utf-8")
+
+
+def _decodificar_json(dados: bytes) -> Any:
+    """Decodifica com o módulo json da biblioteca padrão"""
+    return json.loads(dados)
+
+
+# Codecs disponíveis: nome -> (codificar, decodificar)
+CODECS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (_codificar_json, _decodificar_json),
+}
+
+if orjson is not None:
+    # orjson.JSONDecodeError já é subclasse de ValueError
+    CODECS["orjson"] = (lambda obj: orjson.dumps(obj, default=dict), orjson.loads)
+
+if msgspec is not None:  # pragma: no cover - dependência opcional
+    _codificador_msgspec = msgspec.json.Encoder(enc_hook=dict)
+    _decodificador_msgspec = msgspec.json.Decoder()
+
+    def _decodificar_msgspec(dados: bytes) -> Any:
+        """Decodifica com msgspec, convertendo o erro em ValueError"""
+        try:
+            return _decodificador_msgspec.decode(dados)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    CODECS["msgspec"] = (_codificador_msgspec.encode, _decodificar_msgspec)
+
+# Codec em uso: o escolhido em PRODUTOS_CODEC ou o mais rápido disponível
+NOME_CODEC = os.environ.get("PRODUTOS_CODEC") or next(
+    nome for nome in ("orjson", "msgspec", "json") if nome in CODECS
+)
+if NOME_CODEC not in CODECS:
+    raise ImportError(f"Codec indisponível em PRODUTOS_CODEC: {NOME_CODEC}")
+
+codificar, decodificar = CODECS[NOME_CODEC]
+
+
+class SnapshotJson:
+    """Snapshot como array JSON de produtos (formato original do produtos.json)"""
+
+    nome = "json"
+
+    def codificar(self, produtos: Sequence[Mapping]) -> bytes:
+        """Serializa a lista de produtos"""
+        return codificar(produtos)
+
+    def ler(self, caminho: str) -> List[Dict]:
+        """
+        Lê um snapshot gravado
+
+        Raises:
+            ValueError: Se o conteúdo for inválido
+        """
+        with open(caminho, "rb") as f:
+            return decodificar(f.read())
+
+
+class SnapshotBinario:
+    """
+    Snapshot binário com registros de tamanho fixo
+
+    Layout (little-endian): cabeçalho com a assinatura b"PRDB", a versão do
+    formato e o número de produtos; um registro de 32 bytes por produto (id,
+    quantidade, valor e posição e tamanho do nome); e, ao final, os nomes
+    concatenados em UTF-8. Posição e tamanho são medidos em caracteres
+    desse texto, que é decodificado uma única vez.
+    """
+
+    nome = "binario"
+    ASSINATURA = b"PRDB"
+    VERSAO = 1
+    CABECALHO = struct.Struct("<4sB3xQ")
+    REGISTRO = struct.Struct("<qqdII")
+
+    def codificar(self, produtos: Sequence[Mapping]) -> bytes:
+        """Serializa a lista de produtos"""
+        registros = bytearray()
+        nomes = []
+        posicao = 0
+        for produto in produtos:
+            nome = produto["produto"]
+            registros += self.REGISTRO.pack(
+                produto["id"], produto["quantidade"], produto["valor"], posicao, len(nome)
+            )
+            nomes.append(nome)
+            posicao += len(nome)
+        cabecalho = self.CABECALHO.pack(self.ASSINATURA, self.VERSAO, len(nomes))
+        return cabecalho + bytes(registros) + "".join(nomes).encode("utf-8")
+
+    def ler(self, caminho: str) -> List[Dict]:
+        """
+        Lê um snapshot gravado
+
+        Raises:
+            ValueError: Se o arquivo não for um snapshot binário válido
+        """
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        if not dados:
+            return []
+        return self.decodificar(memoryview(dados))
+
+    def decodificar(self, dados: memoryview) -> List[Dict]:
+        """
+        Interpreta o conteúdo de um snapshot binário
+
+        Os registros de tamanho fixo são lidos com struct.iter_unpack direto
+        do buffer (um arquivo mapeado com mmap também serve).
+
+        Raises:
+            ValueError: Se o conteúdo não for um snapshot binário válido
+        """
+        try:
+            assinatura, versao, total = self.CABECALHO.unpack_from(dados)
+            if assinatura != self.ASSINATURA or versao != self.VERSAO:
+                raise ValueError("Arquivo não é um snapshot binário de produtos")
+            fim = self.CABECALHO.size + total * self.REGISTRO.size
+            nomes = bytes(dados[fim:]).decode("utf-8")
+            return [
+                {"id": i, "produto": nomes[inicio : inicio + n], "quantidade": q, "valor": v}
+                for i, q, v, inicio, n in self.REGISTRO.iter_unpack(
+                    dados[self.CABECALHO.size : fim]
+                )
+            ]
+        except struct.error as e:
+            raise ValueError(f"Snapshot binário corrompido: {e}") from e
@@ -0,0 +1,217 @@
+"""
+Estatísticas de estoque calculadas sobre colunas
+
+ID, quantidade e valor de cada produto ficam em arrays contíguos
+(array.array), atualizados a cada cadastro e compra. As consultas percorrem
+essas colunas com NumPy quando instalado, usando os próprios arrays como
+buffer (sem cópia), e em Python puro caso contrário; os resultados são os
+mesmos nos dois casos.
+"""
+import heapq
+import math
+import operator
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from produto import Produto
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - dependência opcional
+    numpy = None
+
+# Faixas do histograma de preços quando não informado
+FAIXAS_HISTOGRAMA_PADRAO = 10
+
+
+class ColunasEstoque:
+    """
+    ID, quantidade e valor dos produtos em colunas, na ordem de inclusão
+
+    Não é thread-safe: o gerenciador inclui, atualiza e consulta sob o seu
+    lock (com NumPy, um array não pode crescer enquanto uma consulta o lê).
+    """
+
+    def __init__(self, usar_numpy: Optional[bool] = None):
+        """
+        Args:
+            usar_numpy: Força (True) ou dispensa (False) o NumPy; por padrão
+                usa se estiver instalado
+
+        Raises:
+            ImportError: Se usar_numpy for True sem o NumPy instalado
+        """
+        if usar_numpy and numpy is None:
+            raise ImportError("NumPy não está instalado")
+        self.usar_numpy = numpy is not None if usar_numpy is None else usar_numpy
+        self._ids = array("q")
+        self._quantidades = array("q")
+        self._valores = array("d")
+        self._posicao: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def construir(self, produtos: Iterable[Produto]):
+        """Substitui o conteúdo das colunas pelos produtos informados"""
+        produtos = list(produtos)
+        self._ids = array("q", (p.id for p in produtos))
+        self._quantidades = array("q", (p.quantidade for p in produtos))
+        self._valores = array("d", (p.valor for p in produtos))
+        self._posicao = {produto_id: i for i, produto_id in enumerate(self._ids)}
+
+    def atualizar(self, produto: Produto):
+        """Inclui um produto novo ou atualiza quantidade e valor de um existente"""
+        posicao = self._posicao.get(produto.id)
+        if posicao is None:
+            self._posicao[produto.id] = len(self._ids)
+            self._ids.append(produto.id)
+            self._quantidades.append(produto.quantidade)
+            self._valores.append(produto.valor)
+        else:
+            self._quantidades[posicao] = produto.quantidade
+            self._valores[posicao] = produto.valor
+
+    def _vetores(self):
+        """Visões NumPy (sem cópia) das colunas: ids, quantidades e valores"""
+        return (
+            numpy.frombuffer(self._ids, dtype=numpy.int64),
+            numpy.frombuffer(self._quantidades, dtype=numpy.int64),
+            numpy.frombuffer(self._valores, dtype=numpy.float64),
+        )
+
+    def _extremos(self) -> Tuple[float, float]:
+        """Menor e maior preço (as colunas não podem estar vazias)"""
+        if self.usar_numpy:
+            _, _, valores = self._vetores()
+            return float(valores.min()), float(valores.max())
+        return min(self._valores), max(self._valores)
+
+    def resumo(self) -> Dict:
+        """
+        Totais do estoque
+
+        Returns:
+            Dict no formato {"produtos", "unidades", "sem_estoque",
+            "valor_total" (soma de quantidade × valor), "preco_minimo",
+            "preco_maximo", "preco_medio"}; os preços são None sem produtos
+        """
+        if not self._ids:
+            return {
+                "produtos": 0,
+                "unidades": 0,
+                "sem_estoque": 0,
+                "valor_total": 0.0,
+                "preco_minimo": None,
+                "preco_maximo": None,
+                "preco_medio": None,
+            }
+        if self.usar_numpy:
+            _, quantidades, valores = self._vetores()
+            unidades = int(quantidades.sum())
+            sem_estoque = int(numpy.count_nonzero(quantidades == 0))
+            valor_total = float(numpy.dot(quantidades, valores))
+            soma_precos = float(valores.sum())
+        else:
+            unidades = sum(self._quantidades)
+            sem_estoque = self._quantidades.count(0)
+            valor_total = math.fsum(map(operator.mul, self._quantidades, self._valores))
+            soma_precos = math.fsum(self._valores)
+        menor, maior = self._extremos()
+        return {
+            "produtos": len(self._ids),
+            "unidades": unidades,
+            "sem_estoque": sem_estoque,
+            "valor_total": round(valor_total, 2),
+            "preco_minimo": menor,
+            "preco_maximo": maior,
+            "preco_medio": round(soma_precos / len(self._ids), 2),
+        }
+
+    def estoque_baixo(self, limite: int, maximo: Optional[int] = None) -> List[int]:
+        """
+        IDs dos produtos com quantidade abaixo do limite
+
+        Returns:
+            IDs em ordem crescente de quantidade (e de ID, no empate), no
+            máximo maximo deles
+        """
+        if self.usar_numpy:
+            ids, quantidades, _ = self._vetores()
+            posicoes = numpy.flatnonzero(quantidades < limite)
+            ordem = posicoes[numpy.lexsort((ids[posicoes], quantidades[posicoes]))]
+            return ids[ordem[:maximo]].tolist()
+        encontrados = sorted(
+            (quantidade, produto_id)
+            for produto_id, quantidade in zip(self._ids, self._quantidades)
+            if quantidade < limite
+        )
+        return [produto_id for _, produto_id in encontrados[:maximo]]
+
+    def maior_valor(self, n: int) -> List[int]:
+        """
+        IDs dos n produtos com maior valor em estoque (quantidade × valor)
+
+        Returns:
+            IDs em ordem decrescente de valor em estoque (e crescente de ID,
+            no empate)
+        """
+        n = min(n, len(self._ids))
+        if n <= 0:
+            return []
+        if self.usar_numpy:
+            ids, quantidades, valores = self._vetores()
+            totais = quantidades * valores
+            candidatos = numpy.argpartition(-totais, n - 1)[:n]
+            # O corte de argpartition pode separar empates; inclui todos os
+            # produtos com o mesmo valor do n-ésimo para desempatar por ID
+            candidatos = numpy.flatnonzero(totais >= totais[candidatos].min())
+            ordem = candidatos[numpy.lexsort((ids[candidatos], -totais[candidatos]))]
+            return ids[ordem[:n]].tolist()
+        return [
+            self._ids[i]
+            for i in heapq.nsmallest(
+                n,
+                range(len(self._ids)),
+                key=lambda i: (-self._quantidades[i] * self._valores[i], self._ids[i]),
+            )
+        ]
+
+    def histograma_precos(self, faixas: int = FAIXAS_HISTOGRAMA_PADRAO) -> List[Dict]:
+        """
+        Distribuição dos preços em faixas de mesma largura
+
+        As faixas vão do menor ao maior preço; cada uma inclui o início e
+        exclui o fim, exceto a última, que inclui os dois.
+
+        Returns:
+            Lista de {"inicio", "fim", "produtos"}; vazia sem produtos
+
+        Raises:
+            ValueError: Se faixas não for positivo
+        """
+        if faixas <= 0:
+            raise ValueError("O número de faixas deve ser maior que zero")
+        if not self._valores:
+            return []
+        menor, maior = self._extremos()
+        largura = (maior - menor) / faixas
+        if not largura:
+            contagens = [len(self._valores)] + [0] * (faixas - 1)
+        elif self.usar_numpy:
+            _, _, valores = self._vetores()
+            posicoes = ((valores - menor) / largura).astype(numpy.int64)
+            numpy.minimum(posicoes, faixas - 1, out=posicoes)
+            contagens = numpy.bincount(posicoes, minlength=faixas).tolist()
+        else:
+            contagens = [0] * faixas
+            for valor in self._valores:
+                contagens[min(int((valor - menor) / largura), faixas - 1)] += 1
+        return [
+            {
+                "inicio": menor + i * largura,
+                "fim": maior if i == faixas - 1 else menor + (i + 1) * largura,
+                "produtos": contagem,
+            }
+            for i, contagem in enumerate(contagens)
+        ]
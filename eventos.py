@@ -0,0 +1,169 @@
+"""
+Barramento de eventos das alterações do catálogo
+
+O gerenciador publica um evento por alteração (produto adicionado, compra,
+mudança de estoque disponível), numerado em sequência. Os eventos ficam em
+um buffer circular único: cada assinante guarda apenas o número do último
+evento que recebeu e lê os seguintes, então publicar custa O(1) qualquer
+que seja o número de assinantes, e a memória por assinante não depende do
+volume de alterações. Quem fica para trás mais que a capacidade do buffer
+(ou pede uma sequência desconhecida) recebe EventosPerdidos e deve reler o
+catálogo antes de continuar.
+
+As sequências só valem no barramento que as numerou (cada worker tem o
+seu, recomeçado a cada reinício). Por isso o id enviado ao cliente é
+"<época>:<sequência>", com uma época sorteada por barramento; um id de outra
+época (o cliente reconectou em outro worker ou depois de um reinício) é
+tratado como eventos perdidos.
+
+Quem espera em um loop asyncio não pode bloquear em eventos_desde: registra
+com ouvir() uma função chamada a cada publicação (uma por loop, que acorda
+as conexões dele) e lê sem espera.
+"""
+import itertools
+import secrets
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import codec
+
+# Eventos mantidos para retomada pela sequência
+CAPACIDADE_PADRAO = 1000
+
+
+class Evento(NamedTuple):
+    """Alteração do catálogo"""
+
+    sequencia: int
+    tipo: str
+    dados: Dict[str, Any]
+
+
+class EventosPerdidos(Exception):
+    """Os eventos seguintes à sequência pedida não estão mais no buffer"""
+
+
+def formatar(epoca: str, sequencia: int, tipo: str, dados: Dict[str, Any]) -> bytes:
+    """Formata um evento no protocolo Server-Sent Events, com id época:sequência"""
+    return b"id: %s:%d\nevent: %s\ndata: %s\n\n" % (
+        epoca.encode(),
+        sequencia,
+        tipo.encode(),
+        codec.codificar(dados),
+    )
+
+
+class BarramentoEventos:
+    """
+    Publicação e leitura de eventos por sequência (thread-safe)
+
+    A sequência começa em 0 (nenhum evento); o primeiro evento publicado
+    tem sequência 1.
+    """
+
+    def __init__(self, capacidade: int = CAPACIDADE_PADRAO):
+        """
+        Args:
+            capacidade: Número de eventos mantidos para leitura atrasada
+
+        Raises:
+            ValueError: Se capacidade não for positiva
+        """
+        if capacidade <= 0:
+            raise ValueError("Capacidade deve ser maior que zero")
+        self._eventos: "deque[Evento]" = deque(maxlen=capacidade)
+        # Identifica as sequências deste barramento nos ids enviados
+        self.epoca = secrets.token_hex(4)
+        self._sequencia = 0
+        self._condicao = threading.Condition()
+        self._ouvintes: List[Callable[[], None]] = []
+
+    @property
+    def sequencia(self) -> int:
+        """Sequência do último evento publicado"""
+        return self._sequencia
+
+    def publicar(self, tipo: str, dados: Dict[str, Any]) -> Evento:
+        """
+        Publica um evento e acorda os assinantes à espera
+
+        Returns:
+            Evento publicado, com a próxima sequência
+        """
+        with self._condicao:
+            self._sequencia += 1
+            evento = Evento(self._sequencia, tipo, dados)
+            self._eventos.append(evento)
+            self._condicao.notify_all()
+            ouvintes = list(self._ouvintes)
+        for ouvinte in ouvintes:
+            ouvinte()
+        return evento
+
+    def ouvir(self, ouvinte: Callable[[], None]):
+        """
+        Registra uma função chamada (sem argumentos) após cada publicação
+
+        A função roda na thread que publicou, fora do lock do barramento, e
+        não deve bloquear nem levantar exceções.
+        """
+        with self._condicao:
+            self._ouvintes.append(ouvinte)
+
+    def deixar_de_ouvir(self, ouvinte: Callable[[], None]):
+        """Remove uma função registrada com ouvir"""
+        with self._condicao:
+            self._ouvintes.remove(ouvinte)
+
+    def sequencia_do_id(self, identificador: str) -> Optional[int]:
+        """
+        Sequência de um id gerado por formatar (como o Last-Event-ID)
+
+        Returns:
+            Sequência, ou None se o id for de outra época
+
+        Raises:
+            ValueError: Se o id não estiver no formato época:sequência
+        """
+        epoca, separador, sequencia = identificador.rpartition(":")
+        if not separador or not sequencia.isdigit():
+            raise ValueError("Id de evento deve ter o formato época:sequência")
+        return int(sequencia) if epoca == self.epoca else None
+
+    def eventos_desde(
+        self, sequencia: Optional[int], timeout: Optional[float] = 0, maximo: Optional[int] = None
+    ) -> List[Evento]:
+        """
+        Eventos publicados depois da sequência informada
+
+        Args:
+            sequencia: Sequência do último evento já recebido (None, de
+                um id de outra época, é sempre tratada como perdida)
+            timeout: Tempo máximo (em segundos) de espera por um evento
+                quando não há nenhum novo; 0 não espera e None espera
+                indefinidamente
+            maximo: Número máximo de eventos retornados
+
+        Returns:
+            Eventos em ordem de sequência (vazia se o tempo acabou)
+
+        Raises:
+            EventosPerdidos: Se a sequência for None ou maior que a última
+                publicada, ou se eventos seguintes a ela já saíram do buffer
+        """
+        if sequencia is None:
+            raise EventosPerdidos("Sequência de outra época")
+        with self._condicao:
+            if sequencia == self._sequencia and timeout != 0:
+                self._condicao.wait_for(lambda: self._sequencia > sequencia, timeout)
+            if sequencia > self._sequencia:
+                raise EventosPerdidos(f"Sequência {sequencia} desconhecida")
+            if sequencia == self._sequencia:
+                return []
+            primeira = self._eventos[0].sequencia
+            if sequencia + 1 < primeira:
+                raise EventosPerdidos(f"Eventos posteriores a {sequencia} descartados")
+            inicio = sequencia + 1 - primeira
+            fim = None if maximo is None else inicio + maximo
+            return list(itertools.islice(self._eventos, inicio, fim))
@@ -0,0 +1,168 @@
+"""
+Gravação em grupo (group commit) das alterações do catálogo
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+# Maior número de registros gravados de uma vez pela gravação em grupo
+TAMANHO_LOTE_GRAVACAO_PADRAO = 256
+
+
+class LoteGravacao:
+    """Registros gravados juntos; quem os enviou aguarda a gravação do lote"""
+
+    __slots__ = ("registros", "prazo", "_concluido", "erro")
+
+    def __init__(self, prazo: float):
+        self.registros: List[Dict] = []
+        self.prazo = prazo
+        self._concluido = threading.Event()
+        self.erro: Optional[BaseException] = None
+
+    def concluir(self, erro: Optional[BaseException] = None):
+        """Marca o lote como gravado (ou como falho, se houver erro)"""
+        self.erro = erro
+        self._concluido.set()
+
+    def aguardar(self):
+        """
+        Bloqueia até o lote ser gravado
+
+        Raises:
+            Exception: O erro que impediu a gravação do lote
+        """
+        self._concluido.wait()
+        if self.erro is not None:
+            raise self.erro
+
+
+class GravadorEmGrupo:
+    """
+    Junta alterações de várias requisições em uma única gravação
+
+    Uma thread em segundo plano grava o lote pendente quando ele atinge
+    tamanho_maximo registros ou quando o primeiro registro do lote completa
+    atraso_maximo segundos de espera. Registros enviados durante uma
+    gravação, ou que não cabem no lote pendente, entram no lote seguinte.
+    Os lotes são gravados na ordem em que foram abertos.
+    """
+
+    def __init__(
+        self,
+        gravar: Callable[[List[Dict]], None],
+        atraso_maximo: float,
+        tamanho_maximo: int = TAMANHO_LOTE_GRAVACAO_PADRAO,
+    ):
+        """
+        Inicia a thread de gravação
+
+        Args:
+            gravar: Função que grava de forma durável uma lista de registros
+            atraso_maximo: Maior espera (em segundos) para juntar registros
+                ao lote antes de gravá-lo
+            tamanho_maximo: Número de registros que dispara a gravação sem
+                aguardar o atraso
+
+        Raises:
+            ValueError: Se atraso ou tamanho forem inválidos
+        """
+        if atraso_maximo < 0:
+            raise ValueError("O atraso máximo não pode ser negativo")
+        if tamanho_maximo <= 0:
+            raise ValueError("O tamanho máximo do lote deve ser maior que zero")
+
+        self._gravar = gravar
+        self.atraso_maximo = atraso_maximo
+        self.tamanho_maximo = tamanho_maximo
+        self.lotes_gravados = 0
+        self._lotes: Deque[LoteGravacao] = deque()
+        self._fechado = False
+        self._condicao = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._executar, name="gravador-em-grupo", daemon=True
+        )
+        self._thread.start()
+
+    def enviar(self, registros: Iterable[Dict]) -> LoteGravacao:
+        """
+        Inclui registros no lote pendente
+
+        Args:
+            registros: Alterações no formato do journal
+
+        Returns:
+            Lote em que os registros serão gravados
+
+        Raises:
+            RuntimeError: Se o gravador já foi fechado
+        """
+        with self._condicao:
+            if self._fechado:
+                raise RuntimeError("Gravador em grupo fechado")
+            registros = list(registros)
+            lote = self._lotes[-1] if self._lotes else None
+            if lote is None or len(lote.registros) + len(registros) > self.tamanho_maximo:
+                # Um lote não vazio nunca é aumentado além do tamanho máximo
+                if lote is None or lote.registros:
+                    lote = LoteGravacao(time.monotonic() + self.atraso_maximo)
+                    self._lotes.append(lote)
+                    self._condicao.notify()
+            lote.registros.extend(registros)
+            if len(lote.registros) >= self.tamanho_maximo:
+                self._condicao.notify()
+            return lote
+
+    def _proximo_lote(self) -> Optional[LoteGravacao]:
+        """Aguarda o lote mais antigo ficar pronto para gravação e o retira"""
+        with self._condicao:
+            while True:
+                if not self._lotes:
+                    if self._fechado:
+                        return None
+                    self._condicao.wait()
+                    continue
+                lote = self._lotes[0]
+                restante = lote.prazo - time.monotonic()
+                if (
+                    self._fechado
+                    or restante <= 0
+                    or len(self._lotes) > 1
+                    or len(lote.registros) >= self.tamanho_maximo
+                ):
+                    return self._lotes.popleft()
+                self._condicao.wait(restante)
+
+    def _executar(self):
+        """Laço da thread de gravação"""
+        while True:
+            lote = self._proximo_lote()
+            if lote is None:
+                return
+            try:
+                self._gravar(lote.registros)
+            except BaseException as e:
+                lote.concluir(e)
+            else:
+                self.lotes_gravados += 1
+                lote.concluir()
+
+    def descartar(self, erro: BaseException):
+        """
+        Descarta os lotes ainda não gravados, que recebem o erro informado
+
+        Args:
+            erro: Erro relançado para quem aguarda os lotes descartados
+        """
+        with self._condicao:
+            lotes, self._lotes = self._lotes, deque()
+        for lote in lotes:
+            lote.concluir(erro)
+
+    def fechar(self):
+        """Grava o lote pendente e encerra a thread de gravação"""
+        with self._condicao:
+            self._fechado = True
+            self._condicao.notify()
+        self._thread.join()
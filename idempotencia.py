@@ -0,0 +1,326 @@
+"""
+Respostas guardadas por chave de idempotência (cabeçalho Idempotency-Key)
+
+Uma requisição repetida com a mesma chave recebe a resposta guardada em vez
+de executar a operação de novo. As respostas ficam em um cache LRU com
+validade e são anexadas a um log (uma linha JSON por resposta) ao lado do
+arquivo de dados, de modo que sobrevivem a reinícios e são vistas pelos
+outros workers: quando uma chave não está na memória, as linhas anexadas
+por outros processos desde a última leitura são aplicadas antes da busca.
+O início de cada requisição também é anexado, sob o flock do log, como
+marca de "em andamento": uma repetição que chega a outro worker enquanto a
+primeira executa recebe 409 em vez de executar de novo. O log é reescrito
+só com as respostas e marcas válidas quando passa do dobro da capacidade.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, NamedTuple, Optional
+
+import codec
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows não tem flock
+    fcntl = None
+
+# Respostas mantidas no cache
+CAPACIDADE_PADRAO = 10000
+
+# Validade (em segundos) de uma resposta guardada
+TTL_PADRAO = 24 * 3600.0
+
+# Tamanho máximo de uma Idempotency-Key
+TAMANHO_MAXIMO_CHAVE = 255
+
+# Tempo (em segundos) após o qual uma requisição em andamento é considerada
+# abandonada (worker encerrado no meio dela) e a chave volta a ser aceita
+PRAZO_ANDAMENTO_PADRAO = 60.0
+
+
+def impressao(metodo: str, caminho: str, corpo: bytes) -> str:
+    """
+    Resumo de uma requisição, comparado quando a chave é repetida
+
+    O mesmo cálculo é usado pela aplicação Flask e pela ASGI, que
+    compartilham o log.
+    """
+    return hashlib.sha256(b"\0".join([metodo.encode(), caminho.encode(), corpo])).hexdigest()
+
+
+class RespostaGuardada(NamedTuple):
+    """Resposta de uma requisição idempotente"""
+
+    impressao: str
+    status: int
+    corpo: bytes
+    tipo: str
+    expira_em: float
+
+
+class ConflitoIdempotencia(ValueError):
+    """Chave em uso por outra requisição ou reutilizada com outro conteúdo"""
+
+    def __init__(self, mensagem: str, status: int):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class CacheIdempotencia:
+    """
+    Cache LRU com validade das respostas por chave de idempotência
+
+    Uso: iniciar() antes de executar a operação; se retornar uma resposta,
+    ela é a da execução anterior. Senão, ao final chame concluir() com a
+    resposta (ou cancelar(), para permitir uma nova tentativa).
+    """
+
+    def __init__(
+        self,
+        arquivo: Optional[str] = None,
+        capacidade: int = CAPACIDADE_PADRAO,
+        ttl: float = TTL_PADRAO,
+        relogio: Callable[[], float] = time.time,
+        prazo_andamento: float = PRAZO_ANDAMENTO_PADRAO,
+    ):
+        """
+        Args:
+            arquivo: Log em que as respostas são persistidas (None mantém só
+                em memória)
+            capacidade: Número máximo de respostas guardadas
+            ttl: Validade das respostas em segundos
+            relogio: Função que retorna o instante atual (timestamp)
+            prazo_andamento: Segundos após os quais uma requisição iniciada
+                e não concluída deixa de bloquear a chave
+
+        Raises:
+            ValueError: Se capacidade ou ttl não forem positivos
+        """
+        if capacidade <= 0 or ttl <= 0:
+            raise ValueError("Capacidade e validade devem ser maiores que zero")
+        self.arquivo = arquivo
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.prazo_andamento = prazo_andamento
+        self._relogio = relogio
+        self._respostas: "OrderedDict[str, RespostaGuardada]" = OrderedDict()
+        # Chaves em andamento (em qualquer processo) e quando a marca vence
+        self._em_andamento: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._pid = None
+        # Posição lida do log e inode do arquivo lido (muda na compactação)
+        self._lido = 0
+        self._inode = None
+        self._linhas_log = 0
+        if arquivo is not None:
+            with self._lock:
+                self._sincronizar()
+
+    def __len__(self) -> int:
+        return len(self._respostas)
+
+    def iniciar(self, chave: str, impressao: str) -> Optional[RespostaGuardada]:
+        """
+        Registra o início de uma requisição com a chave
+
+        Args:
+            chave: Valor do cabeçalho Idempotency-Key
+            impressao: Resumo do método, caminho e corpo da requisição
+
+        Returns:
+            Resposta guardada da execução anterior, ou None se a operação
+            deve ser executada
+
+        Raises:
+            ConflitoIdempotencia: Se outra requisição com a chave está em
+                andamento, neste ou em outro processo (409), ou se a chave
+                já foi usada com outro conteúdo (422)
+        """
+        with self._lock:
+            resposta = self._obter(chave)
+            if resposta is not None or self.arquivo is None:
+                return self._iniciar(chave, impressao, resposta)
+            # Conferir e marcar sob o flock: dois workers não iniciam a
+            # mesma chave
+            with self._log_travado():
+                resposta = self._iniciar(chave, impressao, self._obter(chave))
+                if resposta is None:
+                    self._escrever(
+                        {"op": "iniciar", "chave": chave, "expira_em": self._em_andamento[chave]}
+                    )
+                return resposta
+
+    def _iniciar(
+        self, chave: str, impressao: str, resposta: Optional[RespostaGuardada]
+    ) -> Optional[RespostaGuardada]:
+        """Confere a resposta guardada ou marca a chave em andamento (com o lock)"""
+        if resposta is not None:
+            if resposta.impressao != impressao:
+                raise ConflitoIdempotencia("Idempotency-Key já usada com outra requisição", 422)
+            return resposta
+        agora = self._relogio()
+        if self._em_andamento.get(chave, agora) > agora:
+            raise ConflitoIdempotencia("Requisição com a mesma Idempotency-Key em andamento", 409)
+        self._em_andamento[chave] = agora + self.prazo_andamento
+        return None
+
+    def concluir(self, chave: str, impressao: str, status: int, corpo: bytes, tipo: str):
+        """Guarda a resposta da requisição iniciada com a chave"""
+        resposta = RespostaGuardada(impressao, status, corpo, tipo, self._relogio() + self.ttl)
+        with self._lock:
+            self._em_andamento.pop(chave, None)
+            self._guardar(chave, resposta)
+            if self.arquivo is not None:
+                with self._log_travado():
+                    self._escrever(self._registro(chave, resposta))
+
+    def cancelar(self, chave: str):
+        """Encerra a requisição iniciada com a chave sem guardar resposta"""
+        with self._lock:
+            self._em_andamento.pop(chave, None)
+            if self.arquivo is not None:
+                with self._log_travado():
+                    self._escrever({"op": "cancelar", "chave": chave})
+
+    def _obter(self, chave: str) -> Optional[RespostaGuardada]:
+        """Busca uma resposta válida, marcando-a como usada recentemente"""
+        resposta = self._respostas.get(chave)
+        if resposta is None:
+            return None
+        if resposta.expira_em <= self._relogio():
+            del self._respostas[chave]
+            return None
+        self._respostas.move_to_end(chave)
+        return resposta
+
+    def _guardar(self, chave: str, resposta: RespostaGuardada):
+        """Inclui uma resposta, descartando as menos usadas além da capacidade"""
+        self._respostas[chave] = resposta
+        self._respostas.move_to_end(chave)
+        while len(self._respostas) > self.capacidade:
+            self._respostas.popitem(last=False)
+
+    @staticmethod
+    def _registro(chave: str, resposta: RespostaGuardada) -> Dict:
+        """Converte uma resposta em registro do log"""
+        registro = resposta._asdict()
+        registro["chave"] = chave
+        registro["corpo"] = base64.b64encode(resposta.corpo).decode("ascii")
+        return registro
+
+    def _sincronizar(self):
+        """Aplica as linhas do log ainda não lidas (todas, se ele foi reescrito)"""
+        try:
+            info = os.stat(self.arquivo)
+        except FileNotFoundError:
+            return
+        if info.st_ino != self._inode or info.st_size < self._lido:
+            # Log reescrito: as marcas de andamento válidas estão nele
+            self._inode, self._lido, self._linhas_log = info.st_ino, 0, 0
+            self._em_andamento.clear()
+        if info.st_size == self._lido:
+            return
+        with open(self.arquivo, "rb") as f:
+            f.seek(self._lido)
+            dados = f.read()
+        # Uma linha sendo anexada por outro processo fica para a próxima leitura
+        fim = dados.rfind(b"\n") + 1
+        self._lido += fim
+        agora = self._relogio()
+        for linha in dados[:fim].splitlines():
+            self._linhas_log += 1
+            try:
+                self._aplicar(codec.decodificar(linha), agora)
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def _aplicar(self, registro: Dict, agora: float):
+        """Aplica um registro do log: marca de início, cancelamento ou resposta"""
+        chave = registro.pop("chave")
+        operacao = registro.pop("op", None)
+        if operacao == "iniciar":
+            if registro["expira_em"] > agora:
+                self._em_andamento[chave] = registro["expira_em"]
+            return
+        self._em_andamento.pop(chave, None)
+        if operacao == "cancelar":
+            return
+        registro["corpo"] = base64.b64decode(registro["corpo"])
+        resposta = RespostaGuardada(**registro)
+        if resposta.expira_em > agora:
+            self._guardar(chave, resposta)
+
+    def _travar_log(self):
+        """Abre o log para anexar e obtém o flock, reabrindo se foi reescrito"""
+        while True:
+            if self._log is None or self._pid != os.getpid():
+                self._log = open(self.arquivo, "ab")
+                self._pid = os.getpid()
+            if fcntl is not None:
+                fcntl.flock(self._log.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.stat(self.arquivo).st_ino == os.fstat(self._log.fileno()).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            self._log.close()
+            self._log = None
+
+    @contextmanager
+    def _log_travado(self):
+        """
+        Mantém o flock do log, depois de aplicar o que outros processos
+        anexaram (chamado com o lock)
+        """
+        self._travar_log()
+        try:
+            self._sincronizar()
+            yield
+        finally:
+            if self._log is not None and fcntl is not None:
+                fcntl.flock(self._log.fileno(), fcntl.LOCK_UN)
+
+    def _escrever(self, registro: Dict):
+        """Anexa um registro ao log, compactando-o se passou do limite (com o flock)"""
+        # Com o flock, ninguém mais anexa: a posição lida avança junto com a
+        # própria linha
+        linha = codec.codificar(registro) + b"\n"
+        self._log.write(linha)
+        self._log.flush()
+        self._lido += len(linha)
+        self._linhas_log += 1
+        if self._linhas_log > 2 * self.capacidade:
+            self._compactar()
+
+    def _compactar(self):
+        """
+        Reescreve o log só com as respostas e marcas de andamento válidas
+        (chamado com o flock)
+        """
+        agora = self._relogio()
+        temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            for chave, resposta in self._respostas.items():
+                if resposta.expira_em > agora:
+                    f.write(codec.codificar(self._registro(chave, resposta)) + b"\n")
+            for chave, expira_em in self._em_andamento.items():
+                if expira_em > agora:
+                    registro = {"op": "iniciar", "chave": chave, "expira_em": expira_em}
+                    f.write(codec.codificar(registro) + b"\n")
+        os.replace(temporario, self.arquivo)
+        self._log.close()
+        self._log = None
+        self._inode = None
+        self._sincronizar()
+
+    def fechar(self):
+        """Fecha o log"""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,327 @@
+"""
+Estruturas de índice usadas pelo gerenciador de produtos
+"""
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+_PADRAO_TOKEN = re.compile(r"\w+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Normaliza um texto para comparação: casefold, sem acentos e com
+    espaços simples
+
+    Args:
+        texto: Texto original
+
+    Returns:
+        Chave normalizada
+    """
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.split())
+
+
+def _trigramas(chave: str) -> Set[str]:
+    """Retorna os trigramas (substrings de 3 caracteres) de uma chave"""
+    return {chave[i : i + 3] for i in range(len(chave) - 2)}
+
+
+def _substrings_curtas(chave: str) -> Set[str]:
+    """Retorna os caracteres e bigramas (substrings de 1 e 2 caracteres) de uma chave"""
+    return set(chave) | {chave[i : i + 2] for i in range(len(chave) - 1)}
+
+
+def _faixa_prefixo(ordenados: List[str], prefixo: str) -> List[str]:
+    """Retorna os itens de uma lista ordenada que começam com o prefixo"""
+    inicio = bisect_left(ordenados, prefixo)
+    fim = bisect_left(ordenados, prefixo + "\U0010ffff", inicio)
+    return ordenados[inicio:fim]
+
+
+class IndiceNome:
+    """
+    Índice de nomes de produtos com busca exata, por prefixo, por tokens e
+    por substring
+
+    As chaves são normalizadas com normalizar(). A busca por prefixo usa
+    bisect sobre as chaves ordenadas, a busca por tokens usa um índice
+    invertido de palavras e a busca por substring intersecta os conjuntos
+    de um índice de trigramas antes de conferir os candidatos; termos de um
+    ou dois caracteres, curtos demais para trigramas, são respondidos
+    direto por um índice das substrings desse tamanho.
+    """
+
+    def __init__(self):
+        self._chave_por_id: Dict[int, str] = {}
+        self._exato: Dict[str, Set[int]] = {}
+        self._chaves: List[str] = []
+        self._tokens: Dict[str, Set[int]] = {}
+        self._tokens_ordenados: List[str] = []
+        self._trigramas: Dict[str, Set[int]] = {}
+        self._curtas: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._chave_por_id)
+
+    def limpar(self):
+        """Remove todas as entradas do índice"""
+        self._chave_por_id.clear()
+        self._exato.clear()
+        self._chaves.clear()
+        self._tokens.clear()
+        self._tokens_ordenados.clear()
+        self._trigramas.clear()
+        self._curtas.clear()
+
+    def adicionar(self, produto_id: int, nome: str):
+        """
+        Inclui (ou atualiza) o nome de um produto no índice
+
+        Args:
+            produto_id: ID do produto
+            nome: Nome do produto
+        """
+        if produto_id in self._chave_por_id:
+            self.remover(produto_id)
+
+        chave = normalizar(nome)
+        self._chave_por_id[produto_id] = chave
+
+        if chave not in self._exato:
+            self._exato[chave] = set()
+            insort(self._chaves, chave)
+        self._exato[chave].add(produto_id)
+
+        for token in _PADRAO_TOKEN.findall(chave):
+            if token not in self._tokens:
+                self._tokens[token] = set()
+                insort(self._tokens_ordenados, token)
+            self._tokens[token].add(produto_id)
+
+        for trigrama in _trigramas(chave):
+            self._trigramas.setdefault(trigrama, set()).add(produto_id)
+        for substring in _substrings_curtas(chave):
+            self._curtas.setdefault(substring, set()).add(produto_id)
+
+    def remover(self, produto_id: int):
+        """
+        Remove um produto do índice
+
+        Args:
+            produto_id: ID do produto
+        """
+        chave = self._chave_por_id.pop(produto_id, None)
+        if chave is None:
+            return
+
+        self._descartar(self._exato, self._chaves, chave, produto_id)
+        for token in _PADRAO_TOKEN.findall(chave):
+            self._descartar(self._tokens, self._tokens_ordenados, token, produto_id)
+        for mapa, substrings in (
+            (self._trigramas, _trigramas(chave)),
+            (self._curtas, _substrings_curtas(chave)),
+        ):
+            for substring in substrings:
+                ids = mapa[substring]
+                ids.discard(produto_id)
+                if not ids:
+                    del mapa[substring]
+
+    @staticmethod
+    def _descartar(mapa: Dict[str, Set[int]], ordenados: List[str], chave: str, produto_id: int):
+        """Remove um ID de uma entrada, apagando a chave quando fica vazia"""
+        ids = mapa[chave]
+        ids.discard(produto_id)
+        if not ids:
+            del mapa[chave]
+            del ordenados[bisect_left(ordenados, chave)]
+
+    def chave(self, produto_id: int) -> str:
+        """Retorna a chave normalizada de um produto"""
+        return self._chave_por_id[produto_id]
+
+    def exato(self, termo: str) -> Set[int]:
+        """IDs cujo nome normalizado é igual ao termo"""
+        return set(self._exato.get(normalizar(termo), ()))
+
+    def prefixo(self, termo: str) -> Set[int]:
+        """IDs cujo nome normalizado começa com o termo"""
+        ids: Set[int] = set()
+        for chave in _faixa_prefixo(self._chaves, normalizar(termo)):
+            ids |= self._exato[chave]
+        return ids
+
+    def tokens(self, termo: str) -> Set[int]:
+        """IDs em que cada palavra do termo é prefixo de alguma palavra do nome"""
+        resultado = None
+        for parte in _PADRAO_TOKEN.findall(normalizar(termo)):
+            ids: Set[int] = set()
+            for token in _faixa_prefixo(self._tokens_ordenados, parte):
+                ids |= self._tokens[token]
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                break
+        return resultado or set()
+
+    def contem(self, termo: str) -> Set[int]:
+        """
+        IDs cujo nome normalizado contém o termo
+
+        Termos com menos de três caracteres não formam trigramas e são
+        resolvidos pelo índice de substrings curtas.
+        """
+        chave = normalizar(termo)
+        if len(chave) < 3:
+            return set(self._curtas.get(chave, ()))
+
+        conjuntos = sorted((self._trigramas.get(t, set()) for t in _trigramas(chave)), key=len)
+        if not conjuntos[0]:
+            return set()
+        candidatos = set(conjuntos[0])
+        for ids in conjuntos[1:]:
+            candidatos &= ids
+            if not candidatos:
+                return set()
+        return {i for i in candidatos if chave in self._chave_por_id[i]}
+
+
+class IndiceOrdenado:
+    """
+    Índice que mantém produtos ordenados por uma chave
+
+    As entradas são pares (chave, id) mantidos em uma lista ordenada com
+    bisect, de modo que empates são desfeitos pelo ID (ordem de cadastro).
+    Uma lista paralela guarda o valor associado a cada entrada (o próprio
+    produto), permitindo devolver a sequência ordenada com uma cópia
+    simples. A chave de cada produto fica guardada para permitir remoção e
+    atualização sem recalculá-la.
+    """
+
+    def __init__(self):
+        self._entradas: List[Tuple[Any, int]] = []
+        self._valores: List[Any] = []
+        self._chave_por_id: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def construir(self, itens: Iterable[Tuple[int, Any, Any]]):
+        """
+        Reconstrói o índice de uma vez
+
+        Args:
+            itens: Triplas (id do produto, chave de ordenação, valor)
+        """
+        ordenados = sorted(((chave, i), valor) for i, chave, valor in itens)
+        self._entradas = [entrada for entrada, _ in ordenados]
+        self._valores = [valor for _, valor in ordenados]
+        self._chave_por_id = {i: chave for chave, i in self._entradas}
+
+    def adicionar(self, produto_id: int, chave: Any, valor: Any = None):
+        """
+        Inclui (ou reposiciona) um produto no índice
+
+        Args:
+            produto_id: ID do produto
+            chave: Chave de ordenação
+            valor: Valor associado à entrada
+        """
+        if produto_id in self._chave_por_id:
+            self.remover(produto_id)
+        self._chave_por_id[produto_id] = chave
+        posicao = bisect_left(self._entradas, (chave, produto_id))
+        self._entradas.insert(posicao, (chave, produto_id))
+        self._valores.insert(posicao, valor)
+
+    def remover(self, produto_id: int):
+        """
+        Remove um produto do índice
+
+        Args:
+            produto_id: ID do produto
+        """
+        chave = self._chave_por_id.pop(produto_id, None)
+        if chave is not None:
+            posicao = bisect_left(self._entradas, (chave, produto_id))
+            del self._entradas[posicao]
+            del self._valores[posicao]
+
+    def ids(self) -> List[int]:
+        """Retorna os IDs na ordem do índice"""
+        return [produto_id for _, produto_id in self._entradas]
+
+    def valores(self) -> List[Any]:
+        """Retorna os valores na ordem do índice"""
+        return self._valores.copy()
+
+    def fatia(self, apos: Optional[int] = None, limite: Optional[int] = None) -> List[Any]:
+        """
+        Retorna os valores seguintes a um produto, na ordem do índice
+
+        Args:
+            apos: ID do produto a partir do qual continuar (None começa do início)
+            limite: Número máximo de valores (None retorna todos)
+
+        Returns:
+            Lista de valores
+
+        Raises:
+            KeyError: Se o produto de referência não estiver no índice
+        """
+        inicio = 0
+        if apos is not None:
+            inicio = bisect_right(self._entradas, (self._chave_por_id[apos], apos))
+        fim = None if limite is None else inicio + limite
+        return self._valores[inicio:fim]
+
+    def _limites(
+        self, minimo: Any = None, maximo: Any = None, apos: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """Posições (início, fim) das entradas com chave entre minimo e maximo, após apos"""
+        inicio = 0 if minimo is None else bisect_left(self._entradas, (minimo,))
+        if apos is not None:
+            inicio = max(inicio, bisect_right(self._entradas, (self._chave_por_id[apos], apos)))
+        fim = len(self._entradas)
+        if maximo is not None:
+            fim = bisect_right(self._entradas, (maximo, float("inf")))
+        return inicio, fim
+
+    def contar_faixa(self, minimo: Any = None, maximo: Any = None) -> int:
+        """
+        Conta as entradas com chave entre minimo e maximo (inclusive) em O(log n)
+
+        Args:
+            minimo: Menor chave (None não limita)
+            maximo: Maior chave (None não limita)
+        """
+        inicio, fim = self._limites(minimo, maximo)
+        return max(fim - inicio, 0)
+
+    def faixa(
+        self, minimo: Any = None, maximo: Any = None, apos: Optional[int] = None
+    ) -> Iterator[Any]:
+        """
+        Percorre os valores com chave entre minimo e maximo (inclusive), na
+        ordem do índice
+
+        As pontas são localizadas por busca binária e só as entradas da faixa
+        são visitadas. O índice não deve ser alterado durante a iteração.
+
+        Args:
+            minimo: Menor chave (None não limita)
+            maximo: Maior chave (None não limita)
+            apos: ID do produto a partir do qual continuar (None começa do
+                início da faixa)
+
+        Returns:
+            Iterador de valores
+
+        Raises:
+            KeyError: Se o produto de referência não estiver no índice
+        """
+        inicio, fim = self._limites(minimo, maximo, apos)
+        return (self._valores[i] for i in range(inicio, fim))
@@ -0,0 +1,252 @@
+"""
+Métricas de desempenho no formato texto do Prometheus
+
+Contadores, histogramas e medidores são mantidos em memória e exportados
+por RegistroMetricas.exportar. Cada observação custa um lock e uma busca
+binária nos limites do histograma, então a instrumentação pode ficar
+ligada em produção.
+
+As fases de uma requisição (sincronização, gravação, consulta ao SQLite,
+renderização, JSON) são cronometradas com fase(); entre iniciar_requisicao
+e encerrar_requisicao, os tempos da thread também são acumulados para o
+cabeçalho Server-Timing.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Limites (em segundos) dos histogramas de duração
+LIMITES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _rotulos(nomes: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    """Formata os rótulos de uma amostra: {nome="valor",...}"""
+    pares = [
+        '{}="{}"'.format(
+            nome, str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for nome, valor in zip(nomes, valores)
+    ]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    """Formata um valor de amostra"""
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico, opcionalmente separado por rótulos"""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, *rotulos: str):
+        """Soma valor à série dos rótulos informados"""
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def valor(self, *rotulos: str) -> float:
+        """Valor atual da série"""
+        return self._valores.get(rotulos, 0)
+
+    def amostras(self) -> Iterator[str]:
+        """Linhas de amostra no formato texto"""
+        with self._lock:
+            valores = list(self._valores.items())
+        for rotulos, valor in valores:
+            yield f"{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma com limites fixos, opcionalmente separado por rótulos"""
+
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nome: str,
+        ajuda: str,
+        rotulos: Sequence[str] = (),
+        limites: Sequence[float] = LIMITES_PADRAO,
+    ):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(sorted(limites))
+        # Por série: [contagem por faixa (a última é acima do maior limite), soma]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *rotulos: str):
+        """Registra uma observação na série dos rótulos informados"""
+        faixa = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = ([0] * (len(self.limites) + 1), [0.0])
+            serie[0][faixa] += 1
+            serie[1][0] += valor
+
+    def contagem(self, *rotulos: str) -> int:
+        """Número de observações da série"""
+        serie = self._series.get(rotulos)
+        return sum(serie[0]) if serie else 0
+
+    def amostras(self) -> Iterator[str]:
+        """Linhas de amostra no formato texto (faixas acumuladas, soma e contagem)"""
+        with self._lock:
+            series = [
+                (r, list(contagens), soma[0]) for r, (contagens, soma) in self._series.items()
+            ]
+        for rotulos, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                faixa = _rotulos(self.rotulos, rotulos, f'le="{_numero(float(limite))}"')
+                yield f"{self.nome}_bucket{faixa} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, rotulos)} {acumulado}"
+
+
+class Medidor:
+    """Valor instantâneo lido de uma função no momento da exportação"""
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, ler: Callable[[], float]):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.ler = ler
+
+    def amostras(self) -> Iterator[str]:
+        """Linha de amostra no formato texto"""
+        yield f"{self.nome} {_numero(self.ler())}"
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas juntas"""
+
+    def __init__(self):
+        self._metricas: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        """Inclui uma métrica, rejeitando nomes repetidos"""
+        with self._lock:
+            if metrica.nome in self._metricas:
+                raise ValueError(f"Métrica já registrada: {metrica.nome}")
+            self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        """Cria e registra um contador"""
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(
+        self,
+        nome: str,
+        ajuda: str,
+        rotulos: Sequence[str] = (),
+        limites: Sequence[float] = LIMITES_PADRAO,
+    ) -> Histograma:
+        """Cria e registra um histograma"""
+        return self._registrar(Histograma(nome, ajuda, rotulos, limites))
+
+    def medidor(self, nome: str, ajuda: str, ler: Callable[[], float]) -> Medidor:
+        """Cria e registra um medidor; substitui um medidor anterior de mesmo nome"""
+        with self._lock:
+            self._metricas.pop(nome, None)
+        return self._registrar(Medidor(nome, ajuda, ler))
+
+    def exportar(self) -> str:
+        """Exporta todas as métricas no formato texto do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        for metrica in metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.amostras())
+        return "\n".join(linhas) + "\n"
+
+
+# Registro usado pela aplicação e pelos módulos instrumentados
+REGISTRO = RegistroMetricas()
+
+DURACAO_FASES = REGISTRO.histograma(
+    "produtos_fase_duracao_segundos",
+    "Duração das fases das requisições e gravações",
+    ("fase",),
+)
+GRAVACOES = REGISTRO.contador(
+    "produtos_gravacoes_total", "Gravações de alterações no armazenamento"
+)
+BYTES_GRAVADOS = REGISTRO.contador(
+    "produtos_bytes_gravados_total", "Bytes gravados em arquivos de dados e journal", ("arquivo",)
+)
+
+_local = threading.local()
+
+
+def iniciar_requisicao():
+    """Passa a acumular as fases da thread atual para o Server-Timing"""
+    _local.fases = {}
+
+
+def encerrar_requisicao() -> Dict[str, float]:
+    """
+    Encerra o acúmulo das fases da thread atual
+
+    Returns:
+        Dict fase -> duração total em segundos
+    """
+    fases = getattr(_local, "fases", None)
+    _local.fases = None
+    return fases or {}
+
+
+def registrar_fase(nome: str, duracao: float):
+    """Registra a duração (em segundos) de uma fase"""
+    DURACAO_FASES.observar(duracao, nome)
+    fases: Optional[Dict[str, float]] = getattr(_local, "fases", None)
+    if fases is not None:
+        fases[nome] = fases.get(nome, 0.0) + duracao
+
+
+@contextmanager
+def fase(nome: str):
+    """Cronometra o bloco como uma fase (ver registrar_fase)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_fase(nome, time.perf_counter() - inicio)
+
+
+def server_timing(fases: Dict[str, float], total: float) -> str:
+    """
+    Monta o valor do cabeçalho Server-Timing
+
+    Args:
+        fases: Dict fase -> duração em segundos
+        total: Duração total da requisição em segundos
+
+    Returns:
+        Texto como "sincronizar;dur=0.01, total;dur=1.52" (durações em ms)
+    """
+    itens = [f"{nome};dur={duracao * 1000:.2f}" for nome, duracao in fases.items()]
+    itens.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(itens)
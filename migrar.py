@@ -0,0 +1,31 @@
+"""
+Migra o catálogo entre formatos de arquivo de dados
+
+O formato de cada arquivo é escolhido pela extensão: .json (snapshot JSON),
+.bin (snapshot binário) ou .db/.sqlite/.sqlite3 (SQLite). O journal da
+origem, se houver, é incorporado.
+
+Uso:
+    python migrar.py produtos.json produtos.bin
+"""
+import argparse
+import sys
+
+from armazenamento import migrar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("origem", help="Arquivo de dados atual")
+    parser.add_argument("destino", help="Novo arquivo de dados")
+    args = parser.parse_args()
+
+    try:
+        total = migrar(args.origem, args.destino)
+    except ValueError as e:
+        sys.exit(f"Erro: {e}")
+    print(f"{total} produtos copiados de {args.origem} para {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Perfis de execução de requisições lentas ou sorteadas
+
+Uma fração das requisições é executada sob cProfile, com contagem exata de
+chamadas. Com um limite de latência configurado, as demais requisições são
+acompanhadas por um amostrador de pilhas (uma thread que lê a pilha das
+requisições em andamento a cada intervalo) e o perfil só é guardado se a
+requisição passar do limite. Os últimos perfis ficam em um buffer circular.
+"""
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Perfis guardados no buffer circular
+CAPACIDADE_PADRAO = 50
+
+# Intervalo (em segundos) entre duas amostras de pilha
+INTERVALO_AMOSTRAGEM_PADRAO = 0.005
+
+# Funções listadas no relatório do cProfile
+LINHAS_RELATORIO = 40
+
+# Profundidade máxima de uma pilha amostrada
+PROFUNDIDADE_MAXIMA = 128
+
+
+class Perfil(NamedTuple):
+    """Perfil de uma requisição"""
+
+    id: int
+    inicio: float
+    metodo: str
+    caminho: str
+    rota: str
+    status: int
+    duracao: float
+    tipo: str
+    relatorio: str
+
+
+class _Coleta:
+    """Estado do perfil de uma requisição em andamento"""
+
+    __slots__ = ("inicio", "tipo", "perfil", "pilhas")
+
+    def __init__(self, tipo: str, perfil: Optional[cProfile.Profile] = None):
+        self.inicio = time.perf_counter()
+        self.tipo = tipo
+        self.perfil = perfil
+        self.pilhas: Counter = Counter()
+
+
+def _pilha(frame) -> str:
+    """Descreve uma pilha no formato "folded" (da raiz à função atual, separadas por ;)"""
+    funcoes = []
+    while frame is not None and len(funcoes) < PROFUNDIDADE_MAXIMA:
+        codigo = frame.f_code
+        funcoes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(funcoes))
+
+
+class AmostradorPilhas:
+    """
+    Thread que amostra periodicamente a pilha de threads registradas
+
+    Enquanto nenhuma thread está registrada, o amostrador fica parado.
+    """
+
+    def __init__(self, intervalo: float = INTERVALO_AMOSTRAGEM_PADRAO):
+        self.intervalo = intervalo
+        self._coletas: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._ha_coletas = threading.Event()
+        self._fechado = False
+        self._thread = threading.Thread(
+            target=self._executar, name="amostrador-pilhas", daemon=True
+        )
+        self._thread.start()
+
+    def registrar(self, pilhas: Counter, thread_id: Optional[int] = None):
+        """Passa a acumular em pilhas as amostras da thread (a atual, por padrão)"""
+        with self._lock:
+            self._coletas[thread_id or threading.get_ident()] = pilhas
+            self._ha_coletas.set()
+
+    def remover(self, thread_id: Optional[int] = None):
+        """Para de amostrar a thread (a atual, por padrão)"""
+        with self._lock:
+            self._coletas.pop(thread_id or threading.get_ident(), None)
+            if not self._coletas:
+                self._ha_coletas.clear()
+
+    def _executar(self):
+        """Laço da thread de amostragem"""
+        while not self._fechado:
+            self._ha_coletas.wait()
+            time.sleep(self.intervalo)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, pilhas in self._coletas.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        pilhas[_pilha(frame)] += 1
+            del frames
+
+    def fechar(self):
+        """Encerra a thread de amostragem"""
+        self._fechado = True
+        self._ha_coletas.set()
+        self._thread.join()
+
+
+class PerfiladorRequisicoes:
+    """
+    Decide quais requisições perfilar e guarda os perfis resultantes
+
+    Uso: chame iniciar() no começo da requisição, na thread que a atende, e
+    concluir() ao final, na mesma thread.
+    """
+
+    def __init__(
+        self,
+        fracao: float = 0.0,
+        limite_lento: Optional[float] = None,
+        capacidade: int = CAPACIDADE_PADRAO,
+        intervalo_amostragem: float = INTERVALO_AMOSTRAGEM_PADRAO,
+        sortear: Callable[[], float] = random.random,
+    ):
+        """
+        Args:
+            fracao: Fração das requisições (0 a 1) executadas sob cProfile
+            limite_lento: Se informado, as demais requisições são amostradas
+                e guardadas quando duram pelo menos esse tempo (em segundos)
+            capacidade: Número de perfis mantidos; os mais antigos são
+                descartados
+            intervalo_amostragem: Intervalo (em segundos) entre amostras de
+                pilha
+            sortear: Gerador de números em [0, 1) usado para o sorteio
+
+        Raises:
+            ValueError: Se fração, limite ou capacidade forem inválidos
+        """
+        if not 0 <= fracao <= 1:
+            raise ValueError("A fração de requisições perfiladas deve estar entre 0 e 1")
+        if limite_lento is not None and limite_lento < 0:
+            raise ValueError("O limite de latência não pode ser negativo")
+        if capacidade <= 0:
+            raise ValueError("A capacidade deve ser maior que zero")
+
+        self.fracao = fracao
+        self.limite_lento = limite_lento
+        self._sortear = sortear
+        self._perfis: Deque[Perfil] = deque(maxlen=capacidade)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._amostrador = (
+            AmostradorPilhas(intervalo_amostragem) if limite_lento is not None else None
+        )
+
+    def iniciar(self) -> Optional[_Coleta]:
+        """
+        Começa a perfilar a requisição da thread atual, se for o caso
+
+        Returns:
+            Coleta a passar para concluir, ou None se a requisição não será
+            perfilada
+        """
+        if self.fracao and self._sortear() < self.fracao:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:  # pragma: no cover - outro profiler já ativo
+                pass
+            else:
+                return _Coleta("cprofile", perfil)
+        if self._amostrador is not None:
+            coleta = _Coleta("amostragem")
+            self._amostrador.registrar(coleta.pilhas)
+            return coleta
+        return None
+
+    def concluir(
+        self, coleta: Optional[_Coleta], metodo: str, caminho: str, rota: str, status: int
+    ) -> Optional[Perfil]:
+        """
+        Encerra a coleta e guarda o perfil se ele deve ser mantido
+
+        Perfis do cProfile são sempre guardados; amostragens só quando a
+        requisição durou pelo menos limite_lento.
+
+        Returns:
+            Perfil guardado ou None
+        """
+        if coleta is None:
+            return None
+        duracao = time.perf_counter() - coleta.inicio
+        if coleta.perfil is not None:
+            coleta.perfil.disable()
+            relatorio = self._relatorio_cprofile(coleta.perfil)
+        else:
+            self._amostrador.remover()
+            if duracao < self.limite_lento:
+                return None
+            relatorio = self._relatorio_amostragem(coleta.pilhas)
+
+        perfil = Perfil(
+            next(self._ids),
+            time.time(),
+            metodo,
+            caminho,
+            rota,
+            status,
+            duracao,
+            coleta.tipo,
+            relatorio,
+        )
+        with self._lock:
+            self._perfis.append(perfil)
+        return perfil
+
+    @staticmethod
+    def _relatorio_cprofile(perfil: cProfile.Profile) -> str:
+        """Funções com maior tempo acumulado"""
+        saida = io.StringIO()
+        estatisticas = pstats.Stats(perfil, stream=saida)
+        estatisticas.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(LINHAS_RELATORIO)
+        return saida.getvalue()
+
+    def _relatorio_amostragem(self, pilhas: Counter) -> str:
+        """Pilhas amostradas no formato folded, das mais frequentes às menos"""
+        cabecalho = (
+            f"# {sum(pilhas.values())} amostras a cada "
+            f"{self._amostrador.intervalo * 1000:g} ms (formato folded)\n"
+        )
+        return cabecalho + "".join(
+            f"{pilha} {contagem}\n" for pilha, contagem in pilhas.most_common()
+        )
+
+    def perfis(self) -> List[Perfil]:
+        """Perfis guardados, do mais recente ao mais antigo"""
+        with self._lock:
+            return list(reversed(self._perfis))
+
+    def obter(self, perfil_id: int) -> Optional[Perfil]:
+        """Retorna um perfil guardado pelo ID"""
+        with self._lock:
+            return next((p for p in self._perfis if p.id == perfil_id), None)
+
+    def fechar(self):
+        """Encerra o amostrador de pilhas, se houver"""
+        if self._amostrador is not None:
+            self._amostrador.fechar()
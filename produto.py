@@ -0,0 +1,69 @@
+"""
+Representação compacta de um produto em memória
+"""
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator
+
+# Campos de um produto, na ordem em que são serializados
+CAMPOS_PRODUTO = ("id", "produto", "quantidade", "valor")
+
+
+class Produto(Mapping):
+    """
+    Produto com atributos em __slots__
+
+    Ocupa uma fração da memória de um dict com as mesmas quatro chaves e
+    mantém a leitura no formato de dict (produto["quantidade"], dict(produto),
+    comparação com dicts), de modo que a API e os templates continuam vendo
+    o mesmo formato. Os nomes são internados, compartilhando a string entre
+    produtos de mesmo nome.
+
+    A instância é somente leitura pela interface de Mapping; o estoque é
+    alterado pelo gerenciador via atributo (produto.quantidade).
+    """
+
+    __slots__ = CAMPOS_PRODUTO
+
+    def __init__(self, id: int, produto: str, quantidade: int, valor: float):
+        self.id = id
+        self.produto = sys.intern(produto)
+        self.quantidade = quantidade
+        self.valor = valor
+
+    @classmethod
+    def de_dict(cls, dados: Mapping) -> "Produto":
+        """
+        Cria um produto a partir de um dict no formato do produtos.json
+
+        Raises:
+            KeyError: Se faltar algum campo
+        """
+        return cls(dados["id"], dados["produto"], dados["quantidade"], dados["valor"])
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Retorna o produto como dict, na ordem de CAMPOS_PRODUTO"""
+        return {
+            "id": self.id,
+            "produto": self.produto,
+            "quantidade": self.quantidade,
+            "valor": self.valor,
+        }
+
+    def copy(self) -> "Produto":
+        """Retorna uma cópia do produto"""
+        return Produto(self.id, self.produto, self.quantidade, self.valor)
+
+    def __getitem__(self, campo: str) -> Any:
+        if campo not in CAMPOS_PRODUTO:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CAMPOS_PRODUTO)
+
+    def __len__(self) -> int:
+        return len(CAMPOS_PRODUTO)
+
+    def __repr__(self) -> str:
+        return f"Produto({self.para_dict()!r})"
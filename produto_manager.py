@@ -1,38 +1,398 @@
 """
 Módulo para gerenciamento de produtos
 """
-import json
-import os
-from typing import List, Dict, Optional
+import heapq
+import itertools
+import operator
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Dict, Mapping, Optional, Tuple
+
+from armazenamento import (
+    FSYNC_PADRAO,
+    LIMITE_JOURNAL_PADRAO,
+    Armazenamento,
+    criar_armazenamento,
+)
+from estatisticas import FAIXAS_HISTOGRAMA_PADRAO, ColunasEstoque
+from eventos import CAPACIDADE_PADRAO as CAPACIDADE_EVENTOS
+from eventos import BarramentoEventos
+from gravacao_em_grupo import TAMANHO_LOTE_GRAVACAO_PADRAO, GravadorEmGrupo, LoteGravacao
+from indices import IndiceNome, IndiceOrdenado, normalizar
+import metricas
+from produto import CAMPOS_PRODUTO, Produto
+from reservas import TTL_RESERVA_MAXIMO, TTL_RESERVA_PADRAO, ReservaInexistente, TabelaReservas
+
+# Modos de busca aceitos por ProdutoManager.pesquisar
+MODOS_PESQUISA = ("exato", "prefixo", "tokens", "contem")
+
+
+# Versões do catálogo; o contador é compartilhado pelas instâncias para que
+# uma versão identifique o estado de um único gerenciador no processo
+_VERSOES = itertools.count(1)
+
+# Tamanho de página usado por paginar_produtos quando não informado
+TAMANHO_PAGINA_PADRAO = 50
+
+# Produtos por lote entregues por iterar_produtos
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# Ordens aceitas por consultar_produtos; com "-" na frente, decrescente
+ORDENS_CONSULTA = ("id", "alfabetica", "valor", "quantidade")
+
+
+def _na_faixa(valor, minimo, maximo) -> bool:
+    """Indica se valor está entre minimo e maximo (inclusive; None não limita)"""
+    return (minimo is None or valor >= minimo) and (maximo is None or valor <= maximo)
 
 
 class ProdutoManager:
-    def __init__(self, data_file: str = "produtos.json"):
-        """Inicializa o gerenciador de produtos"""
+    def __init__(
+        self,
+        data_file: str = "produtos.json",
+        journal: bool = False,
+        limite_journal: int = LIMITE_JOURNAL_PADRAO,
+        armazenamento: Optional[Armazenamento] = None,
+        fsync: str = FSYNC_PADRAO,
+        atraso_gravacao: Optional[float] = None,
+        tamanho_lote_gravacao: int = TAMANHO_LOTE_GRAVACAO_PADRAO,
+        ttl_reserva: float = TTL_RESERVA_PADRAO,
+        capacidade_eventos: int = CAPACIDADE_EVENTOS,
+    ):
+        """
+        Inicializa o gerenciador de produtos
+
+        Args:
+            data_file: Caminho do arquivo de dados; extensões .db, .sqlite e
+                .sqlite3 usam SQLite (cujas buscas por ID e nome e listagens
+                em ordem de ID ou alfabética são consultas ao banco), as
+                demais um arquivo JSON
+            journal: Se True, cada alteração é anexada a um log em vez de
+                reescrever o arquivo JSON inteiro
+            limite_journal: Tamanho do log (em bytes) que dispara a
+                compactação em segundo plano
+            armazenamento: Repositório a usar no lugar do escolhido por
+                data_file
+            fsync: Política de fsync das gravações: "sempre", "nunca" ou um
+                intervalo como "100ms"
+            atraso_gravacao: Se informado, ativa a gravação em grupo: as
+                alterações são aplicadas em memória e gravadas por uma
+                thread em lotes, esperando no máximo esse tempo (em
+                segundos) para juntar alterações. Supõe um único processo
+                gravando o arquivo de dados; como a memória fica à frente
+                do armazenamento, buscas e listagens passam a ler a memória
+            tamanho_lote_gravacao: Número de registros que dispara a
+                gravação do lote sem esperar o atraso
+            ttl_reserva: Validade padrão (em segundos) das reservas de
+                estoque, compartilhadas pelos processos em data_file +
+                ".reservas"
+            capacidade_eventos: Número de eventos de alteração mantidos
+                para retomada (ver eventos)
+        """
         self.data_file = data_file
-        self.produtos: List[Dict] = []
+        self.armazenamento = armazenamento or criar_armazenamento(
+            data_file, journal, limite_journal, fsync
+        )
+        self._produtos: List[Produto] = []
+        self._indice_id: Dict[int, Produto] = {}
+        self._indice_nome = IndiceNome()
+        self._ordem_alfabetica = IndiceOrdenado()
+        self._ordem_valor = IndiceOrdenado()
+        self._ordem_quantidade = IndiceOrdenado()
+        self._colunas = ColunasEstoque()
+        # Reservas compartilhadas com os outros workers por um log ao lado
+        # do arquivo de dados, alterado só dentro da transação
+        self._reservas = TabelaReservas(ttl_reserva, arquivo=data_file + ".reservas")
+        # Alterações publicadas para quem acompanha o catálogo (/api/eventos)
+        self.eventos = BarramentoEventos(capacidade_eventos)
         self.proximo_id = 1
-        self._carregar_dados()
+        # Versão do catálogo, renovada a cada alteração, e o instante
+        # (timestamp) da última alteração; usados para validar caches
+        self.versao = 0
+        self.modificado_em = time.time()
+        # Lock único do processo: toda compra confere e baixa o estoque e
+        # grava no armazenamento dentro dele (ver _transacao). Locks por
+        # produto não dariam paralelismo, pois a gravação e a transação do
+        # armazenamento, que exclui os outros workers, valem para o arquivo
+        # todo; a gravação em grupo é que divide esse custo entre as compras
+        self._lock = threading.RLock()
+        self._compactacao: Optional[threading.Thread] = None
+        self._lock_compactacao = threading.Lock()
+        with self._lock, self.armazenamento.transacao():
+            self._carregar_dados()
+        # Buscas e listagens lidas do armazenamento (SQLite) em vez da memória,
+        # já com o que outros workers gravaram
+        self.consultas_no_armazenamento = (
+            self.armazenamento.consultas_indexadas and atraso_gravacao is None
+        )
+        self._gravador: Optional[GravadorEmGrupo] = None
+        if atraso_gravacao is not None:
+            self._gravador = GravadorEmGrupo(
+                self._gravar_lote, atraso_gravacao, tamanho_lote_gravacao
+            )
+
+    @property
+    def produtos(self) -> List[Produto]:
+        """Lista interna de produtos, na ordem de cadastro"""
+        return self._produtos
+
+    @produtos.setter
+    def produtos(self, produtos: List[Mapping]):
+        self._substituir(produtos)
+        self.eventos.publicar("recarregado", {})
+
+    def _substituir(self, produtos: List[Mapping]):
+        """Troca a lista de produtos e reconstrói os índices"""
+        produtos = [p if isinstance(p, Produto) else Produto.de_dict(p) for p in produtos]
+        # A paginação por cursor depende da lista em ordem crescente de ID
+        if any(a.id > b.id for a, b in zip(produtos, produtos[1:])):
+            produtos.sort(key=lambda p: p.id)
+        self._produtos = produtos
+        self._reindexar()
+        self._nova_versao()
+
+    def _nova_versao(self):
+        """Registra uma alteração do catálogo"""
+        self.versao = next(_VERSOES)
+        self.modificado_em = time.time()
+
+    def _reindexar(self):
+        """Reconstrói os índices a partir da lista de produtos"""
+        self._indice_id = {p.id: p for p in self._produtos}
+        self._indice_nome.limpar()
+        for produto in self._produtos:
+            self._indice_nome.adicionar(produto.id, produto.produto)
+        self._ordem_alfabetica.construir(
+            (produto_id, self._indice_nome.chave(produto_id), produto)
+            for produto_id, produto in self._indice_id.items()
+        )
+        self._ordem_valor.construir((p.id, p.valor, p) for p in self._produtos)
+        self._ordem_quantidade.construir((p.id, p.quantidade, p) for p in self._produtos)
+        self._colunas.construir(self._produtos)
+
+    def _publicar_estoque(self, produto: Produto, tipo: str = "estoque", **dados):
+        """Publica a quantidade e o disponível de um produto (chamado com o lock)"""
+        self.eventos.publicar(
+            tipo,
+            {
+                "id": produto.id,
+                "quantidade": produto.quantidade,
+                "disponivel": self._disponivel(produto),
+                **dados,
+            },
+        )
+
+    def _indexar(self, produto: Produto):
+        """Inclui um produto novo (ou atualizado) nos índices"""
+        self._indice_id[produto.id] = produto
+        self._indice_nome.adicionar(produto.id, produto.produto)
+        self._ordem_alfabetica.adicionar(produto.id, self._indice_nome.chave(produto.id), produto)
+        self._atualizar_estoque(produto)
+
+    def _atualizar_estoque(self, produto: Produto):
+        """Atualiza os índices de valor e quantidade e as colunas de um produto"""
+        self._ordem_valor.adicionar(produto.id, produto.valor, produto)
+        self._ordem_quantidade.adicionar(produto.id, produto.quantidade, produto)
+        self._colunas.atualizar(produto)
+
+    @contextmanager
+    def _transacao(self):
+        """
+        Seção crítica para ler e alterar os dados persistidos
+
+        Combina o lock do processo com a transação do armazenamento, que
+        exclui outros workers. Ao entrar, se outro processo gravou desde a
+        última leitura, as alterações dele são aplicadas.
+        """
+        with self._lock, self.armazenamento.transacao():
+            if self.armazenamento.alterado():
+                self._sincronizar_dados()
+            yield
+
+    def sincronizar(self) -> bool:
+        """
+        Aplica as alterações gravadas por outros processos (workers)
+
+        Sem alterações o custo é o de ler o contador de geração do
+        armazenamento. Havendo alterações, só o que mudou é lido quando o
+        armazenamento permite (journal JSON e SQLite); o snapshot JSON é
+        relido por inteiro.
+
+        Returns:
+            True se havia alterações a aplicar
+        """
+        if not self.armazenamento.alterado():
+            return False
+        with self._transacao():
+            return True
 
     def _carregar_dados(self):
-        """Carrega os dados do arquivo JSON se existir"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, "r", encoding="utf-8") as f:
-                    self.produtos = json.load(f)
-                    if self.produtos:
-                        # Encontra o maior ID para continuar a sequência
-                        self.proximo_id = max(p["id"] for p in self.produtos) + 1
-            except (json.JSONDecodeError, KeyError):
-                self.produtos = []
-                self.proximo_id = 1
-
-    def _salvar_dados(self):
-        """Salva os dados no arquivo JSON"""
-        with open(self.data_file, "w", encoding="utf-8") as f:
-            json.dump(self.produtos, f, ensure_ascii=False, indent=2)
-
-    def adicionar_produto(self, produto: str, quantidade: int, valor: float) -> Dict:
+        """Carrega os produtos do armazenamento"""
+        try:
+            self._substituir(self.armazenamento.carregar())
+            # Encontra o maior ID para continuar a sequência
+            self.proximo_id = max((p.id for p in self.produtos), default=0) + 1
+        except KeyError:
+            self._substituir([])
+            self.proximo_id = 1
+
+    def _recarregar(self):
+        """
+        Relê os produtos do armazenamento e publica o que mudou
+
+        Como no journal, cada produto novo gera "adicionado" e cada produto
+        alterado gera "estoque"; só se algum produto sumiu (alteração não
+        gravada que foi descartada) é publicado "recarregado".
+        """
+        anteriores = self._indice_id
+        self._carregar_dados()
+        for produto in self._produtos:
+            anterior = anteriores.get(produto.id)
+            if anterior is None:
+                self.eventos.publicar("adicionado", produto.para_dict())
+            elif (anterior.quantidade, anterior.valor, anterior.produto) != (
+                produto.quantidade,
+                produto.valor,
+                produto.produto,
+            ):
+                self._publicar_estoque(produto)
+        if any(produto_id not in self._indice_id for produto_id in anteriores):
+            self.eventos.publicar("recarregado", {})
+
+    def _sincronizar_dados(self):
+        """Aplica as alterações do armazenamento, relendo tudo se necessário"""
+        registros = self.armazenamento.alteracoes()
+        if registros is None:
+            self._recarregar()
+        elif registros:
+            self._aplicar(registros)
+
+    def _aplicar(self, registros: List[Dict]):
+        """Aplica registros no formato do journal aos produtos em memória"""
+        fora_de_ordem = False
+        for registro in registros:
+            if registro["op"] == "adicionar":
+                dados = registro["produto"]
+                produto = self._indice_id.get(dados["id"])
+                if produto is None:
+                    produto = Produto.de_dict(dados)
+                    fora_de_ordem |= bool(self._produtos) and produto.id < self._produtos[-1].id
+                    self._produtos.append(produto)
+                    self._indexar(produto)
+                    self.proximo_id = max(self.proximo_id, produto.id + 1)
+                    self.eventos.publicar("adicionado", produto.para_dict())
+                else:
+                    produto.quantidade = dados["quantidade"]
+                    produto.valor = dados["valor"]
+                    if produto.produto != dados["produto"]:
+                        produto.produto = dados["produto"]
+                        self._indexar(produto)
+                    else:
+                        self._atualizar_estoque(produto)
+                    self._publicar_estoque(produto)
+            elif registro["op"] == "estoque" and registro["id"] in self._indice_id:
+                produto = self._indice_id[registro["id"]]
+                produto.quantidade = registro["quantidade"]
+                self._atualizar_estoque(produto)
+                self._publicar_estoque(produto)
+
+        if fora_de_ordem:
+            self._produtos.sort(key=lambda p: p.id)
+        self._nova_versao()
+
+    def _persistir(self, *registros: Dict) -> Optional[LoteGravacao]:
+        """
+        Persiste alterações no armazenamento em uma única gravação
+
+        Com a gravação em grupo, os registros só são enfileirados; quem
+        alterou deve chamar _aguardar_gravacao com o lote retornado depois
+        de sair da transação.
+
+        Args:
+            registros: Alterações no formato {"op": "adicionar", "produto": {...}}
+                ou {"op": "estoque", "id": ..., "quantidade": ...}
+
+        Returns:
+            Lote em que os registros serão gravados, ou None se já foram
+            gravados
+        """
+        if self._gravador is not None:
+            self._nova_versao()
+            return self._gravador.enviar(registros)
+
+        self._gravar(list(registros))
+        self._nova_versao()
+        return None
+
+    @staticmethod
+    def _aguardar_gravacao(lote: Optional[LoteGravacao]):
+        """
+        Aguarda a gravação em grupo do lote, se houver
+
+        Raises:
+            Exception: O erro que impediu a gravação; nesse caso os dados em
+                memória já foram recarregados do armazenamento
+        """
+        if lote is not None:
+            lote.aguardar()
+
+    def _gravar_lote(self, registros: List[Dict]):
+        """
+        Grava um lote da gravação em grupo (executado na thread do gravador)
+
+        Se a gravação falhar, as alterações do lote e as enfileiradas depois
+        dele (feitas sobre o mesmo estado em memória) são descartadas e os
+        dados são recarregados do armazenamento.
+        """
+        try:
+            with self._transacao():
+                self._gravar(registros)
+        except Exception as e:
+            with self._transacao():
+                self._gravador.descartar(e)
+                self._recarregar()
+            raise
+
+    def _gravar(self, registros: List[Dict]):
+        """Grava registros no armazenamento e inicia a compactação se preciso"""
+        with metricas.fase("gravacao"):
+            self.armazenamento.gravar(registros, self._produtos)
+        metricas.GRAVACOES.incrementar()
+
+        if self.armazenamento.precisa_compactar() and not self._compactando():
+            self._compactacao = threading.Thread(target=self.compactar, daemon=True)
+            self._compactacao.start()
+
+    def _compactando(self) -> bool:
+        """Indica se há uma compactação em andamento"""
+        return self._compactacao is not None and self._compactacao.is_alive()
+
+    def compactar(self):
+        """
+        Incorpora o journal a um novo snapshot do arquivo de dados
+
+        O estado é copiado na transação e gravado fora dela, de modo que as
+        compras continuam sendo registradas durante a compactação.
+        """
+        with self._lock_compactacao:
+            with self._transacao():
+                marca = self.armazenamento.iniciar_compactacao()
+                if marca is None:
+                    return
+                estado = [p.copy() for p in self._produtos]
+            self.armazenamento.concluir_compactacao(estado, marca)
+
+    def fechar(self):
+        """Grava as alterações pendentes e libera os arquivos e conexões do armazenamento"""
+        if self._gravador is not None:
+            self._gravador.fechar()
+        if self._compactacao is not None:
+            self._compactacao.join()
+        self.armazenamento.fechar()
+
+    def adicionar_produto(self, produto: str, quantidade: int, valor: float) -> Produto:
         """
         Adiciona um novo produto ao estoque
 
@@ -42,7 +402,27 @@ class ProdutoManager:
             valor: Valor unitário do produto (obrigatório)
 
         Returns:
-            Dict com o produto adicionado
+            Produto adicionado
+
+        Raises:
+            ValueError: Se algum campo obrigatório estiver vazio ou inválido
+        """
+        nome, quantidade, valor = self._validar_produto(produto, quantidade, valor)
+
+        with self._transacao():
+            novo_produto = self._incluir(nome, quantidade, valor)
+            lote = self._persistir({"op": "adicionar", "produto": novo_produto})
+
+        self._aguardar_gravacao(lote)
+        return novo_produto
+
+    @staticmethod
+    def _validar_produto(produto: str, quantidade: int, valor: float) -> Tuple[str, int, float]:
+        """
+        Valida os campos de um produto novo
+
+        Returns:
+            Tupla (nome sem espaços nas pontas, quantidade, valor)
 
         Raises:
             ValueError: Se algum campo obrigatório estiver vazio ou inválido
@@ -56,38 +436,351 @@ class ProdutoManager:
         if valor <= 0:
             raise ValueError("Valor deve ser maior que zero")
 
-        novo_produto = {
-            "id": self.proximo_id,
-            "produto": produto.strip(),
-            "quantidade": int(quantidade),
-            "valor": float(valor),
-        }
+        return produto.strip(), int(quantidade), float(valor)
 
-        self.produtos.append(novo_produto)
-        self.proximo_id += 1
-        self._salvar_dados()
+    def _incluir(self, nome: str, quantidade: int, valor: float) -> Produto:
+        """Cria o produto com o próximo ID e o inclui na memória e nos índices"""
+        novo_produto = Produto(self.proximo_id, nome, quantidade, valor)
 
+        self._produtos.append(novo_produto)
+        self._indexar(novo_produto)
+        self.proximo_id += 1
+        self.eventos.publicar("adicionado", novo_produto.para_dict())
         return novo_produto
 
-    def listar_produtos(self) -> List[Dict]:
+    def adicionar_produtos_em_lote(self, registros: Iterable[Dict]) -> Dict:
+        """
+        Adiciona vários produtos com uma única gravação no armazenamento
+
+        Cada registro é validado com as mesmas regras de adicionar_produto;
+        os inválidos são relatados e não impedem a inclusão dos demais.
+
+        Args:
+            registros: Dicts com as chaves "produto", "quantidade" e "valor"
+                (valores em texto, como os de um CSV, são convertidos)
+
+        Returns:
+            Dict no formato {"adicionados": [produtos], "erros": [
+                {"registro": posição (a partir de 1), "erro": mensagem}
+            ]}
+        """
+        validos = []
+        erros = []
+        for posicao, registro in enumerate(registros, start=1):
+            try:
+                validos.append(self._validar_registro(registro))
+            except ValueError as e:
+                erros.append({"registro": posicao, "erro": str(e)})
+
+        adicionados = []
+        if validos:
+            with self._transacao():
+                adicionados = [self._incluir(*campos) for campos in validos]
+                lote = self._persistir(*({"op": "adicionar", "produto": p} for p in adicionados))
+            self._aguardar_gravacao(lote)
+
+        return {"adicionados": adicionados, "erros": erros}
+
+    def _validar_registro(self, registro: Dict) -> Tuple[str, int, float]:
+        """Converte e valida um registro recebido em lote"""
+        if not isinstance(registro, dict):
+            raise ValueError("Registro deve ser um objeto com produto, quantidade e valor")
+
+        ausentes = [campo for campo in ("produto", "quantidade", "valor") if campo not in registro]
+        if ausentes:
+            raise ValueError(f"Campos obrigatórios ausentes: {', '.join(ausentes)}")
+
+        try:
+            quantidade = int(registro["quantidade"])
+        except (TypeError, ValueError):
+            raise ValueError("Quantidade deve ser um número inteiro")
+        try:
+            valor = float(registro["valor"])
+        except (TypeError, ValueError):
+            raise ValueError("Valor deve ser um número")
+
+        produto = registro["produto"]
+        if not isinstance(produto, str):
+            raise ValueError("Nome do produto é obrigatório")
+        return self._validar_produto(produto, quantidade, valor)
+
+    def listar_produtos(
+        self,
+        limite: Optional[int] = None,
+        cursor: Optional[int] = None,
+        campos: Optional[List[str]] = None,
+    ) -> List[Mapping]:
         """
-        Lista todos os produtos
+        Lista os produtos em ordem de ID
+
+        Args:
+            limite: Número máximo de produtos (None lista todos)
+            cursor: ID do último produto da página anterior
+            campos: Campos a incluir em cada produto (None inclui todos)
 
         Returns:
             Lista de produtos
+
+        Raises:
+            ValueError: Se o cursor, o limite ou algum campo for inválido
         """
-        return self.produtos.copy()
+        return self._projetar(self._pagina("id", limite, cursor), campos)
 
-    def listar_produtos_alfabetica(self) -> List[Dict]:
+    def listar_produtos_alfabetica(
+        self,
+        limite: Optional[int] = None,
+        cursor: Optional[int] = None,
+        campos: Optional[List[str]] = None,
+    ) -> List[Mapping]:
         """
-        Lista todos os produtos em ordem alfabética
+        Lista os produtos em ordem alfabética
+
+        A ordem é mantida incrementalmente a cada cadastro, comparando os
+        nomes sem distinção de maiúsculas e acentos.
+
+        Args:
+            limite: Número máximo de produtos (None lista todos)
+            cursor: ID do último produto da página anterior
+            campos: Campos a incluir em cada produto (None inclui todos)
 
         Returns:
             Lista de produtos ordenada por nome
+
+        Raises:
+            ValueError: Se o cursor, o limite ou algum campo for inválido
+        """
+        return self._projetar(self._pagina("alfabetica", limite, cursor), campos)
+
+    def paginar_produtos(
+        self,
+        ordem: str = "id",
+        limite: int = TAMANHO_PAGINA_PADRAO,
+        cursor: Optional[int] = None,
+        campos: Optional[List[str]] = None,
+    ) -> Dict:
+        """
+        Retorna uma página de produtos e o cursor da página seguinte
+
+        A paginação é por chave (keyset): o cursor é o ID do último produto
+        entregue e a página seguinte é localizada por busca binária, com
+        custo O(log n + limite) independente da posição no catálogo.
+
+        Args:
+            ordem: "id" ou "alfabetica"
+            limite: Tamanho da página
+            cursor: ID do último produto da página anterior
+            campos: Campos a incluir em cada produto (None inclui todos)
+
+        Returns:
+            Dict no formato {"produtos": [...], "proximo_cursor": int ou None}
+
+        Raises:
+            ValueError: Se a ordem, o cursor, o limite ou algum campo for inválido
+        """
+        if limite is None or limite <= 0:
+            raise ValueError("Limite deve ser maior que zero")
+
+        pagina = self._pagina(ordem, limite + 1, cursor)
+        proximo_cursor = pagina[limite - 1].id if len(pagina) > limite else None
+        return {
+            "produtos": self._projetar(pagina[:limite], campos),
+            "proximo_cursor": proximo_cursor,
+        }
+
+    def iterar_produtos(
+        self,
+        ordem: str = "id",
+        campos: Optional[List[str]] = None,
+        tamanho_lote: int = TAMANHO_LOTE_EXPORTACAO,
+    ) -> Iterator[List[Dict]]:
+        """
+        Percorre o catálogo inteiro em lotes, sem copiá-lo
+
+        Cada lote é lido com a mesma paginação por chave de paginar_produtos,
+        então a memória usada é proporcional ao tamanho do lote e não ao do
+        catálogo. Produtos cadastrados durante a iteração aparecem se ficarem
+        depois do ponto já percorrido; cada lote reflete o estoque do momento
+        em que é lido.
+
+        Args:
+            ordem: "id" ou "alfabetica"
+            campos: Campos a incluir em cada produto (None inclui todos)
+            tamanho_lote: Número de produtos por lote
+
+        Returns:
+            Iterador de listas de produtos
+
+        Raises:
+            ValueError: Se a ordem, o tamanho do lote ou algum campo for
+                inválido (levantado na chamada, antes da iteração)
+        """
+        if ordem not in ("id", "alfabetica"):
+            raise ValueError(f"Ordem inválida: {ordem}")
+        if tamanho_lote <= 0:
+            raise ValueError("Tamanho do lote deve ser maior que zero")
+        self._projetar([], campos)
+        return self._iterar_lotes(ordem, campos, tamanho_lote)
+
+    def _iterar_lotes(
+        self, ordem: str, campos: Optional[List[str]], tamanho_lote: int
+    ) -> Iterator[List[Dict]]:
+        """Gera os lotes de iterar_produtos"""
+        cursor = None
+        while True:
+            with self._lock:
+                pagina = self._pagina(ordem, tamanho_lote, cursor)
+                # Copia os produtos para que compras concorrentes não alterem
+                # o lote enquanto ele é serializado
+                lote = self._projetar(pagina, campos or CAMPOS_PRODUTO)
+            if not pagina:
+                return
+            yield lote
+            if len(pagina) < tamanho_lote:
+                return
+            cursor = pagina[-1].id
+
+    def _pagina(self, ordem: str, limite: Optional[int], cursor: Optional[int]) -> List[Produto]:
+        """Fatia de produtos após o cursor, na ordem pedida"""
+        if limite is not None and limite <= 0:
+            raise ValueError("Limite deve ser maior que zero")
+        if self.consultas_no_armazenamento:
+            with metricas.fase("consulta"):
+                produtos = self.armazenamento.pagina(ordem, limite, cursor)
+            return [Produto.de_dict(p) for p in produtos]
+        if cursor is not None and cursor not in self._indice_id:
+            raise ValueError(f"Cursor inválido: {cursor}")
+
+        if ordem == "alfabetica":
+            return self._ordem_alfabetica.fatia(cursor, limite)
+        if ordem != "id":
+            raise ValueError(f"Ordem inválida: {ordem}")
+
+        inicio = 0
+        if cursor is not None:
+            inicio = bisect_right(self._produtos, cursor, key=lambda p: p.id)
+        fim = None if limite is None else inicio + limite
+        return self._produtos[inicio:fim]
+
+    @staticmethod
+    def _projetar(produtos: List[Produto], campos: Optional[List[str]]) -> List[Mapping]:
+        """Copia apenas os campos pedidos de cada produto"""
+        if campos is None:
+            return produtos
+        invalidos = [c for c in campos if c not in CAMPOS_PRODUTO]
+        if invalidos:
+            raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        return [{campo: getattr(produto, campo) for campo in campos} for produto in produtos]
+
+    def consultar_produtos(
+        self,
+        valor_min: Optional[float] = None,
+        valor_max: Optional[float] = None,
+        quantidade_min: Optional[int] = None,
+        quantidade_max: Optional[int] = None,
+        ordem: str = "id",
+        limite: Optional[int] = None,
+        cursor: Optional[int] = None,
+        campos: Optional[List[str]] = None,
+    ) -> Dict:
         """
-        return sorted(self.produtos, key=lambda p: p["produto"].lower())
+        Filtra produtos por faixas de valor e de quantidade
 
-    def buscar_produto_por_id(self, produto_id: int) -> Optional[Dict]:
+        As faixas são resolvidas nos índices ordenados de valor e de
+        quantidade: a busca binária localiza as pontas e só os produtos da
+        faixa são visitados. Com as duas faixas, a mais estreita é percorrida
+        e a outra é conferida produto a produto. Se a ordem pedida é a do
+        índice percorrido, a página sai direto dele em O(log n + limite); nas
+        demais ordens os k produtos encontrados são ordenados (O(k log k)).
+
+        Args:
+            valor_min: Menor valor unitário (None não limita)
+            valor_max: Maior valor unitário (None não limita)
+            quantidade_min: Menor quantidade (None não limita)
+            quantidade_max: Maior quantidade (None não limita)
+            ordem: Uma de ORDENS_CONSULTA; com "-" na frente, decrescente.
+                Empates são desfeitos pelo ID
+            limite: Tamanho da página (None retorna todos)
+            cursor: ID do último produto da página anterior
+            campos: Campos a incluir em cada produto (None inclui todos)
+
+        Returns:
+            Dict no formato {"produtos": [...], "proximo_cursor": int ou None}
+
+        Raises:
+            ValueError: Se a ordem, o cursor, o limite ou algum campo for inválido
+        """
+        if ordem.lstrip("-") not in ORDENS_CONSULTA:
+            raise ValueError(f"Ordem inválida: {ordem}")
+        if limite is not None and limite <= 0:
+            raise ValueError("Limite deve ser maior que zero")
+        faixas = {"valor": (valor_min, valor_max), "quantidade": (quantidade_min, quantidade_max)}
+
+        with self._lock:
+            if cursor is not None and cursor not in self._indice_id:
+                raise ValueError(f"Cursor inválido: {cursor}")
+            pagina = self._filtrar(faixas, ordem, limite, cursor)
+            proximo_cursor = None
+            if limite is not None and len(pagina) > limite:
+                proximo_cursor = pagina[limite - 1].id
+            return {
+                "produtos": self._projetar(pagina[:limite], campos),
+                "proximo_cursor": proximo_cursor,
+            }
+
+    def _filtrar(
+        self,
+        faixas: Dict[str, Tuple],
+        ordem: str,
+        limite: Optional[int],
+        cursor: Optional[int],
+    ) -> List[Produto]:
+        """Produtos das faixas na ordem pedida, após o cursor (no máximo limite + 1)"""
+        ate = None if limite is None else limite + 1
+        filtrados = [
+            c for c, (minimo, maximo) in faixas.items() if (minimo, maximo) != (None, None)
+        ]
+        if not filtrados and ordem in ("id", "alfabetica"):
+            return self._pagina(ordem, ate, cursor)
+
+        indices = {"valor": self._ordem_valor, "quantidade": self._ordem_quantidade}
+        # Percorre a faixa mais estreita (a da ordem pedida, no empate)
+        guia = min(
+            filtrados or [ordem if ordem in indices else "valor"],
+            key=lambda c: (indices[c].contar_faixa(*faixas[c]), c != ordem),
+        )
+        encontrados = indices[guia].faixa(*faixas[guia], cursor if ordem == guia else None)
+        outro = "quantidade" if guia == "valor" else "valor"
+        if outro in filtrados:
+            minimo, maximo = faixas[outro]
+            encontrados = (p for p in encontrados if _na_faixa(p[outro], minimo, maximo))
+        if ordem == guia:
+            return list(itertools.islice(encontrados, ate))
+        return self._ordenar(list(encontrados), ordem, cursor)[:ate]
+
+    def _ordenar(self, produtos: List[Produto], ordem: str, cursor: Optional[int]) -> List[Produto]:
+        """Ordena produtos como consultar_produtos e descarta os até o cursor"""
+        campo = ordem.lstrip("-")
+        if campo == "alfabetica":
+            chave = self._chave_alfabetica
+        else:
+            chave = operator.attrgetter(campo, "id")
+        produtos.sort(key=chave)
+        decrescente = ordem.startswith("-")
+        if cursor is not None:
+            referencia = chave(self._indice_id[cursor])
+            if decrescente:
+                produtos = produtos[: bisect_left(produtos, referencia, key=chave)]
+            else:
+                produtos = produtos[bisect_right(produtos, referencia, key=chave) :]
+        if decrescente:
+            produtos.reverse()
+        return produtos
+
+    def _chave_alfabetica(self, produto: Produto) -> Tuple[str, int]:
+        """Chave da ordem alfabética: nome normalizado e ID"""
+        return (self._indice_nome.chave(produto.id), produto.id)
+
+    def buscar_produto_por_id(self, produto_id: int) -> Optional[Produto]:
         """
         Busca um produto por ID
 
@@ -97,12 +790,13 @@ class ProdutoManager:
         Returns:
             Produto encontrado ou None
         """
-        for produto in self.produtos:
-            if produto["id"] == produto_id:
-                return produto
-        return None
+        if self.consultas_no_armazenamento:
+            with metricas.fase("consulta"):
+                dados = self.armazenamento.buscar_por_id(produto_id)
+            return Produto.de_dict(dados) if dados else None
+        return self._indice_id.get(produto_id)
 
-    def buscar_produto_por_nome(self, nome: str) -> Optional[Dict]:
+    def buscar_produto_por_nome(self, nome: str) -> Optional[Produto]:
         """
         Busca um produto por nome (case-insensitive)
 
@@ -113,11 +807,119 @@ class ProdutoManager:
             Produto encontrado ou None
         """
         nome_lower = nome.lower().strip()
-        for produto in self.produtos:
-            if produto["produto"].lower() == nome_lower:
+        if self.consultas_no_armazenamento:
+            with metricas.fase("consulta"):
+                candidatos = self.armazenamento.buscar_por_chave(normalizar(nome))
+            produtos = (Produto.de_dict(p) for p in candidatos)
+        else:
+            produtos = (self._indice_id[i] for i in sorted(self._indice_nome.exato(nome)))
+        for produto in produtos:
+            if produto.produto.lower() == nome_lower:
                 return produto
         return None
 
+    def pesquisar(
+        self, termo: str, modo: str = "tokens", limite: Optional[int] = None
+    ) -> List[Produto]:
+        """
+        Pesquisa produtos pelo nome, ignorando maiúsculas e acentos
+
+        Args:
+            termo: Texto a pesquisar
+            modo: "exato" (nome igual), "prefixo" (nome começa com o termo),
+                "tokens" (cada palavra do termo inicia uma palavra do nome)
+                ou "contem" (nome contém o termo)
+            limite: Número máximo de resultados
+
+        Returns:
+            Lista de produtos encontrados, em ordem de ID
+
+        Raises:
+            ValueError: Se o modo de busca for inválido
+        """
+        if modo not in MODOS_PESQUISA:
+            raise ValueError(f"Modo de busca inválido: {modo}")
+
+        if not termo or not termo.strip():
+            return []
+
+        encontrados = getattr(self._indice_nome, modo)(termo)
+        if limite is None:
+            ids = sorted(encontrados)
+        else:
+            ids = heapq.nsmallest(limite, encontrados)
+        return [self._indice_id[produto_id] for produto_id in ids]
+
+    def resumo_estoque(self) -> Dict:
+        """
+        Totais do estoque, mantidos em colunas atualizadas a cada alteração
+
+        Returns:
+            Dict no formato {
+                'produtos': número de produtos,
+                'unidades': soma das quantidades,
+                'sem_estoque': produtos com quantidade zero,
+                'valor_total': soma de quantidade × valor,
+                'preco_minimo', 'preco_maximo', 'preco_medio': preços
+                    unitários (None sem produtos)
+            }
+        """
+        with self._lock:
+            return self._colunas.resumo()
+
+    def produtos_estoque_baixo(self, limite: int, maximo: Optional[int] = None) -> List[Produto]:
+        """
+        Lista os produtos com quantidade abaixo de um limite
+
+        Args:
+            limite: Quantidade a partir da qual o estoque não é baixo
+            maximo: Número máximo de produtos (None lista todos)
+
+        Returns:
+            Produtos em ordem crescente de quantidade (e de ID, no empate)
+
+        Raises:
+            ValueError: Se maximo não for positivo
+        """
+        if maximo is not None and maximo <= 0:
+            raise ValueError("Limite deve ser maior que zero")
+        with self._lock:
+            return [self._indice_id[i] for i in self._colunas.estoque_baixo(limite, maximo)]
+
+    def produtos_maior_valor(self, n: int = 10) -> List[Produto]:
+        """
+        Lista os produtos com maior valor em estoque (quantidade × valor)
+
+        Args:
+            n: Número de produtos
+
+        Returns:
+            Produtos em ordem decrescente de valor em estoque
+
+        Raises:
+            ValueError: Se n não for positivo
+        """
+        if n <= 0:
+            raise ValueError("Limite deve ser maior que zero")
+        with self._lock:
+            return [self._indice_id[i] for i in self._colunas.maior_valor(n)]
+
+    def histograma_precos(self, faixas: int = FAIXAS_HISTOGRAMA_PADRAO) -> List[Dict]:
+        """
+        Distribuição dos preços unitários em faixas de mesma largura
+
+        Args:
+            faixas: Número de faixas entre o menor e o maior preço
+
+        Returns:
+            Lista de {"inicio", "fim", "produtos"}; vazia sem produtos
+
+        Raises:
+            ValueError: Se faixas não for positivo
+        """
+        with self._lock:
+            return self._colunas.histograma_precos(faixas)
+
     def comprar_produto(self, produto_id: int, quantidade: int, confirmar: bool = False) -> Dict:
         """
         Processa a compra de um produto
@@ -129,7 +931,7 @@ class ProdutoManager:
 
         Returns:
             Dict com informações da compra: {
-                'produto': dict do produto,
+                'produto': cópia do produto,
                 'quantidade': quantidade solicitada,
                 'total': valor total,
                 'disponivel': bool indicando se há estoque,
@@ -142,31 +944,251 @@ class ProdutoManager:
         if quantidade <= 0:
             raise ValueError("Quantidade deve ser maior que zero")
 
-        produto = self.buscar_produto_por_id(produto_id)
+        if not confirmar:
+            return self._resumo_compra(produto_id, quantidade)
+
+        # A verificação e a baixa do estoque ocorrem na transação, já
+        # sincronizadas com o que outros processos gravaram
+        with self._transacao():
+            resultado, lote = self._baixar_estoque(produto_id, quantidade)
+
+        self._aguardar_gravacao(lote)
+        return resultado
+
+    def _baixar_estoque(
+        self, produto_id: int, quantidade: int
+    ) -> Tuple[Dict, Optional[LoteGravacao]]:
+        """
+        Confere a disponibilidade e efetua a compra (chamado na transação)
+
+        Returns:
+            Tupla (resultado no formato de comprar_produto, lote de gravação)
+
+        Raises:
+            ValueError: Se o produto não existir ou faltar estoque
+        """
+        resultado = self._resumo_compra(produto_id, quantidade)
+        produto = self._indice_id[produto_id]
+        if not resultado["disponivel"]:
+            raise ValueError(
+                f"Quantidade insuficiente em estoque. Disponível: {self._disponivel(produto)}"
+            )
+
+        # Atualiza o estoque
+        produto.quantidade -= quantidade
+        self._atualizar_estoque(produto)
+        self._publicar_estoque(produto, "comprado", comprado=quantidade)
+        lote = self._persistir(
+            {"op": "estoque", "id": produto_id, "quantidade": produto.quantidade}
+        )
+        resultado["confirmado"] = True
+        resultado["produto"] = produto.copy()
+        return resultado, lote
+
+    def _disponivel(self, produto: Produto) -> int:
+        """Unidades em estoque fora das reservas em aberto"""
+        return max(produto.quantidade - self._reservas.reservado(produto.id), 0)
+
+    def reservar_produto(
+        self, produto_id: int, quantidade: int, ttl: Optional[float] = None
+    ) -> Dict:
+        """
+        Separa unidades de um produto até a confirmação da compra
+
+        As unidades reservadas deixam de contar como disponíveis para outras
+        compras e reservas, inclusive as de outros processos, até a reserva
+        ser confirmada (em qualquer processo), cancelada ou vencer.
+
+        Args:
+            produto_id: ID do produto
+            quantidade: Quantidade a reservar
+            ttl: Validade da reserva em segundos (None usa a padrão)
+
+        Returns:
+            Dict no formato retornado por comprar_produto sem confirmação,
+            com 'token' (a informar em confirmar_reserva) e 'expira_em'
+            (segundos até o vencimento)
+
+        Raises:
+            ValueError: Se o produto não existir, a quantidade ou a validade
+                forem inválidas ou faltar estoque
+        """
+        if quantidade <= 0:
+            raise ValueError("Quantidade deve ser maior que zero")
+        if ttl is not None and not 0 < ttl <= TTL_RESERVA_MAXIMO:
+            raise ValueError(f"Validade da reserva deve estar entre 0 e {TTL_RESERVA_MAXIMO:g}s")
+
+        with self._transacao():
+            resultado = self._resumo_compra(produto_id, quantidade)
+            if not resultado["disponivel"]:
+                disponivel = self._disponivel(self._indice_id[produto_id])
+                raise ValueError(f"Quantidade insuficiente em estoque. Disponível: {disponivel}")
+            reserva = self._reservas.reservar(produto_id, quantidade, ttl)
+            self._publicar_estoque(self._indice_id[produto_id])
+
+        resultado["token"] = reserva.token
+        resultado["expira_em"] = self._reservas.segundos_restantes(reserva)
+        return resultado
+
+    def confirmar_reserva(
+        self, token: str, produto_id: Optional[int] = None, quantidade: Optional[int] = None
+    ) -> Dict:
+        """
+        Efetua a compra reservada
+
+        Args:
+            token: Token retornado por reservar_produto
+            produto_id: Se informado, a reserva deve ser deste produto
+            quantidade: Se informada, a reserva deve ser desta quantidade
+
+        Returns:
+            Dict no formato retornado por comprar_produto com confirmação
+
+        Raises:
+            ReservaInexistente: Se a reserva não existir, já tiver sido usada,
+                vencido ou não for do produto e da quantidade informados
+            ValueError: Se o estoque não bastar mais (reserva vencida no
+                meio da confirmação)
+        """
+        reserva = self._reservas.obter(token)
+        if (
+            reserva is None
+            or produto_id not in (None, reserva.produto_id)
+            or quantidade not in (None, reserva.quantidade)
+        ):
+            raise ReservaInexistente("Reserva inexistente ou expirada")
+
+        with self._transacao():
+            # Liberar a reserva devolve as unidades separadas para a compra
+            if self._reservas.liberar(token) is None:
+                raise ReservaInexistente("Reserva inexistente ou expirada")
+            resultado, lote = self._baixar_estoque(reserva.produto_id, reserva.quantidade)
+
+        self._aguardar_gravacao(lote)
+        return resultado
+
+    def cancelar_reserva(self, token: str) -> bool:
+        """
+        Devolve as unidades de uma reserva ao estoque disponível
+
+        Returns:
+            True se a reserva existia e estava em aberto
+        """
+        with self._transacao():
+            reserva = self._reservas.liberar(token)
+            produto = reserva and self._indice_id.get(reserva.produto_id)
+            if produto is not None:
+                self._publicar_estoque(produto)
+        return reserva is not None
+
+    def _resumo_compra(self, produto_id: int, quantidade: int) -> Dict:
+        """Calcula o total e a disponibilidade de uma compra sem efetivá-la"""
+        # Lê a memória, que a transação sincroniza antes da baixa do estoque
+        produto = self._indice_id.get(produto_id)
         if not produto:
             raise ValueError(f"Produto com ID {produto_id} não encontrado")
 
-        disponivel = produto["quantidade"] >= quantidade
-        total = produto["valor"] * quantidade
-
-        resultado = {
+        return {
             "produto": produto.copy(),
             "quantidade": quantidade,
-            "total": total,
-            "disponivel": disponivel,
+            "total": produto.valor * quantidade,
+            "disponivel": self._disponivel(produto) >= quantidade,
             "confirmado": False,
         }
 
-        if confirmar:
-            if not disponivel:
-                raise ValueError(
-                    f"Quantidade insuficiente em estoque. Disponível: {produto['quantidade']}"
+    def comprar_produtos(self, itens: Iterable[Tuple[int, int]], confirmar: bool = False) -> Dict:
+        """
+        Processa um pedido com vários produtos de forma atômica
+
+        Todos os itens são conferidos antes de qualquer baixa: se algum não
+        tiver estoque, nada é alterado. A baixa de todos os itens é gravada
+        no armazenamento de uma só vez.
+
+        Args:
+            itens: Pares (produto_id, quantidade); o mesmo produto pode
+                aparecer em mais de um item
+            confirmar: Se True, efetua a compra; se False, apenas calcula os totais
+
+        Returns:
+            Dict com informações do pedido: {
+                'itens': lista no formato retornado por comprar_produto
+                    (sem 'confirmado'),
+                'total': valor total do pedido,
+                'disponivel': bool indicando se há estoque para todos os itens,
+                'confirmado': bool indicando se a compra foi efetivada
+            }
+
+        Raises:
+            ValueError: Se o pedido estiver vazio, algum produto não existir,
+                alguma quantidade for inválida ou, ao confirmar, faltar estoque
+        """
+        itens = list(itens)
+        if not itens:
+            raise ValueError("O pedido deve ter ao menos um item")
+        for posicao, (_, quantidade) in enumerate(itens, start=1):
+            if quantidade <= 0:
+                raise ValueError(f"Item {posicao}: Quantidade deve ser maior que zero")
+
+        if not confirmar:
+            return self._resumo_pedido(itens)
+
+        ids = sorted({produto_id for produto_id, _ in itens})
+        with self._transacao():
+            pedido = self._resumo_pedido(itens)
+            totais = self._total_por_produto(itens)
+            if not pedido["disponivel"]:
+                faltantes = [
+                    f"{p.produto} (disponível: {self._disponivel(p)})"
+                    for p in (self._indice_id[i] for i in ids)
+                    if self._disponivel(p) < totais[p.id]
+                ]
+                raise ValueError(f"Quantidade insuficiente em estoque: {', '.join(faltantes)}")
+
+            # Atualiza o estoque de todos os itens e grava uma única vez
+            for produto_id, quantidade in totais.items():
+                produto = self._indice_id[produto_id]
+                produto.quantidade -= quantidade
+                self._atualizar_estoque(produto)
+                self._publicar_estoque(produto, "comprado", comprado=quantidade)
+            lote = self._persistir(
+                *(
+                    {"op": "estoque", "id": i, "quantidade": self._indice_id[i].quantidade}
+                    for i in ids
                 )
+            )
+            for item in pedido["itens"]:
+                item["produto"] = self._indice_id[item["produto"].id].copy()
+            pedido["confirmado"] = True
 
-            # Atualiza o estoque
-            produto["quantidade"] -= quantidade
-            self._salvar_dados()
-            resultado["confirmado"] = True
-            resultado["produto"] = produto.copy()
+        self._aguardar_gravacao(lote)
+        return pedido
 
-        return resultado
+    @staticmethod
+    def _total_por_produto(itens: List[Tuple[int, int]]) -> Dict[int, int]:
+        """Soma as quantidades pedidas de cada produto"""
+        totais: Dict[int, int] = {}
+        for produto_id, quantidade in itens:
+            totais[produto_id] = totais.get(produto_id, 0) + quantidade
+        return totais
+
+    def _resumo_pedido(self, itens: List[Tuple[int, int]]) -> Dict:
+        """Calcula totais e disponibilidade de um pedido sem efetivá-lo"""
+        linhas = []
+        for posicao, (produto_id, quantidade) in enumerate(itens, start=1):
+            try:
+                linha = self._resumo_compra(produto_id, quantidade)
+            except ValueError as e:
+                raise ValueError(f"Item {posicao}: {e}")
+            del linha["confirmado"]
+            linhas.append(linha)
+
+        totais = self._total_por_produto(itens)
+        return {
+            "itens": linhas,
+            "total": sum(linha["total"] for linha in linhas),
+            "disponivel": all(
+                self._disponivel(self._indice_id[i]) >= quantidade
+                for i, quantidade in totais.items()
+            ),
+            "confirmado": False,
+        }
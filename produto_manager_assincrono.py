@@ -0,0 +1,149 @@
+"""
+Interface assíncrona (asyncio) para o gerenciador de produtos
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from produto import Produto
+from produto_manager import TAMANHO_LOTE_EXPORTACAO, ProdutoManager
+
+# Threads que executam as operações que gravam no armazenamento
+THREADS_GRAVACAO_PADRAO = 32
+
+
+class ProdutoManagerAssincrono:
+    """
+    Expõe um ProdutoManager para código assíncrono
+
+    Operações que podem esperar pelo disco ou por um lock mantido durante
+    as gravações (gravações, sincronização com outros workers, consultas
+    filtradas, prévias de compra e leitura de lotes) são executadas em um
+    pool de threads, liberando o loop de eventos para outras requisições.
+    Consultas que só leem os índices em memória, sem lock, são executadas
+    diretamente; busca por ID e listagem paginada também vão para o pool
+    quando o gerenciador as consulta no SQLite.
+    """
+
+    def __init__(
+        self,
+        manager: ProdutoManager,
+        executor: Optional[ThreadPoolExecutor] = None,
+        threads: int = THREADS_GRAVACAO_PADRAO,
+    ):
+        """
+        Args:
+            manager: Gerenciador síncrono a expor
+            executor: Pool de threads a usar no lugar de um criado aqui
+            threads: Tamanho do pool criado quando executor não é informado
+        """
+        self.manager = manager
+        self._proprio_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(threads, thread_name_prefix="produtos")
+
+    async def _em_thread(self, funcao, *args, **kwargs):
+        """Executa uma função bloqueante no pool de threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(funcao, *args, **kwargs)
+        )
+
+    async def sincronizar(self) -> bool:
+        """
+        Aplica as alterações gravadas por outros processos (workers)
+
+        Até a verificação vai para o pool de threads: ela lê só o contador
+        de geração, mas no SQLite espera pela conexão, ocupada durante toda
+        gravação (inclusive o COMMIT com fsync).
+
+        Returns:
+            True se havia alterações a aplicar
+        """
+        return await self._em_thread(self.manager.sincronizar)
+
+    async def _consulta(self, funcao, *args, **kwargs):
+        """Executa uma consulta no pool só quando ela lê o SQLite"""
+        if self.manager.consultas_no_armazenamento:
+            return await self._em_thread(funcao, *args, **kwargs)
+        return funcao(*args, **kwargs)
+
+    async def paginar_produtos(self, *args, **kwargs) -> Dict:
+        """Mesmo que ProdutoManager.paginar_produtos"""
+        return await self._consulta(self.manager.paginar_produtos, *args, **kwargs)
+
+    async def consultar_produtos(self, *args, **kwargs) -> Dict:
+        """
+        Mesmo que ProdutoManager.consultar_produtos, no pool de threads (lê
+        sob o lock do gerenciador, mantido durante as gravações)
+        """
+        return await self._em_thread(self.manager.consultar_produtos, *args, **kwargs)
+
+    async def buscar_produto_por_id(self, produto_id: int) -> Optional[Produto]:
+        """Mesmo que ProdutoManager.buscar_produto_por_id"""
+        return await self._consulta(self.manager.buscar_produto_por_id, produto_id)
+
+    def pesquisar(self, *args, **kwargs) -> List[Produto]:
+        """Mesmo que ProdutoManager.pesquisar (lê só a memória)"""
+        return self.manager.pesquisar(*args, **kwargs)
+
+    def iterar_produtos(
+        self,
+        ordem: str = "id",
+        campos: Optional[List[str]] = None,
+        tamanho_lote: int = TAMANHO_LOTE_EXPORTACAO,
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Percorre o catálogo em lotes, como ProdutoManager.iterar_produtos
+
+        Cada lote é lido no pool de threads, pois a leitura aguarda o lock
+        do gerenciador enquanto uma gravação está em andamento.
+
+        Returns:
+            Iterador assíncrono de listas de produtos
+
+        Raises:
+            ValueError: Se a ordem, o tamanho do lote ou algum campo for
+                inválido (levantado na chamada, antes da iteração)
+        """
+        return self._iterar_lotes(self.manager.iterar_produtos(ordem, campos, tamanho_lote))
+
+    async def _iterar_lotes(self, lotes: Iterator[List[Dict]]) -> AsyncIterator[List[Dict]]:
+        """Gera os lotes de iterar_produtos"""
+        while True:
+            lote = await self._em_thread(next, lotes, None)
+            if lote is None:
+                return
+            yield lote
+
+    async def adicionar_produto(self, produto: str, quantidade: int, valor: float) -> Produto:
+        """Mesmo que ProdutoManager.adicionar_produto, sem bloquear o loop"""
+        return await self._em_thread(self.manager.adicionar_produto, produto, quantidade, valor)
+
+    async def adicionar_produtos_em_lote(self, registros: Iterable[Dict]) -> Dict:
+        """Mesmo que ProdutoManager.adicionar_produtos_em_lote, sem bloquear o loop"""
+        return await self._em_thread(self.manager.adicionar_produtos_em_lote, list(registros))
+
+    async def comprar_produto(
+        self, produto_id: int, quantidade: int, confirmar: bool = False
+    ) -> Dict:
+        """
+        Mesmo que ProdutoManager.comprar_produto, sem bloquear o loop
+
+        Também a prévia vai para o pool de threads, pois lê o log de
+        reservas compartilhado com os outros workers.
+        """
+        return await self._em_thread(
+            self.manager.comprar_produto, produto_id, quantidade, confirmar
+        )
+
+    async def comprar_produtos(
+        self, itens: Iterable[Tuple[int, int]], confirmar: bool = False
+    ) -> Dict:
+        """Mesmo que ProdutoManager.comprar_produtos, sem bloquear o loop"""
+        return await self._em_thread(self.manager.comprar_produtos, list(itens), confirmar)
+
+    def fechar(self):
+        """Encerra o pool de threads, se foi criado aqui"""
+        if self._proprio_executor:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,243 @@
+"""
+Reservas de estoque com prazo de validade
+
+Uma reserva separa unidades de um produto entre a prévia e a confirmação
+da compra. As reservas ficam em memória, em um dict por token e em um heap
+ordenado pelo vencimento: as vencidas são descartadas no início de cada
+operação, retirando do topo do heap apenas as que já venceram, então
+reservar, confirmar e consultar custam O(log n) amortizado mesmo com
+milhares de reservas em aberto, sem thread de limpeza.
+
+Com um arquivo, as reservas são compartilhadas pelos workers: cada reserva
+e liberação é anexada a um log (uma linha JSON), e cada operação aplica
+antes as linhas anexadas pelos outros processos desde a última leitura
+(um stat quando nada mudou). Aplicar uma linha é idempotente, então a
+própria linha relida não altera nada. Vencimentos não são gravados: cada
+processo os calcula pelo relógio de parede. O log é reescrito só com as
+reservas em aberto quando cresce demais.
+"""
+import heapq
+import os
+import secrets
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import codec
+
+# Validade (em segundos) de uma reserva quando não informada
+TTL_RESERVA_PADRAO = 300.0
+
+# Maior validade (em segundos) aceita para uma reserva
+TTL_RESERVA_MAXIMO = 3600.0
+
+# Linhas do log que permitem reescrevê-lo (além do dobro das reservas abertas)
+LINHAS_COMPACTACAO = 1000
+
+
+class Reserva(NamedTuple):
+    """Unidades de um produto separadas até o vencimento"""
+
+    token: str
+    produto_id: int
+    quantidade: int
+    vence_em: float
+
+
+class ReservaInexistente(ValueError):
+    """Reserva que não existe, já foi usada ou venceu"""
+
+
+class TabelaReservas:
+    """
+    Reservas em aberto, com o total reservado por produto
+
+    Os vencimentos usam o relógio informado (de parede, comum aos
+    processos); o heap guarda pares (vencimento, token) e entradas de
+    reservas já confirmadas ou canceladas são ignoradas quando chegam ao
+    topo. Com arquivo, reservar e liberar devem ser serializados entre os
+    processos por quem chama (o gerenciador os executa na transação do
+    armazenamento).
+    """
+
+    def __init__(
+        self,
+        ttl_padrao: float = TTL_RESERVA_PADRAO,
+        relogio: Callable[[], float] = time.time,
+        arquivo: Optional[str] = None,
+    ):
+        """
+        Args:
+            ttl_padrao: Validade (em segundos) das reservas sem ttl informado
+            relogio: Função que retorna o instante atual em segundos
+            arquivo: Log compartilhado com os outros processos (None mantém
+                as reservas só na memória)
+        """
+        self.ttl_padrao = ttl_padrao
+        self.arquivo = arquivo
+        self._relogio = relogio
+        self._reservas: Dict[str, Reserva] = {}
+        self._vencimentos: List[Tuple[float, str]] = []
+        self._reservado: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # Posição lida do log, inode do arquivo lido (muda na compactação)
+        # e linhas lidas desde o início do arquivo
+        self._lido = 0
+        self._inode = None
+        self._linhas_log = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._atualizar()
+            return len(self._reservas)
+
+    def _atualizar(self):
+        """Aplica o log e descarta as vencidas (chamado com o lock)"""
+        if self.arquivo is not None:
+            self._sincronizar()
+        self._expirar()
+
+    def _sincronizar(self):
+        """Aplica as linhas do log ainda não lidas (todas, se foi reescrito)"""
+        try:
+            info = os.stat(self.arquivo)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._limpar()
+            return
+        if info.st_ino != self._inode or info.st_size < self._lido:
+            # O arquivo é a referência: a memória é refeita a partir dele
+            self._limpar()
+            self._inode = info.st_ino
+        if info.st_size == self._lido:
+            return
+        with open(self.arquivo, "rb") as f:
+            f.seek(self._lido)
+            dados = f.read()
+        # Uma linha sendo anexada por outro processo fica para a próxima leitura
+        fim = dados.rfind(b"\n") + 1
+        self._lido += fim
+        for linha in dados[:fim].splitlines():
+            self._linhas_log += 1
+            try:
+                registro = codec.decodificar(linha)
+                if registro["op"] == "reservar":
+                    self._incluir(Reserva(*registro["reserva"]))
+                else:
+                    self._retirar(registro["token"])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def _limpar(self):
+        """Esquece as reservas e a posição lida (chamado com o lock)"""
+        self._reservas.clear()
+        self._vencimentos.clear()
+        self._reservado.clear()
+        self._inode, self._lido, self._linhas_log = None, 0, 0
+
+    def _anexar(self, registro: Dict):
+        """Anexa uma operação ao log, reescrevendo-o se cresceu demais"""
+        with open(self.arquivo, "ab") as f:
+            f.write(codec.codificar(registro) + b"\n")
+        if self._linhas_log > LINHAS_COMPACTACAO + 2 * len(self._reservas):
+            self._compactar()
+
+    def _compactar(self):
+        """Reescreve o log só com as reservas em aberto"""
+        self._sincronizar()
+        self._expirar()
+        temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as f:
+            for reserva in self._reservas.values():
+                f.write(codec.codificar({"op": "reservar", "reserva": list(reserva)}) + b"\n")
+        os.replace(temporario, self.arquivo)
+        self._inode = None
+
+    def _incluir(self, reserva: Reserva):
+        """Registra uma reserva na memória, se nova e válida (chamado com o lock)"""
+        if reserva.token in self._reservas or reserva.vence_em <= self._relogio():
+            return
+        self._reservas[reserva.token] = reserva
+        heapq.heappush(self._vencimentos, (reserva.vence_em, reserva.token))
+        self._reservado[reserva.produto_id] = (
+            self._reservado.get(reserva.produto_id, 0) + reserva.quantidade
+        )
+
+    def _retirar(self, token: str) -> Optional[Reserva]:
+        """Retira uma reserva da memória, se existir (chamado com o lock)"""
+        reserva = self._reservas.pop(token, None)
+        if reserva is not None:
+            self._descontar(reserva)
+        return reserva
+
+    def _expirar(self):
+        """Descarta as reservas vencidas (chamado com o lock)"""
+        agora = self._relogio()
+        while self._vencimentos and self._vencimentos[0][0] <= agora:
+            _, token = heapq.heappop(self._vencimentos)
+            reserva = self._reservas.get(token)
+            if reserva is not None and reserva.vence_em <= agora:
+                self._descontar(self._reservas.pop(token))
+
+    def _descontar(self, reserva: Reserva):
+        """Retira a reserva do total reservado do produto (chamado com o lock)"""
+        restante = self._reservado[reserva.produto_id] - reserva.quantidade
+        if restante:
+            self._reservado[reserva.produto_id] = restante
+        else:
+            del self._reservado[reserva.produto_id]
+
+    def reservar(self, produto_id: int, quantidade: int, ttl: Optional[float] = None) -> Reserva:
+        """
+        Registra uma reserva (sem conferir o estoque, tarefa de quem chama)
+
+        Args:
+            produto_id: ID do produto
+            quantidade: Unidades reservadas
+            ttl: Validade em segundos (None usa ttl_padrao)
+
+        Returns:
+            Reserva criada, com um token aleatório
+        """
+        reserva = Reserva(
+            secrets.token_urlsafe(16),
+            produto_id,
+            quantidade,
+            self._relogio() + (self.ttl_padrao if ttl is None else ttl),
+        )
+        with self._lock:
+            self._atualizar()
+            self._incluir(reserva)
+            if self.arquivo is not None:
+                self._anexar({"op": "reservar", "reserva": list(reserva)})
+        return reserva
+
+    def obter(self, token: str) -> Optional[Reserva]:
+        """Retorna a reserva do token, ou None se não existe ou venceu"""
+        with self._lock:
+            self._atualizar()
+            return self._reservas.get(token)
+
+    def liberar(self, token: str) -> Optional[Reserva]:
+        """
+        Encerra a reserva do token (na confirmação ou no cancelamento)
+
+        Returns:
+            Reserva encerrada, ou None se não existe ou venceu
+        """
+        with self._lock:
+            self._atualizar()
+            reserva = self._retirar(token)
+            if reserva is not None and self.arquivo is not None:
+                self._anexar({"op": "liberar", "token": token})
+            return reserva
+
+    def reservado(self, produto_id: int) -> int:
+        """Unidades do produto em reservas ainda válidas"""
+        with self._lock:
+            self._atualizar()
+            return self._reservado.get(produto_id, 0)
+
+    def segundos_restantes(self, reserva: Reserva) -> float:
+        """Tempo até o vencimento da reserva, em segundos"""
+        return max(reserva.vence_em - self._relogio(), 0.0)
@@ -25,8 +25,9 @@ def app():
     # Limpeza
     manager.produtos = []
     manager.proximo_id = 1
-    if os.path.exists("produtos.json"):
-        os.remove("produtos.json")
+    for arquivo in ["produtos.json", "produtos.json.bak", "produtos.json.reservas"]:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
 
 
 @pytest.fixture
@@ -135,3 +136,858 @@ class TestAPI:
         data = json.loads(response.data)
         assert data[0]["produto"] == "Abacaxi"
         assert data[1]["produto"] == "Zebra"
+
+
+class TestAPIBusca:
+    """Testes da API de pesquisa"""
+
+    def test_api_buscar(self, client):
+        """Teste API pesquisa por nome"""
+        for nome in ["Café Torrado", "Cafeteira", "Chá Verde"]:
+            client.post(
+                "/api/produtos",
+                data=json.dumps({"produto": nome, "quantidade": 1, "valor": 10}),
+                content_type="application/json",
+            )
+
+        response = client.get("/api/produtos/busca?q=cafe")
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [p["produto"] for p in data] == ["Café Torrado", "Cafeteira"]
+
+    def test_api_buscar_modo_invalido(self, client):
+        """Teste API pesquisa com modo inválido"""
+        response = client.get("/api/produtos/busca?q=cafe&modo=regex")
+        assert response.status_code == 400
+
+
+class TestPaginacao:
+    """Testes de paginação nas listagens"""
+
+    @pytest.fixture
+    def client_cheio(self, client):
+        """Cliente com três produtos cadastrados"""
+        for nome in ["Zebra", "Abacaxi", "Manga"]:
+            client.post(
+                "/api/produtos",
+                data=json.dumps({"produto": nome, "quantidade": 1, "valor": 10}),
+                content_type="application/json",
+            )
+        return client
+
+    def test_api_listar_paginado(self, client_cheio):
+        """Teste API listar com limit e cursor"""
+        response = client_cheio.get("/api/produtos?limit=2&fields=id")
+        data = json.loads(response.data)
+
+        assert data == {"produtos": [{"id": 1}, {"id": 2}], "proximo_cursor": 2}
+
+        response = client_cheio.get("/api/produtos?limit=2&cursor=2")
+        data = json.loads(response.data)
+        assert [p["produto"] for p in data["produtos"]] == ["Manga"]
+        assert data["proximo_cursor"] is None
+
+    def test_api_alfabetica_paginada(self, client_cheio):
+        """Teste API alfabética com limit"""
+        response = client_cheio.get("/api/produtos/alfabetica?limit=1&fields=produto")
+        data = json.loads(response.data)
+
+        assert data["produtos"] == [{"produto": "Abacaxi"}]
+        assert data["proximo_cursor"] == 2
+
+    def test_api_fields_sem_paginacao(self, client_cheio):
+        """Teste projeção sem paginação mantém a lista simples"""
+        response = client_cheio.get("/api/produtos?fields=produto")
+        data = json.loads(response.data)
+
+        assert data == [{"produto": "Zebra"}, {"produto": "Abacaxi"}, {"produto": "Manga"}]
+
+    def test_api_parametros_invalidos(self, client_cheio):
+        """Teste API com parâmetros inválidos"""
+        assert client_cheio.get("/api/produtos?limit=abc").status_code == 400
+        assert client_cheio.get("/api/produtos?cursor=999").status_code == 400
+        assert client_cheio.get("/api/produtos?fields=preco").status_code == 400
+
+    def test_index_paginado(self, client_cheio, monkeypatch):
+        """Teste link de próxima página na listagem HTML"""
+        monkeypatch.setattr("app.TAMANHO_PAGINA_PADRAO", 2)
+
+        response = client_cheio.get("/")
+        assert b"Zebra" in response.data
+        assert b"Manga" not in response.data
+        assert b"cursor=2" in response.data
+
+        response = client_cheio.get("/?cursor=2")
+        assert b"Manga" in response.data
+        assert b"Primeira p" in response.data
+
+    def test_index_cursor_invalido(self, client_cheio):
+        """Teste cursor inválido na listagem HTML redireciona"""
+        response = client_cheio.get("/alfabetica?cursor=999")
+        assert response.status_code == 302
+
+
+class TestAPILote:
+    """Testes da API de inclusão em lote"""
+
+    def test_lote_json(self, client):
+        """Teste lote enviado como array JSON"""
+        response = client.post(
+            "/api/produtos/lote",
+            data=json.dumps(
+                [
+                    {"produto": "Mouse", "quantidade": 50, "valor": 45.90},
+                    {"produto": "", "quantidade": 1, "valor": 1},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data["adicionados"] == 1
+        assert data["ids"] == [1]
+        assert data["erros"][0]["registro"] == 2
+
+    def test_lote_ndjson(self, client):
+        """Teste lote enviado como NDJSON"""
+        corpo = (
+            '{"produto": "Mouse", "quantidade": 50, "valor": 45.90}\n'
+            "{quebrado\n"
+            '{"produto": "Teclado", "quantidade": 5, "valor": 350}\n'
+        )
+        response = client.post(
+            "/api/produtos/lote", data=corpo, content_type="application/x-ndjson"
+        )
+
+        data = json.loads(response.data)
+        assert data["ids"] == [1, 2]
+        assert data["erros"][0]["registro"] == 2
+
+    def test_lote_csv(self, client):
+        """Teste lote enviado como CSV"""
+        corpo = "produto,quantidade,valor\nCafé,10,20.5\nChá,abc,3\n"
+        response = client.post(
+            "/api/produtos/lote", data=corpo.encode("utf-8"), content_type="text/csv"
+        )
+
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data["ids"] == [1]
+        assert data["erros"] == [{"registro": 2, "erro": "Quantidade deve ser um número inteiro"}]
+
+        response = client.get("/api/produtos")
+        assert json.loads(response.data)[0]["produto"] == "Café"
+
+    def test_lote_sem_validos(self, client):
+        """Teste lote sem nenhum registro válido"""
+        response = client.post(
+            "/api/produtos/lote", data=json.dumps([{}]), content_type="application/json"
+        )
+        assert response.status_code == 400
+
+    def test_lote_json_nao_array(self, client):
+        """Teste lote JSON que não é array"""
+        response = client.post(
+            "/api/produtos/lote", data=json.dumps({"produto": "X"}), content_type="application/json"
+        )
+        assert response.status_code == 400
+
+    def test_lote_tipo_nao_suportado(self, client):
+        """Teste lote com tipo de conteúdo não suportado"""
+        response = client.post("/api/produtos/lote", data="x", content_type="text/plain")
+        assert response.status_code == 415
+
+
+class TestAPIPedidos:
+    """Testes da API de pedidos"""
+
+    def test_api_pedido_confirmado(self, client):
+        """Teste API pedido com vários itens"""
+        for nome in ["Mouse", "Teclado"]:
+            client.post(
+                "/api/produtos",
+                data=json.dumps({"produto": nome, "quantidade": 10, "valor": 10}),
+                content_type="application/json",
+            )
+
+        response = client.post(
+            "/api/pedidos",
+            data=json.dumps(
+                {
+                    "itens": [
+                        {"produto_id": 1, "quantidade": 2},
+                        {"produto_id": 2, "quantidade": 3},
+                    ],
+                    "confirmar": True,
+                }
+            ),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data["confirmado"] is True
+        assert data["total"] == 50
+
+    def test_api_pedido_invalido(self, client):
+        """Teste API pedido sem itens válidos"""
+        response = client.post(
+            "/api/pedidos",
+            data=json.dumps({"itens": [{"produto_id": 1}]}),
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+
+        response = client.post(
+            "/api/pedidos",
+            data=json.dumps({"itens": [{"produto_id": 1, "quantidade": 1}]}),
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+
+
+class TestAPIExportar:
+    """Testes da exportação do catálogo em streaming"""
+
+    @pytest.fixture
+    def client_cheio(self, client):
+        """Cliente com dois produtos cadastrados"""
+        for nome in ["Zebra", "Abacaxi, pérola"]:
+            client.post(
+                "/api/produtos",
+                data=json.dumps({"produto": nome, "quantidade": 3, "valor": 2.5}),
+                content_type="application/json",
+            )
+        return client
+
+    def test_exportar_json(self, client_cheio):
+        """Teste exportação em array JSON"""
+        response = client_cheio.get("/api/produtos/exportar")
+
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == "application/json"
+        assert [p["produto"] for p in json.loads(response.data)] == ["Zebra", "Abacaxi, pérola"]
+
+    def test_exportar_json_vazio(self, client):
+        """Teste exportação de catálogo vazio"""
+        response = client.get("/api/produtos/exportar")
+        assert json.loads(response.data) == []
+
+    def test_exportar_ndjson(self, client_cheio):
+        """Teste exportação com um produto por linha"""
+        response = client_cheio.get("/api/produtos/exportar?formato=ndjson&ordem=alfabetica")
+        linhas = response.data.decode("utf-8").splitlines()
+
+        assert response.mimetype == "application/x-ndjson"
+        assert [json.loads(linha)["id"] for linha in linhas] == [2, 1]
+
+    def test_exportar_csv(self, client_cheio):
+        """Teste exportação em CSV com projeção"""
+        response = client_cheio.get("/api/produtos/exportar?formato=csv&fields=produto,valor")
+
+        assert response.mimetype == "text/csv"
+        assert "attachment" in response.headers["Content-Disposition"]
+        assert response.data.decode("utf-8").splitlines() == [
+            "produto,valor",
+            "Zebra,2.5",
+            '"Abacaxi, pérola",2.5',
+        ]
+
+    def test_exportar_parametros_invalidos(self, client):
+        """Teste formato, ordem e campos inválidos"""
+        for query in ["formato=xml", "ordem=preco", "fields=preco"]:
+            response = client.get(f"/api/produtos/exportar?{query}")
+            assert response.status_code == 400
+
+    def test_listar_sem_paginacao_em_streaming(self, client_cheio):
+        """Teste listagem completa é enviada em streaming"""
+        response = client_cheio.get("/api/produtos")
+
+        assert "Content-Length" not in response.headers
+        assert len(response.get_json()) == 2
+
+
+class TestCacheListagens:
+    """Testes do cache das listagens com ETag e 304"""
+
+    def _adicionar(self, client, nome="Mouse"):
+        client.post(
+            "/api/produtos",
+            data=json.dumps({"produto": nome, "quantidade": 5, "valor": 10}),
+            content_type="application/json",
+        )
+
+    def test_etag_e_304(self, client):
+        """Teste resposta repetida traz ETag e 304 quando nada mudou"""
+        self._adicionar(client)
+        response = client.get("/api/produtos?limit=10")
+        etag = response.headers["ETag"]
+
+        assert response.headers["Last-Modified"]
+        repetida = client.get("/api/produtos?limit=10", headers={"If-None-Match": etag})
+        assert repetida.status_code == 304
+        assert repetida.data == b""
+
+    def test_alteracao_invalida_cache(self, client):
+        """Teste cadastro e compra mudam o ETag e o conteúdo"""
+        self._adicionar(client)
+        etag = client.get("/api/produtos/alfabetica?limit=10").headers["ETag"]
+
+        client.post(
+            "/api/comprar",
+            data=json.dumps({"produto_id": 1, "quantidade": 2, "confirmar": True}),
+            content_type="application/json",
+        )
+        response = client.get("/api/produtos/alfabetica?limit=10", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.get_json()["produtos"][0]["quantidade"] == 3
+
+    def test_listagem_em_streaming_entra_no_cache(self, client):
+        """Teste listagem completa é guardada ao final do streaming"""
+        self._adicionar(client)
+        primeira = client.get("/api/produtos")
+        produtos = primeira.get_json()
+        segunda = client.get("/api/produtos")
+
+        # Só a resposta servida do cache conhece o corpo inteiro e tem ETag
+        assert "ETag" not in primeira.headers
+        assert segunda.get_json() == produtos
+        assert segunda.mimetype == "application/json"
+        etag = segunda.headers["ETag"]
+        assert client.get("/api/produtos", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_pagina_html_com_mensagem_nao_usa_cache(self, client):
+        """Teste mensagem flash aparece mesmo com a página em cache"""
+        client.get("/")
+        client.post("/adicionar", data={"produto": "Teclado", "quantidade": "1", "valor": "5"})
+        response = client.get("/")
+
+        assert "adicionado com sucesso" in response.data.decode("utf-8")
+        assert "adicionado com sucesso" not in client.get("/").data.decode("utf-8")
+
+    def test_erro_nao_entra_no_cache(self, client):
+        """Teste respostas de erro não recebem ETag"""
+        response = client.get("/api/produtos?cursor=99")
+
+        assert response.status_code == 400
+        assert "ETag" not in response.headers
+
+
+class TestSincronizacaoWorkers:
+    """Testes da sincronização com gravações de outros workers"""
+
+    def test_requisicao_ve_gravacao_de_outro_worker(self, client, tmp_path, monkeypatch):
+        """Teste listagem reflete produto gravado por outro gerenciador"""
+        import app as modulo_app
+
+        arquivo = str(tmp_path / "produtos.json")
+        monkeypatch.setattr(modulo_app, "manager", ProdutoManager(arquivo, journal=True))
+        assert client.get("/api/produtos?limit=10").get_json()["produtos"] == []
+
+        outro_worker = ProdutoManager(arquivo, journal=True)
+        outro_worker.adicionar_produto("Mouse", 5, 10.0)
+
+        produtos = client.get("/api/produtos?limit=10").get_json()["produtos"]
+        assert [p["produto"] for p in produtos] == ["Mouse"]
+
+
+class TestMetricas:
+    """Testes da instrumentação de requisições e do endpoint /metrics"""
+
+    def test_endpoint_metrics(self, client):
+        """Teste formato texto do Prometheus"""
+        client.get("/api/produtos?limit=5")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        texto = response.get_data(as_text=True)
+        assert "# TYPE produtos_requisicao_duracao_segundos histogram" in texto
+        assert 'rota="/api/produtos",metodo="GET"' in texto
+        assert 'produtos_requisicoes_total{rota="/api/produtos",metodo="GET",status="200"}' in texto
+        assert "produtos_catalogo_produtos 0" in texto
+
+    def test_server_timing(self, client):
+        """Teste cabeçalho Server-Timing com as fases da requisição"""
+        response = client.get("/")
+        fases = [item.split(";")[0] for item in response.headers["Server-Timing"].split(", ")]
+
+        assert fases[0] == "sincronizar"
+        assert "render" in fases
+        assert fases[-1] == "total"
+
+    def test_server_timing_json(self, client):
+        """Teste fase de serialização JSON"""
+        response = client.get("/api/produtos?limit=5")
+
+        assert "json;dur=" in response.headers["Server-Timing"]
+
+    def test_server_timing_fora_do_cache(self, client):
+        """Teste resposta servida do cache tem o Server-Timing da própria requisição"""
+        client.get("/api/produtos?limit=5")
+        response = client.get("/api/produtos?limit=5")
+
+        assert "json;dur=" not in response.headers["Server-Timing"]
+
+    def test_contadores_de_gravacao(self, client):
+        """Teste gravações e bytes gravados após um cadastro"""
+        import metricas
+
+        gravacoes = metricas.GRAVACOES.valor()
+        gravados = metricas.BYTES_GRAVADOS.valor("snapshot")
+        response = client.post(
+            "/api/produtos",
+            data=json.dumps({"produto": "Mouse", "quantidade": 10, "valor": 45.9}),
+            content_type="application/json",
+        )
+
+        assert metricas.GRAVACOES.valor() == gravacoes + 1
+        assert metricas.BYTES_GRAVADOS.valor("snapshot") > gravados
+        assert "gravacao;dur=" in response.headers["Server-Timing"]
+        texto = client.get("/metrics").get_data(as_text=True)
+        assert "produtos_catalogo_produtos 1" in texto
+
+
+class TestPerfis:
+    """Testes dos perfis de requisições e dos endpoints /admin/perfis"""
+
+    @pytest.fixture
+    def perfilador(self, monkeypatch):
+        """Perfilador que perfila todas as requisições, com token de administração"""
+        import app as modulo_app
+        from perfilador import PerfiladorRequisicoes
+
+        perfilador = PerfiladorRequisicoes(fracao=1.0)
+        monkeypatch.setattr(modulo_app, "perfilador", perfilador)
+        monkeypatch.setattr(modulo_app, "TOKEN_ADMIN", "segredo")
+        return perfilador
+
+    def test_perfil_da_requisicao(self, client, perfilador):
+        """Teste perfil guardado e listado pelo endpoint administrativo"""
+        client.post("/adicionar", data={"produto": "Mouse", "quantidade": "1", "valor": "10"})
+        client.get("/comprar/1")
+
+        response = client.get("/admin/perfis", headers={"X-Admin-Token": "segredo"})
+        assert response.status_code == 200
+        perfis = response.get_json()
+        assert [p["rota"] for p in perfis] == ["/comprar/<int:produto_id>", "/adicionar"]
+        assert perfis[0]["caminho"] == "/comprar/1"
+        assert perfis[0]["status"] == 200
+        assert perfis[0]["tipo"] == "cprofile"
+
+        response = client.get(
+            f"/admin/perfis/{perfis[1]['id']}", headers={"X-Admin-Token": "segredo"}
+        )
+        assert response.status_code == 200
+        assert "_persistir" in response.get_data(as_text=True)
+
+    def test_token_obrigatorio(self, client, perfilador):
+        """Teste endpoints administrativos sem token ou com token errado"""
+        assert client.get("/admin/perfis").status_code == 401
+        assert client.get("/admin/perfis", headers={"X-Admin-Token": "x"}).status_code == 401
+        assert client.get("/admin/perfis/1", headers={"X-Admin-Token": "x"}).status_code == 401
+
+    def test_perfil_inexistente(self, client, perfilador):
+        """Teste 404 para perfil fora do buffer"""
+        response = client.get("/admin/perfis/999", headers={"X-Admin-Token": "segredo"})
+        assert response.status_code == 404
+
+    def test_desativado_por_padrao(self, client):
+        """Teste endpoints indisponíveis sem perfilador configurado"""
+        assert client.get("/admin/perfis", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+class TestEstatisticas:
+    """Testes dos endpoints /api/estatisticas"""
+
+    @pytest.fixture
+    def com_produtos(self, client):
+        """Cliente com três produtos cadastrados"""
+        for produto, quantidade, valor in [
+            ("Mouse", 3, 50.0),
+            ("Teclado", 1, 100.0),
+            ("Monitor", 8, 900.0),
+        ]:
+            client.post(
+                "/api/produtos",
+                json={"produto": produto, "quantidade": quantidade, "valor": valor},
+            )
+        return client
+
+    def test_resumo(self, com_produtos):
+        """Teste GET /api/estatisticas"""
+        resumo = com_produtos.get("/api/estatisticas").get_json()
+
+        assert resumo["produtos"] == 3
+        assert resumo["valor_total"] == 7450.0
+
+    def test_resumo_apos_compra(self, com_produtos):
+        """Teste resposta em cache renovada após uma compra"""
+        com_produtos.get("/api/estatisticas")
+        com_produtos.post(
+            "/api/comprar", json={"produto_id": 3, "quantidade": 8, "confirmar": True}
+        )
+
+        assert com_produtos.get("/api/estatisticas").get_json()["valor_total"] == 250.0
+
+    def test_estoque_baixo(self, com_produtos):
+        """Teste GET /api/estatisticas/estoque-baixo"""
+        response = com_produtos.get("/api/estatisticas/estoque-baixo?limite=5")
+        assert [p["id"] for p in response.get_json()] == [2, 1]
+
+        response = com_produtos.get("/api/estatisticas/estoque-baixo?limite=abc")
+        assert response.status_code == 400
+
+    def test_maior_valor(self, com_produtos):
+        """Teste GET /api/estatisticas/maior-valor"""
+        response = com_produtos.get("/api/estatisticas/maior-valor?limit=1")
+        assert [p["id"] for p in response.get_json()] == [3]
+
+        assert com_produtos.get("/api/estatisticas/maior-valor?limit=0").status_code == 400
+
+    def test_histograma_precos(self, com_produtos):
+        """Teste GET /api/estatisticas/precos"""
+        faixas = com_produtos.get("/api/estatisticas/precos?faixas=2").get_json()
+
+        assert [f["produtos"] for f in faixas] == [2, 1]
+        assert com_produtos.get("/api/estatisticas/precos?faixas=0").status_code == 400
+
+
+class TestAPIFiltros:
+    """Testes dos filtros por faixa e da ordenação em /api/produtos"""
+
+    @pytest.fixture
+    def com_produtos(self, client):
+        """Cliente com três produtos cadastrados"""
+        for produto, quantidade, valor in [
+            ("Mouse", 0, 50.0),
+            ("Teclado", 5, 150.0),
+            ("Monitor", 2, 900.0),
+        ]:
+            client.post(
+                "/api/produtos",
+                json={"produto": produto, "quantidade": quantidade, "valor": valor},
+            )
+        return client
+
+    def test_faixa_de_valor(self, com_produtos):
+        """Teste valor_min e valor_max sem paginação"""
+        response = com_produtos.get("/api/produtos?valor_min=100&valor_max=500")
+
+        assert response.status_code == 200
+        assert [p["id"] for p in response.get_json()] == [2]
+
+    def test_ordenacao_e_paginacao(self, com_produtos):
+        """Teste sort com limit retorna página e cursor"""
+        response = com_produtos.get("/api/produtos?sort=-valor&limit=2&quantidade_min=0")
+        pagina = response.get_json()
+
+        assert [p["id"] for p in pagina["produtos"]] == [3, 2]
+        assert pagina["proximo_cursor"] == 2
+
+    def test_quantidade_zero(self, com_produtos):
+        """Teste quantidade_max=0 após uma compra"""
+        com_produtos.post(
+            "/api/comprar", json={"produto_id": 3, "quantidade": 2, "confirmar": True}
+        )
+        response = com_produtos.get("/api/produtos?quantidade_max=0&fields=id")
+
+        assert response.get_json() == [{"id": 1}, {"id": 3}]
+
+    def test_parametros_invalidos(self, com_produtos):
+        """Teste filtro não numérico e ordem inválida"""
+        assert com_produtos.get("/api/produtos?valor_min=abc").status_code == 400
+        assert com_produtos.get("/api/produtos?sort=preco").status_code == 400
+
+
+class TestReservas:
+    """Testes da reserva de estoque na compra (HTML e API)"""
+
+    @pytest.fixture
+    def com_produto(self, client):
+        """Cliente com um produto de 5 unidades"""
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+        return client
+
+    def test_previa_reserva_o_estoque(self, com_produto):
+        """Teste prévia reserva e confirmação usa a reserva"""
+        import re
+
+        response = com_produto.post("/comprar/1", data={"quantidade": "5"})
+        token = re.search(r'name="reserva" value="([^"]+)"', response.get_data(as_text=True))
+        assert token
+
+        outra = com_produto.post(
+            "/api/comprar", json={"produto_id": 1, "quantidade": 1, "confirmar": True}
+        )
+        assert outra.status_code == 400
+
+        response = com_produto.post(
+            "/comprar/1",
+            data={"quantidade": "5", "confirmar": "true", "reserva": token.group(1)},
+        )
+        assert response.status_code == 302
+        assert com_produto.get("/api/produtos").get_json()[0]["quantidade"] == 0
+
+    def test_cancelar_na_pagina(self, com_produto):
+        """Teste botão cancelar devolve as unidades"""
+        import re
+
+        response = com_produto.post("/comprar/1", data={"quantidade": "5"})
+        token = re.search(r'name="reserva" value="([^"]+)"', response.get_data(as_text=True))
+        com_produto.post("/comprar/1", data={"cancelar": "true", "reserva": token.group(1)})
+
+        response = com_produto.post("/api/comprar", json={"produto_id": 1, "quantidade": 5})
+        assert response.get_json()["disponivel"] is True
+
+    def test_nova_previa_cancela_a_anterior(self, com_produto):
+        """Teste calcular de novo não acumula reservas do mesmo produto"""
+        import re
+
+        for quantidade in ("5", "4", "5"):
+            response = com_produto.post("/comprar/1", data={"quantidade": quantidade})
+            assert re.search(r'name="reserva" value="[^"]+"', response.get_data(as_text=True))
+
+        outra = com_produto.post("/api/comprar", json={"produto_id": 1, "quantidade": 1})
+        assert outra.get_json()["disponivel"] is False
+
+    def test_confirmacao_sem_reserva_valida_compra(self, com_produto):
+        """Teste token desconhecido (vencido) cai na compra comum"""
+        response = com_produto.post(
+            "/comprar/1", data={"quantidade": "2", "confirmar": "true", "reserva": "vencido"}
+        )
+        assert response.status_code == 302
+        assert com_produto.get("/api/produtos").get_json()[0]["quantidade"] == 3
+
+    def test_reserva_de_outro_produto(self, com_produto):
+        """Teste token de outro produto não confirma a compra dele"""
+        import re
+
+        com_produto.post(
+            "/api/produtos", json={"produto": "Teclado", "quantidade": 5, "valor": 9.0}
+        )
+        response = com_produto.post("/comprar/1", data={"quantidade": "5"})
+        token = re.search(r'name="reserva" value="([^"]+)"', response.get_data(as_text=True))
+
+        response = com_produto.post(
+            "/comprar/2", data={"quantidade": "1", "confirmar": "true", "reserva": token.group(1)}
+        )
+        assert response.status_code == 302
+        produtos = com_produto.get("/api/produtos").get_json()
+        assert [p["quantidade"] for p in produtos] == [5, 4]
+        outra = com_produto.post("/api/comprar", json={"produto_id": 1, "quantidade": 1})
+        assert outra.get_json()["disponivel"] is False
+
+    def test_confirmacao_com_outra_quantidade(self, com_produto):
+        """Teste quantidade diferente da prévia devolve a reserva e compra a informada"""
+        import re
+
+        response = com_produto.post("/comprar/1", data={"quantidade": "5"})
+        token = re.search(r'name="reserva" value="([^"]+)"', response.get_data(as_text=True))
+
+        response = com_produto.post(
+            "/comprar/1", data={"quantidade": "2", "confirmar": "true", "reserva": token.group(1)}
+        )
+        assert response.status_code == 302
+        assert com_produto.get("/api/produtos").get_json()[0]["quantidade"] == 3
+        outra = com_produto.post("/api/comprar", json={"produto_id": 1, "quantidade": 3})
+        assert outra.get_json()["disponivel"] is True
+
+    def test_api(self, com_produto):
+        """Teste POST /api/reservas, confirmação e cancelamento"""
+        response = com_produto.post("/api/reservas", json={"produto_id": 1, "quantidade": 2})
+        assert response.status_code == 201
+        token = response.get_json()["token"]
+
+        response = com_produto.post(f"/api/reservas/{token}/confirmar")
+        assert response.status_code == 200
+        assert response.get_json()["produto"]["quantidade"] == 3
+        assert com_produto.post(f"/api/reservas/{token}/confirmar").status_code == 400
+
+        token = com_produto.post(
+            "/api/reservas", json={"produto_id": 1, "quantidade": 3, "ttl": 60}
+        ).get_json()["token"]
+        assert com_produto.delete(f"/api/reservas/{token}").status_code == 204
+        assert com_produto.delete(f"/api/reservas/{token}").status_code == 404
+
+        response = com_produto.post("/api/reservas", json={"produto_id": 1, "quantidade": 9})
+        assert response.status_code == 400
+
+
+class TestIdempotencia:
+    """Testes do cabeçalho Idempotency-Key nos POST da API"""
+
+    @pytest.fixture
+    def client(self, client, tmp_path, monkeypatch):
+        """Cliente com um cache de idempotência próprio do teste"""
+        import app as modulo_app
+        from idempotencia import CacheIdempotencia
+
+        cache = CacheIdempotencia(str(tmp_path / "produtos.json.idempotencia"))
+        monkeypatch.setattr(modulo_app, "idempotencia", cache)
+        yield client
+        cache.fechar()
+
+    def test_cadastro_repetido_nao_grava(self, client):
+        """Teste repetição do cadastro devolve a mesma resposta sem gravar"""
+        import metricas
+
+        dados = {"produto": "Mouse", "quantidade": 5, "valor": 50.0}
+        cabecalhos = {"Idempotency-Key": "cadastro-1"}
+        primeira = client.post("/api/produtos", json=dados, headers=cabecalhos)
+        gravacoes = metricas.GRAVACOES.valor()
+
+        segunda = client.post("/api/produtos", json=dados, headers=cabecalhos)
+        assert segunda.status_code == primeira.status_code == 201
+        assert segunda.data == primeira.data
+        assert segunda.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in primeira.headers
+        assert metricas.GRAVACOES.valor() == gravacoes
+        assert len(client.get("/api/produtos").get_json()) == 1
+
+    def test_compra_repetida_baixa_uma_vez(self, client):
+        """Teste compra repetida com a mesma chave baixa o estoque uma vez"""
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+        dados = {"produto_id": 1, "quantidade": 2, "confirmar": True}
+        for _ in range(3):
+            response = client.post(
+                "/api/comprar", json=dados, headers={"Idempotency-Key": "compra-1"}
+            )
+            assert response.status_code == 200
+
+        assert client.get("/api/produtos").get_json()[0]["quantidade"] == 3
+
+    def test_chave_reutilizada_com_outro_corpo(self, client):
+        """Teste mesma chave com outro corpo é rejeitada"""
+        cabecalhos = {"Idempotency-Key": "cadastro-1"}
+        client.post(
+            "/api/produtos",
+            json={"produto": "Mouse", "quantidade": 5, "valor": 50.0},
+            headers=cabecalhos,
+        )
+        response = client.post(
+            "/api/produtos",
+            json={"produto": "Teclado", "quantidade": 5, "valor": 50.0},
+            headers=cabecalhos,
+        )
+        assert response.status_code == 422
+
+    def test_erro_do_cliente_tambem_e_guardado(self, client):
+        """Teste resposta 400 é repetida e chave inválida é rejeitada"""
+        cabecalhos = {"Idempotency-Key": "compra-1"}
+        dados = {"produto_id": 99, "quantidade": 1}
+        primeira = client.post("/api/comprar", json=dados, headers=cabecalhos)
+        segunda = client.post("/api/comprar", json=dados, headers=cabecalhos)
+        assert primeira.status_code == segunda.status_code
+        assert segunda.headers["Idempotent-Replayed"] == "true"
+
+        response = client.post("/api/comprar", json=dados, headers={"Idempotency-Key": "x" * 256})
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize(
+        "corpo,tipo",
+        [
+            ("produto,quantidade,valor\nMouse,5,50.0\n", "text/csv"),
+            ('{"produto": "Mouse", "quantidade": 5, "valor": 50.0}\n', "application/x-ndjson"),
+        ],
+    )
+    def test_lote_em_stream_com_chave(self, client, corpo, tipo):
+        """Teste lote CSV/NDJSON com chave lê o corpo já usado na impressão"""
+        cabecalhos = {"Idempotency-Key": "lote-1"}
+        for _ in range(2):
+            response = client.post(
+                "/api/produtos/lote", data=corpo.encode(), content_type=tipo, headers=cabecalhos
+            )
+            assert response.status_code == 201
+            assert response.get_json()["ids"] == [1]
+
+        assert len(client.get("/api/produtos").get_json()) == 1
+
+    def test_sem_cabecalho(self, client):
+        """Teste requisições sem chave são executadas normalmente"""
+        dados = {"produto": "Mouse", "quantidade": 5, "valor": 50.0}
+        client.post("/api/produtos", json=dados)
+        client.post("/api/produtos", json=dados)
+        assert len(client.get("/api/produtos").get_json()) == 2
+
+
+class TestEventos:
+    """Testes do endpoint Server-Sent Events /api/eventos"""
+
+    @pytest.fixture
+    def client(self, client, monkeypatch):
+        """Cliente com intervalo de keep-alive curto"""
+        import app as modulo_app
+
+        monkeypatch.setattr(modulo_app, "INTERVALO_PING_EVENTOS", 0.01)
+        return client
+
+    def _ler(self, response, partes):
+        """Lê as primeiras partes do stream e encerra a conexão"""
+        stream = iter(response.response)
+        try:
+            return b"".join(next(stream) for _ in range(partes)).decode()
+        finally:
+            response.close()
+
+    def test_retoma_desde_sequencia(self, client):
+        """Teste eventos posteriores a ?desde= no formato SSE"""
+        from app import manager
+
+        epoca, inicio = manager.eventos.epoca, manager.eventos.sequencia
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+        client.post("/api/comprar", json={"produto_id": 1, "quantidade": 2, "confirmar": True})
+
+        response = client.get(f"/api/eventos?desde={epoca}:{inicio}", buffered=False)
+        assert response.mimetype == "text/event-stream"
+        corpo = self._ler(response, 1)
+        assert f"id: {epoca}:{inicio + 1}\nevent: adicionado\n" in corpo
+        assert f"id: {epoca}:{inicio + 2}\nevent: comprado\n" in corpo
+        dados = corpo.split("data: ")[-1].strip()
+        assert json.loads(dados) == {"id": 1, "quantidade": 3, "disponivel": 3, "comprado": 2}
+
+    def test_somente_novos_e_ping(self, client):
+        """Teste sem sequência envia só as alterações após a conexão"""
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+
+        response = client.get("/api/eventos", buffered=False)
+        assert self._ler(response, 1) == ": ping\n\n"
+
+    @pytest.mark.parametrize("desde", ["{epoca}:999999999", "outro-worker:{sequencia}"])
+    def test_sequencia_perdida(self, client, desde):
+        """Teste Last-Event-ID desconhecido ou de outra época recebe reset"""
+        from app import manager
+
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+        epoca, sequencia = manager.eventos.epoca, manager.eventos.sequencia
+        response = client.get(
+            "/api/eventos",
+            headers={"Last-Event-ID": desde.format(epoca=epoca, sequencia=sequencia - 1)},
+            buffered=False,
+        )
+        corpo = self._ler(response, 1)
+        assert corpo == f"id: {epoca}:{sequencia}\nevent: reset\ndata: {{}}\n\n"
+
+    def test_id_invalido(self, client):
+        """Teste id fora do formato época:sequência recebe 400"""
+        assert client.get("/api/eventos?desde=abc").status_code == 400
+        assert client.get("/api/eventos?desde=12").status_code == 400
+
+    def test_conexao_encerrada_apos_duracao_maxima(self, client, monkeypatch):
+        """Teste o stream termina sozinho (o EventSource reconecta)"""
+        import app as modulo_app
+
+        monkeypatch.setattr(modulo_app, "DURACAO_MAXIMA_EVENTOS", 0.05)
+        response = client.get("/api/eventos", buffered=False)
+        corpo = b"".join(response.response).decode()
+        response.close()
+        assert corpo and set(corpo.split("\n\n")) <= {": ping", ""}
+
+    def test_pagina_inicial_nao_assina(self, client):
+        """Teste a página inicial não abre conexões com /api/eventos"""
+        client.post("/api/produtos", json={"produto": "Mouse", "quantidade": 5, "valor": 50.0})
+        assert b"/api/eventos" not in client.get("/").data
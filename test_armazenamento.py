@@ -0,0 +1,389 @@
+"""
+Testes unitários para o módulo armazenamento
+"""
+import json
+import os
+import sqlite3
+
+import pytest
+
+from armazenamento import (
+    ArmazenamentoJson,
+    ArmazenamentoSqlite,
+    criar_armazenamento,
+    interpretar_fsync,
+    migrar,
+)
+from codec import SnapshotBinario
+from produto_manager import ProdutoManager
+
+
+def _registro(produto_id, nome="Mouse", quantidade=10, valor=45.9):
+    """Monta um registro de inclusão de produto"""
+    produto = {"id": produto_id, "produto": nome, "quantidade": quantidade, "valor": valor}
+    return {"op": "adicionar", "produto": produto}
+
+
+@pytest.fixture(params=["json", "journal", "binario", "sqlite"])
+def criar(request, tmp_path):
+    """Fábrica de repositórios de um mesmo tipo sobre o mesmo arquivo"""
+    abertos = []
+
+    def fabrica():
+        if request.param == "sqlite":
+            armazenamento = ArmazenamentoSqlite(str(tmp_path / "produtos.db"))
+        elif request.param == "binario":
+            armazenamento = criar_armazenamento(str(tmp_path / "produtos.bin"))
+        else:
+            armazenamento = ArmazenamentoJson(
+                str(tmp_path / "produtos.json"), journal=request.param == "journal"
+            )
+        abertos.append(armazenamento)
+        return armazenamento
+
+    yield fabrica
+
+    for armazenamento in abertos:
+        armazenamento.fechar()
+
+
+class TestArmazenamento:
+    """Testes comuns aos repositórios"""
+
+    def test_gravar_e_carregar(self, criar):
+        """Teste se alterações gravadas são lidas de volta"""
+        armazenamento = criar()
+        produtos = [_registro(1)["produto"], _registro(2, "Teclado")["produto"]]
+        with armazenamento.transacao():
+            armazenamento.carregar()
+            armazenamento.gravar([_registro(1), _registro(2, "Teclado")], produtos)
+            produtos[0]["quantidade"] = 7
+            armazenamento.gravar([{"op": "estoque", "id": 1, "quantidade": 7}], produtos)
+
+        leitor = criar()
+        with leitor.transacao():
+            carregados = leitor.carregar()
+
+        assert [p["produto"] for p in carregados] == ["Mouse", "Teclado"]
+        assert carregados[0]["quantidade"] == 7
+
+    def test_alterado_por_outra_instancia(self, criar):
+        """Teste se a gravação de outro repositório é detectada"""
+        primeiro = criar()
+        segundo = criar()
+        with primeiro.transacao():
+            primeiro.carregar()
+        with segundo.transacao():
+            segundo.carregar()
+            segundo.gravar([_registro(1)], [_registro(1)["produto"]])
+
+        with primeiro.transacao():
+            assert primeiro.alterado()
+            primeiro.carregar()
+            assert not primeiro.alterado()
+
+    def test_propria_gravacao_nao_marca_alterado(self, criar):
+        """Teste se as gravações do próprio repositório não forçam releitura"""
+        armazenamento = criar()
+        with armazenamento.transacao():
+            armazenamento.carregar()
+            armazenamento.gravar([_registro(1)], [_registro(1)["produto"]])
+            assert not armazenamento.alterado()
+
+    def test_alteracoes_incrementais(self, criar, request):
+        """Teste leitura só do que outro repositório gravou"""
+        primeiro = criar()
+        segundo = criar()
+        with primeiro.transacao():
+            primeiro.carregar()
+        with segundo.transacao():
+            segundo.carregar()
+            produtos = [_registro(1)["produto"], _registro(2, "Teclado")["produto"]]
+            segundo.gravar([_registro(1), _registro(2, "Teclado")], produtos)
+            segundo.gravar([{"op": "estoque", "id": 1, "quantidade": 3}], produtos)
+
+        with primeiro.transacao():
+            registros = primeiro.alteracoes()
+            if request.node.callspec.params["criar"] in ("json", "binario"):
+                # O snapshot é reescrito por inteiro e exige carregar()
+                assert registros is None
+                return
+            assert not primeiro.alterado()
+
+        estado = {}
+        for registro in registros:
+            if registro["op"] == "adicionar":
+                estado[registro["produto"]["id"]] = dict(registro["produto"])
+            else:
+                estado[registro["id"]]["quantidade"] = registro["quantidade"]
+        assert estado[1]["quantidade"] == 3
+        assert estado[2]["produto"] == "Teclado"
+
+    def test_transacao_reentrante(self, criar):
+        """Teste se transações aninhadas não travam"""
+        armazenamento = criar()
+        with armazenamento.transacao():
+            with armazenamento.transacao():
+                assert armazenamento.carregar() == []
+
+
+class TestGravacaoSegura:
+    """Testes de gravação atômica, política de fsync e recuperação"""
+
+    @pytest.mark.parametrize(
+        "politica, intervalo",
+        [("sempre", 0.0), ("nunca", None), ("100ms", 0.1), ("250", 0.25), (" 5MS ", 0.005)],
+    )
+    def test_interpretar_fsync(self, politica, intervalo):
+        """Teste se as políticas de fsync são convertidas no intervalo"""
+        assert interpretar_fsync(politica) == intervalo
+
+    @pytest.mark.parametrize("politica", ["", "às vezes", "-5ms", "10s"])
+    def test_interpretar_fsync_invalido(self, politica):
+        """Teste se políticas desconhecidas são rejeitadas"""
+        with pytest.raises(ValueError):
+            interpretar_fsync(politica)
+
+    def test_gravacao_mantem_backup(self, tmp_path):
+        """Teste se a gravação troca o snapshot e guarda o anterior em .bak"""
+        caminho = tmp_path / "produtos.json"
+        armazenamento = ArmazenamentoJson(str(caminho))
+        with armazenamento.transacao():
+            armazenamento.gravar([_registro(1)], [_registro(1)["produto"]])
+        with armazenamento.transacao():
+            produtos = [_registro(1)["produto"], _registro(2, "Teclado")["produto"]]
+            armazenamento.gravar([_registro(2, "Teclado")], produtos)
+        armazenamento.fechar()
+
+        assert len(json.loads(caminho.read_text())) == 2
+        assert len(json.loads((tmp_path / "produtos.json.bak").read_text())) == 1
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_recupera_snapshot_corrompido(self, tmp_path):
+        """Teste se um snapshot corrompido é preservado e o backup é usado"""
+        caminho = tmp_path / "produtos.json"
+        caminho.write_text('[{"id": 1, "produto": "Mou')
+        (tmp_path / "produtos.json.bak").write_text(json.dumps([_registro(1)["produto"]]))
+
+        armazenamento = ArmazenamentoJson(str(caminho))
+        with armazenamento.transacao():
+            produtos = armazenamento.carregar()
+        armazenamento.fechar()
+
+        assert [p["produto"] for p in produtos] == ["Mouse"]
+        assert (tmp_path / "produtos.json.corrompido").read_text().startswith('[{"id": 1')
+        assert json.loads(caminho.read_text()) == [_registro(1)["produto"]]
+
+    def test_fsync_por_intervalo(self, tmp_path, monkeypatch):
+        """Teste se a política por intervalo agrupa os fsyncs até fechar"""
+        sincronizados = []
+        fsync_original = os.fsync
+
+        def fsync(descritor):
+            sincronizados.append(descritor)
+            fsync_original(descritor)
+
+        monkeypatch.setattr(os, "fsync", fsync)
+        armazenamento = ArmazenamentoJson(
+            str(tmp_path / "produtos.json"), journal=True, fsync="3600000ms"
+        )
+        with armazenamento.transacao():
+            armazenamento.carregar()
+            for produto_id in range(1, 4):
+                armazenamento.gravar([_registro(produto_id)], [])
+
+        assert sincronizados == []
+        assert armazenamento._temporizador_fsync is not None
+
+        armazenamento.fechar()
+        assert sincronizados
+        assert armazenamento._temporizador_fsync is None
+
+    def test_sqlite_synchronous(self, tmp_path):
+        """Teste se a política de fsync define o PRAGMA synchronous"""
+        niveis = {"sempre": 2, "100ms": 1, "nunca": 0}
+        for politica, nivel in niveis.items():
+            armazenamento = ArmazenamentoSqlite(str(tmp_path / "produtos.db"), fsync=politica)
+            with armazenamento.transacao():
+                conexao = armazenamento._conexao()
+                assert conexao.execute("PRAGMA synchronous").fetchone()[0] == nivel
+            armazenamento.fechar()
+
+
+class TestArmazenamentoSqlite:
+    """Testes específicos do repositório SQLite"""
+
+    def test_modo_wal_e_indices(self, tmp_path):
+        """Teste se o banco usa WAL e tem índice por nome"""
+        caminho = str(tmp_path / "produtos.db")
+        ArmazenamentoSqlite(caminho).fechar()
+
+        conexao = sqlite3.connect(caminho)
+        modo = conexao.execute("PRAGMA journal_mode").fetchone()[0]
+        indices = [linha[1] for linha in conexao.execute("PRAGMA index_list(produtos)")]
+        conexao.close()
+
+        assert modo == "wal"
+        assert "idx_produtos_chave" in indices
+
+    def test_migra_coluna_geracao(self, tmp_path):
+        """Teste banco sem a coluna geracao ganha a coluna ao abrir"""
+        caminho = str(tmp_path / "antigo.db")
+        conexao = sqlite3.connect(caminho)
+        conexao.execute(
+            "CREATE TABLE produtos (id INTEGER PRIMARY KEY, produto TEXT NOT NULL,"
+            " quantidade INTEGER NOT NULL, valor REAL NOT NULL)"
+        )
+        conexao.execute("INSERT INTO produtos VALUES (1, 'Mouse', 5, 10.0)")
+        conexao.commit()
+        conexao.close()
+
+        armazenamento = ArmazenamentoSqlite(caminho)
+        with armazenamento.transacao():
+            assert armazenamento.carregar()[0]["produto"] == "Mouse"
+        armazenamento.fechar()
+
+    def test_migra_coluna_chave(self, tmp_path):
+        """Teste banco sem a coluna chave é preenchido com os nomes normalizados"""
+        caminho = str(tmp_path / "antigo.db")
+        conexao = sqlite3.connect(caminho)
+        conexao.execute(
+            "CREATE TABLE produtos (id INTEGER PRIMARY KEY, produto TEXT NOT NULL,"
+            " quantidade INTEGER NOT NULL, valor REAL NOT NULL)"
+        )
+        conexao.execute("INSERT INTO produtos VALUES (1, 'Café', 5, 10.0)")
+        conexao.commit()
+        conexao.close()
+
+        armazenamento = ArmazenamentoSqlite(caminho)
+        assert [p["id"] for p in armazenamento.buscar_por_chave("cafe")] == [1]
+        armazenamento.fechar()
+
+    def test_consultas_indexadas(self, tmp_path):
+        """Teste busca por ID e por chave e páginas em ordem de ID e alfabética"""
+        armazenamento = ArmazenamentoSqlite(str(tmp_path / "produtos.db"))
+        registros = [_registro(1, "Teclado"), _registro(2, "Mouse"), _registro(3, "mouse")]
+        with armazenamento.transacao():
+            armazenamento.gravar(registros, [r["produto"] for r in registros])
+
+        assert armazenamento.consultas_indexadas
+        assert armazenamento.buscar_por_id(2)["produto"] == "Mouse"
+        assert armazenamento.buscar_por_id(9) is None
+        assert [p["id"] for p in armazenamento.buscar_por_chave("mouse")] == [2, 3]
+        assert [p["id"] for p in armazenamento.pagina("id", 2, None)] == [1, 2]
+        assert [p["id"] for p in armazenamento.pagina("id", None, 2)] == [3]
+        assert [p["id"] for p in armazenamento.pagina("alfabetica", None, None)] == [2, 3, 1]
+        assert [p["id"] for p in armazenamento.pagina("alfabetica", 1, 2)] == [3]
+        with pytest.raises(ValueError, match="Cursor inválido"):
+            armazenamento.pagina("id", 10, 9)
+        armazenamento.fechar()
+
+    def test_consulta_ve_gravacao_de_outra_conexao(self, tmp_path):
+        """Teste consultas enxergam o que outro processo gravou, sem recarregar"""
+        caminho = str(tmp_path / "produtos.db")
+        leitor = ArmazenamentoSqlite(caminho)
+        assert leitor.buscar_por_id(1) is None
+
+        escritor = ArmazenamentoSqlite(caminho)
+        with escritor.transacao():
+            escritor.gravar([_registro(1)], [_registro(1)["produto"]])
+        escritor.fechar()
+
+        assert leitor.buscar_por_id(1)["quantidade"] == 10
+        assert [p["id"] for p in leitor.pagina("alfabetica", 10, None)] == [1]
+        leitor.fechar()
+
+    def test_rollback_em_erro(self, tmp_path):
+        """Teste se uma exceção na transação desfaz a gravação"""
+        armazenamento = ArmazenamentoSqlite(str(tmp_path / "produtos.db"))
+        with pytest.raises(RuntimeError):
+            with armazenamento.transacao():
+                armazenamento.gravar([_registro(1)], [])
+                raise RuntimeError("falha")
+
+        with armazenamento.transacao():
+            assert armazenamento.carregar() == []
+        armazenamento.fechar()
+
+
+class TestCriarArmazenamento:
+    """Testes da escolha de repositório pela extensão"""
+
+    def test_extensoes(self, tmp_path):
+        """Teste se .db usa SQLite e .json usa arquivo JSON"""
+        sqlite = criar_armazenamento(str(tmp_path / "produtos.sqlite3"))
+        arquivo = criar_armazenamento(str(tmp_path / "produtos.json"), journal=True)
+
+        assert isinstance(sqlite, ArmazenamentoSqlite)
+        assert isinstance(arquivo, ArmazenamentoJson)
+        binario = criar_armazenamento(str(tmp_path / "produtos.bin"))
+        assert isinstance(binario.formato, SnapshotBinario)
+        binario.fechar()
+        assert arquivo.journal
+        sqlite.fechar()
+
+    def test_manager_com_sqlite(self, tmp_path):
+        """Teste fluxo do gerenciador sobre SQLite"""
+        caminho = str(tmp_path / "produtos.db")
+        manager = ProdutoManager(caminho)
+        manager.adicionar_produto("Mouse", 50, 45.90)
+        manager.comprar_produto(1, 5, confirmar=True)
+        manager.fechar()
+
+        recarregado = ProdutoManager(caminho)
+        assert recarregado.buscar_produto_por_id(1)["quantidade"] == 45
+        assert recarregado.proximo_id == 2
+        recarregado.fechar()
+
+    def test_json_compativel_com_formato_original(self, tmp_path):
+        """Teste se o repositório JSON lê o arquivo no formato original"""
+        caminho = tmp_path / "produtos.json"
+        caminho.write_text(
+            json.dumps([{"id": 3, "produto": "Cabo", "quantidade": 1, "valor": 9.9}]),
+            encoding="utf-8",
+        )
+        armazenamento = ArmazenamentoJson(str(caminho))
+
+        with armazenamento.transacao():
+            assert armazenamento.carregar()[0]["produto"] == "Cabo"
+        armazenamento.fechar()
+
+
+class TestMigrar:
+    """Testes da migração entre formatos"""
+
+    @pytest.fixture
+    def origem(self, tmp_path):
+        """Arquivo JSON com journal pendente"""
+        arquivo = str(tmp_path / "produtos.json")
+        manager = ProdutoManager(arquivo, journal=True)
+        manager.adicionar_produto("Mouse", 10, 45.9)
+        manager.adicionar_produto("Café", 5, 12.5)
+        manager.comprar_produto(1, 3, confirmar=True)
+        manager.fechar()
+        return arquivo
+
+    @pytest.mark.parametrize("destino", ["produtos.bin", "produtos.db", "copia.json"])
+    def test_migrar(self, origem, tmp_path, destino):
+        """Teste catálogo copiado com o journal incorporado"""
+        caminho = str(tmp_path / destino)
+
+        assert migrar(origem, caminho) == 2
+        manager = ProdutoManager(caminho)
+        assert manager.buscar_produto_por_id(1)["quantidade"] == 7
+        assert manager.buscar_produto_por_nome("café")["id"] == 2
+        manager.fechar()
+
+    def test_origem_nao_alterada(self, origem, tmp_path):
+        """Teste journal da origem é mantido"""
+        migrar(origem, str(tmp_path / "produtos.bin"))
+
+        assert os.path.exists(origem + ".log")
+
+    def test_destino_com_produtos(self, origem, tmp_path):
+        """Teste destino já preenchido não é sobrescrito"""
+        destino = str(tmp_path / "produtos.bin")
+        migrar(origem, destino)
+
+        with pytest.raises(ValueError, match="já contém produtos"):
+            migrar(origem, destino)
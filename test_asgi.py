@@ -0,0 +1,471 @@
+"""
+Testes da API assíncrona (ASGI)
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from asgi import AplicacaoAsgi
+from produto_manager import ProdutoManager
+from produto_manager_assincrono import ProdutoManagerAssincrono
+
+
+async def _chamar(aplicacao, metodo, caminho, corpo=None, consulta="", cabecalhos=()):
+    """Executa uma requisição na aplicação ASGI e retorna (status, cabeçalhos, corpo)"""
+    enviados = []
+    corpo = json.dumps(corpo).encode() if corpo is not None else b""
+    mensagens = [{"type": "http.request", "body": corpo, "more_body": False}]
+
+    async def receive():
+        return mensagens.pop(0)
+
+    async def send(mensagem):
+        enviados.append(mensagem)
+
+    scope = {
+        "type": "http",
+        "method": metodo,
+        "path": caminho,
+        "query_string": consulta.encode(),
+        "headers": [(nome.encode(), valor.encode()) for nome, valor in cabecalhos],
+    }
+    await aplicacao(scope, receive, send)
+    inicio = enviados[0]
+    assert inicio["type"] == "http.response.start"
+    return (
+        inicio["status"],
+        dict(inicio["headers"]),
+        b"".join(m.get("body", b"") for m in enviados[1:]),
+    )
+
+
+def chamar(aplicacao, metodo, caminho, corpo=None, consulta=""):
+    """Versão síncrona de _chamar, com o corpo da resposta decodificado"""
+    status, cabecalhos, corpo = asyncio.run(_chamar(aplicacao, metodo, caminho, corpo, consulta))
+    return status, json.loads(corpo)
+
+
+@pytest.fixture
+def gerenciador(tmp_path):
+    """Gerenciador assíncrono sobre um arquivo temporário"""
+    manager = ProdutoManager(str(tmp_path / "produtos.json"))
+    gerenciador = ProdutoManagerAssincrono(manager, threads=4)
+    yield gerenciador
+    gerenciador.fechar()
+    manager.fechar()
+
+
+@pytest.fixture
+def aplicacao(gerenciador):
+    """Aplicação ASGI de teste"""
+    return AplicacaoAsgi(gerenciador)
+
+
+class TestAPIAssincrona:
+    """Testes dos contratos da API ASGI"""
+
+    def test_adicionar_e_listar(self, aplicacao):
+        """Teste POST /api/produtos e GET /api/produtos"""
+        status, produto = chamar(
+            aplicacao,
+            "POST",
+            "/api/produtos",
+            {"produto": "Mouse", "quantidade": 10, "valor": 45.9},
+        )
+        assert status == 201
+        assert produto == {"id": 1, "produto": "Mouse", "quantidade": 10, "valor": 45.9}
+
+        status, produtos = chamar(aplicacao, "GET", "/api/produtos")
+        assert status == 200
+        assert produtos == [produto]
+
+    def test_listagem_vazia(self, aplicacao):
+        """Teste listagem em streaming de catálogo vazio"""
+        assert chamar(aplicacao, "GET", "/api/produtos") == (200, [])
+
+    def test_listagem_paginada_e_alfabetica(self, gerenciador, aplicacao):
+        """Teste limit, cursor e fields como na aplicação Flask"""
+        gerenciador.manager.adicionar_produto("Teclado", 5, 100.0)
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+
+        status, pagina = chamar(aplicacao, "GET", "/api/produtos", consulta="limit=1")
+        assert status == 200
+        assert [p["id"] for p in pagina["produtos"]] == [1]
+        assert pagina["proximo_cursor"] == 1
+
+        _, produtos = chamar(
+            aplicacao, "GET", "/api/produtos/alfabetica", consulta="fields=produto"
+        )
+        assert produtos == [{"produto": "Mouse"}, {"produto": "Teclado"}]
+
+        status, erro = chamar(aplicacao, "GET", "/api/produtos", consulta="limit=abc")
+        assert status == 400
+        assert "error" in erro
+
+    def test_filtros_por_faixa(self, gerenciador, aplicacao):
+        """Teste valor_min, quantidade_max e sort como na aplicação Flask"""
+        gerenciador.manager.adicionar_produto("Teclado", 0, 100.0)
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+        gerenciador.manager.adicionar_produto("Monitor", 2, 900.0)
+
+        _, produtos = chamar(aplicacao, "GET", "/api/produtos", consulta="valor_min=60")
+        assert [p["id"] for p in produtos] == [1, 3]
+
+        _, pagina = chamar(
+            aplicacao, "GET", "/api/produtos", consulta="sort=-valor&limit=1&quantidade_min=1"
+        )
+        assert [p["id"] for p in pagina["produtos"]] == [3]
+        assert pagina["proximo_cursor"] == 3
+
+        status, _ = chamar(aplicacao, "GET", "/api/produtos", consulta="quantidade_max=x")
+        assert status == 400
+
+    def test_buscar(self, gerenciador, aplicacao):
+        """Teste GET /api/produtos/busca"""
+        gerenciador.manager.adicionar_produto("Mouse sem fio", 10, 50.0)
+
+        status, produtos = chamar(aplicacao, "GET", "/api/produtos/busca", consulta="q=mouse")
+        assert status == 200
+        assert [p["id"] for p in produtos] == [1]
+
+    def test_comprar(self, gerenciador, aplicacao):
+        """Teste POST /api/comprar com e sem confirmação"""
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+
+        status, resultado = chamar(
+            aplicacao, "POST", "/api/comprar", {"produto_id": 1, "quantidade": 2}
+        )
+        assert status == 200
+        assert resultado["total"] == 100.0
+        assert not resultado["confirmado"]
+
+        status, resultado = chamar(
+            aplicacao,
+            "POST",
+            "/api/comprar",
+            {"produto_id": 1, "quantidade": 2, "confirmar": True},
+        )
+        assert status == 200
+        assert resultado["confirmado"]
+        assert gerenciador.manager.buscar_produto_por_id(1)["quantidade"] == 8
+
+    def test_comprar_erros(self, gerenciador, aplicacao):
+        """Teste estoque insuficiente e corpo inválido"""
+        gerenciador.manager.adicionar_produto("Mouse", 1, 50.0)
+
+        status, erro = chamar(
+            aplicacao,
+            "POST",
+            "/api/comprar",
+            {"produto_id": 1, "quantidade": 5, "confirmar": True},
+        )
+        assert status == 400
+        assert "insuficiente" in erro["error"]
+
+        status, _ = chamar(aplicacao, "POST", "/api/comprar", {"quantidade": 1})
+        assert status == 500
+
+    def test_pedido(self, gerenciador, aplicacao):
+        """Teste POST /api/pedidos"""
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+        gerenciador.manager.adicionar_produto("Teclado", 5, 100.0)
+
+        status, pedido = chamar(
+            aplicacao,
+            "POST",
+            "/api/pedidos",
+            {"itens": [{"produto_id": 1, "quantidade": 1}, {"produto_id": 2, "quantidade": 2}]},
+        )
+        assert status == 200
+        assert pedido["total"] == 250.0
+
+        status, _ = chamar(aplicacao, "POST", "/api/pedidos", {"itens": [{"id": 1}]})
+        assert status == 400
+
+    def test_rota_e_metodo_inexistentes(self, aplicacao):
+        """Teste respostas 404 e 405"""
+        assert chamar(aplicacao, "GET", "/api/nada")[0] == 404
+        assert chamar(aplicacao, "DELETE", "/api/produtos")[0] == 405
+
+    def test_ciclo_de_vida(self, aplicacao):
+        """Teste mensagens lifespan de início e encerramento"""
+        mensagens = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        enviados = []
+
+        async def receive():
+            return mensagens.pop(0)
+
+        async def send(mensagem):
+            enviados.append(mensagem["type"])
+
+        asyncio.run(aplicacao({"type": "lifespan"}, receive, send))
+        assert enviados == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+class TestIdempotenciaAssincrona:
+    """Testes do cabeçalho Idempotency-Key nos POST da API ASGI"""
+
+    def _comprar(self, aplicacao, chave, quantidade=2):
+        corpo = {"produto_id": 1, "quantidade": quantidade, "confirmar": True}
+        return asyncio.run(
+            _chamar(
+                aplicacao, "POST", "/api/comprar", corpo, cabecalhos=[("Idempotency-Key", chave)]
+            )
+        )
+
+    def test_compra_repetida_baixa_uma_vez(self, gerenciador, aplicacao):
+        """Teste compra repetida com a mesma chave baixa o estoque uma vez"""
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+
+        primeira = self._comprar(aplicacao, "compra-1")
+        segunda = self._comprar(aplicacao, "compra-1")
+        assert primeira[0] == segunda[0] == 200
+        assert primeira[2] == segunda[2]
+        assert segunda[1][b"idempotent-replayed"] == b"true"
+        assert b"idempotent-replayed" not in primeira[1]
+        assert gerenciador.manager.buscar_produto_por_id(1)["quantidade"] == 8
+
+    def test_conflitos_e_chave_invalida(self, gerenciador, aplicacao):
+        """Teste mesma chave com outro corpo (422) e chave longa demais (400)"""
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+        self._comprar(aplicacao, "compra-1")
+
+        assert self._comprar(aplicacao, "compra-1", quantidade=3)[0] == 422
+        assert self._comprar(aplicacao, "x" * 256)[0] == 400
+        assert gerenciador.manager.buscar_produto_por_id(1)["quantidade"] == 8
+
+    def test_log_compartilhado_entre_workers(self, gerenciador, tmp_path):
+        """Teste repetição recebida por outro worker devolve a resposta guardada"""
+        from idempotencia import CacheIdempotencia
+
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        caches = [CacheIdempotencia(arquivo), CacheIdempotencia(arquivo)]
+        worker_a, worker_b = (AplicacaoAsgi(gerenciador, cache) for cache in caches)
+
+        self._comprar(worker_a, "compra-1")
+        status, cabecalhos, _ = self._comprar(worker_b, "compra-1")
+        assert status == 200
+        assert cabecalhos[b"idempotent-replayed"] == b"true"
+        assert gerenciador.manager.buscar_produto_por_id(1)["quantidade"] == 8
+        for cache in caches:
+            cache.fechar()
+
+
+class TestGravacaoSemBloquear:
+    """Testes de que gravações lentas não bloqueiam o loop de eventos"""
+
+    def test_leituras_durante_gravacao(self, gerenciador, aplicacao, monkeypatch):
+        """Teste listagem é respondida enquanto uma compra espera pelo disco"""
+        gerenciador.manager.adicionar_produto("Mouse", 10, 50.0)
+        gravando = threading.Event()
+        gravar = gerenciador.manager.armazenamento.gravar
+
+        def gravar_devagar(registros, produtos):
+            gravando.set()
+            time.sleep(0.3)
+            gravar(registros, produtos)
+
+        monkeypatch.setattr(gerenciador.manager.armazenamento, "gravar", gravar_devagar)
+
+        async def cenario():
+            compra = asyncio.ensure_future(
+                _chamar(
+                    aplicacao,
+                    "POST",
+                    "/api/comprar",
+                    {"produto_id": 1, "quantidade": 1, "confirmar": True},
+                )
+            )
+            while not gravando.is_set():
+                await asyncio.sleep(0.005)
+            inicio = time.perf_counter()
+            status, _, _ = await _chamar(aplicacao, "GET", "/api/produtos", consulta="limit=10")
+            espera = time.perf_counter() - inicio
+            assert not compra.done()
+            return status, espera, await compra
+
+        status, espera, (status_compra, _, _) = asyncio.run(cenario())
+        assert status == 200
+        assert espera < 0.2
+        assert status_compra == 200
+
+    @pytest.mark.parametrize(
+        "arquivo, consulta",
+        [("produtos.db", "limit=10"), ("produtos.json", "sort=valor&limit=10")],
+    )
+    def test_loop_livre_durante_gravacao(self, tmp_path, monkeypatch, arquivo, consulta):
+        """Teste sincronização (SQLite) e consulta filtrada não travam o loop"""
+        manager = ProdutoManager(str(tmp_path / arquivo))
+        gerenciador = ProdutoManagerAssincrono(manager, threads=4)
+        aplicacao = AplicacaoAsgi(gerenciador)
+        manager.adicionar_produto("Mouse", 10, 50.0)
+        gravando = threading.Event()
+        gravar = manager.armazenamento.gravar
+
+        def gravar_devagar(registros, produtos):
+            gravando.set()
+            time.sleep(0.3)
+            gravar(registros, produtos)
+
+        monkeypatch.setattr(manager.armazenamento, "gravar", gravar_devagar)
+        compra = threading.Thread(target=manager.comprar_produto, args=(1, 1, True))
+        compra.start()
+        gravando.wait()
+
+        async def cenario():
+            listagem = asyncio.ensure_future(
+                _chamar(aplicacao, "GET", "/api/produtos", consulta=consulta)
+            )
+            inicio = time.perf_counter()
+            await asyncio.sleep(0.01)
+            espera = time.perf_counter() - inicio
+            return espera, await listagem
+
+        espera, (status, _, _) = asyncio.run(cenario())
+        compra.join()
+        assert espera < 0.2
+        assert status == 200
+        gerenciador.fechar()
+        manager.fechar()
+
+    def test_compras_concorrentes(self, gerenciador, aplicacao):
+        """Teste compras simultâneas são todas aplicadas"""
+        gerenciador.manager.adicionar_produto("Mouse", 100, 50.0)
+
+        async def comprar_varias():
+            return await asyncio.gather(
+                *(
+                    _chamar(
+                        aplicacao,
+                        "POST",
+                        "/api/comprar",
+                        {"produto_id": 1, "quantidade": 1, "confirmar": True},
+                    )
+                    for _ in range(20)
+                )
+            )
+
+        respostas = asyncio.run(comprar_varias())
+        assert [status for status, _, _ in respostas] == [200] * 20
+        assert gerenciador.manager.buscar_produto_por_id(1)["quantidade"] == 80
+
+
+class TestProdutoManagerAssincrono:
+    """Testes da interface assíncrona do gerenciador"""
+
+    def test_iterar_produtos(self, gerenciador):
+        """Teste lotes lidos no pool de threads"""
+        gerenciador.manager.adicionar_produtos_em_lote(
+            {"produto": f"Produto {i}", "quantidade": 1, "valor": 1.0} for i in range(5)
+        )
+
+        async def coletar():
+            return [lote async for lote in gerenciador.iterar_produtos(tamanho_lote=2)]
+
+        lotes = asyncio.run(coletar())
+        assert [len(lote) for lote in lotes] == [2, 2, 1]
+
+    def test_iterar_produtos_ordem_invalida(self, gerenciador):
+        """Teste validação feita na chamada"""
+        with pytest.raises(ValueError):
+            gerenciador.iterar_produtos("preco")
+
+    def test_adicionar_em_lote(self, gerenciador):
+        """Teste cadastro em lote no pool de threads"""
+        resultado = asyncio.run(
+            gerenciador.adicionar_produtos_em_lote(
+                [{"produto": "Mouse", "quantidade": 1, "valor": 1.0}, {"produto": ""}]
+            )
+        )
+        assert len(resultado["adicionados"]) == 1
+        assert len(resultado["erros"]) == 1
+
+    def test_sincronizar(self, tmp_path):
+        """Teste alterações de outro gerenciador são aplicadas"""
+        arquivo = str(tmp_path / "produtos.json")
+        primeiro = ProdutoManager(arquivo)
+        segundo = ProdutoManagerAssincrono(ProdutoManager(arquivo))
+
+        assert not asyncio.run(segundo.sincronizar())
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+        assert asyncio.run(segundo.sincronizar())
+        assert asyncio.run(segundo.buscar_produto_por_id(1))["produto"] == "Mouse"
+
+        segundo.fechar()
+        segundo.manager.fechar()
+        primeiro.fechar()
+
+    def test_consultas_no_sqlite(self, tmp_path):
+        """Teste busca e página leem o SQLite no pool, sem sincronizar"""
+        arquivo = str(tmp_path / "produtos.db")
+        primeiro = ProdutoManager(arquivo)
+        segundo = ProdutoManagerAssincrono(ProdutoManager(arquivo))
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+
+        assert asyncio.run(segundo.buscar_produto_por_id(1))["produto"] == "Mouse"
+        pagina = asyncio.run(segundo.paginar_produtos("alfabetica", 10))
+        assert [p["produto"] for p in pagina["produtos"]] == ["Mouse"]
+
+        segundo.fechar()
+        segundo.manager.fechar()
+        primeiro.fechar()
+
+
+class TestEventosAssincronos:
+    """Testes de /api/eventos na aplicação ASGI"""
+
+    @pytest.fixture(autouse=True)
+    def duracao_curta(self, monkeypatch):
+        """Conexões curtas, para que cada chamada termine"""
+        import asgi
+
+        monkeypatch.setattr(asgi, "DURACAO_MAXIMA_EVENTOS", 0.3)
+        monkeypatch.setattr(asgi, "INTERVALO_PING_EVENTOS", 0.1)
+
+    def test_retoma_desde_sequencia(self, gerenciador, aplicacao):
+        """Teste eventos posteriores a ?desde= em text/event-stream"""
+        epoca, inicio = gerenciador.manager.eventos.epoca, gerenciador.manager.eventos.sequencia
+        gerenciador.manager.adicionar_produto("Mouse", 5, 50.0)
+
+        status, cabecalhos, corpo = asyncio.run(
+            _chamar(aplicacao, "GET", "/api/eventos", consulta=f"desde={epoca}:{inicio}")
+        )
+        assert status == 200
+        assert cabecalhos[b"content-type"] == b"text/event-stream"
+        assert corpo.decode().startswith(f"id: {epoca}:{inicio + 1}\nevent: adicionado\n")
+
+    def test_evento_publicado_durante_a_espera(self, gerenciador, aplicacao):
+        """Teste conexão à espera recebe evento publicado por outra thread"""
+        gerenciador.manager.adicionar_produto("Mouse", 5, 50.0)
+        compra = threading.Timer(0.05, gerenciador.manager.comprar_produto, (1, 2, True))
+        compra.start()
+
+        _, _, corpo = asyncio.run(_chamar(aplicacao, "GET", "/api/eventos"))
+        compra.join()
+        assert "event: comprado\n" in corpo.decode()
+
+    def test_last_event_id_desconhecido(self, gerenciador, aplicacao):
+        """Teste Last-Event-ID de outra época (outro worker) recebe reset"""
+        enviados = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(mensagem):
+            enviados.append(mensagem)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/eventos",
+            "query_string": b"",
+            "headers": [(b"Last-Event-ID", b"outro-worker:0")],
+        }
+        asyncio.run(aplicacao(scope, receive, send))
+        corpo = b"".join(m.get("body", b"") for m in enviados[1:]).decode()
+        eventos = gerenciador.manager.eventos
+        assert corpo.startswith(f"id: {eventos.epoca}:{eventos.sequencia}\nevent: reset\n")
@@ -0,0 +1,48 @@
+"""
+Testes unitários para o módulo cache_respostas
+"""
+from cache_respostas import CacheRespostas, calcular_etag
+
+
+class TestCacheRespostas:
+    """Testes do cache de respostas por versão"""
+
+    def test_obter_na_mesma_versao(self):
+        """Teste resposta guardada é devolvida enquanto a versão não muda"""
+        cache = CacheRespostas()
+        cache.guardar("/", 1, b"corpo", [("Content-Type", "text/html")])
+
+        entrada = cache.obter("/", 1)
+        assert entrada.corpo == b"corpo"
+        assert entrada.etag == calcular_etag(b"corpo")
+        assert entrada.cabecalhos == [("Content-Type", "text/html")]
+
+    def test_versao_nova_descarta_entrada(self):
+        """Teste consulta com outra versão remove a entrada"""
+        cache = CacheRespostas()
+        cache.guardar("/", 1, b"corpo", [])
+
+        assert cache.obter("/", 2) is None
+        assert len(cache) == 0
+
+    def test_remove_mais_antigas_quando_cheio(self):
+        """Teste limite de entradas"""
+        cache = CacheRespostas(tamanho=2)
+        for chave in ["/a", "/b", "/c"]:
+            cache.guardar(chave, 1, b"x", [])
+
+        assert cache.obter("/a", 1) is None
+        assert cache.obter("/c", 1) is not None
+        assert len(cache) == 2
+
+    def test_corpo_grande_nao_e_guardado(self):
+        """Teste corpo acima do limite não entra no cache"""
+        cache = CacheRespostas(tamanho_maximo_corpo=4)
+
+        assert cache.guardar("/", 1, b"12345", []) is None
+        assert cache.obter("/", 1) is None
+
+    def test_etag_depende_do_conteudo(self):
+        """Teste ETag igual para corpos iguais e diferente para corpos diferentes"""
+        assert calcular_etag(b"a") == calcular_etag(b"a")
+        assert calcular_etag(b"a") != calcular_etag(b"b")
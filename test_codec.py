@@ -0,0 +1,79 @@
+"""
+Testes unitários para o módulo codec
+"""
+import pytest
+
+import codec
+from produto import Produto
+
+PRODUTOS = [
+    {"id": 1, "produto": "Café Torrado", "quantidade": 10, "valor": 45.9},
+    {"id": 2, "produto": "Açúcar 🍬", "quantidade": 0, "valor": 3.0},
+]
+
+
+@pytest.fixture(params=sorted(codec.CODECS))
+def par_codec(request):
+    """Funções (codificar, decodificar) de cada codec disponível"""
+    return codec.CODECS[request.param]
+
+
+class TestCodecs:
+    """Testes comuns aos codecs JSON"""
+
+    def test_ida_e_volta(self, par_codec):
+        """Teste se o que é codificado é decodificado igual"""
+        codificar, decodificar = par_codec
+        assert decodificar(codificar(PRODUTOS)) == PRODUTOS
+
+    def test_json_compacto_em_utf8(self, par_codec):
+        """Teste saída sem espaços e sem escapes de caracteres não ASCII"""
+        codificar, _ = par_codec
+        assert codificar({"produto": "Café", "id": 1}) == '{"produto":"Café","id":1}'.encode()
+
+    def test_mapping_vira_objeto(self, par_codec):
+        """Teste se Produto é serializado como objeto JSON"""
+        codificar, decodificar = par_codec
+        assert decodificar(codificar([Produto.de_dict(PRODUTOS[0])])) == PRODUTOS[:1]
+
+    def test_erro_de_leitura_e_value_error(self, par_codec):
+        """Teste JSON inválido levanta ValueError"""
+        _, decodificar = par_codec
+        with pytest.raises(ValueError):
+            decodificar(b'{"id": 1')
+
+
+class TestSnapshotBinario:
+    """Testes do snapshot binário"""
+
+    def test_ida_e_volta(self, tmp_path):
+        """Teste gravação e leitura com nomes não ASCII"""
+        caminho = tmp_path / "produtos.bin"
+        formato = codec.SnapshotBinario()
+        caminho.write_bytes(formato.codificar([Produto.de_dict(p) for p in PRODUTOS]))
+
+        assert formato.ler(str(caminho)) == PRODUTOS
+
+    def test_tamanho_fixo(self):
+        """Teste registros de 32 bytes após o cabeçalho"""
+        dados = codec.SnapshotBinario().codificar(PRODUTOS)
+        nomes = "".join(p["produto"] for p in PRODUTOS).encode("utf-8")
+
+        assert len(dados) == codec.SnapshotBinario.CABECALHO.size + 2 * 32 + len(nomes)
+
+    def test_arquivo_vazio(self, tmp_path):
+        """Teste arquivo vazio equivale a catálogo vazio"""
+        caminho = tmp_path / "produtos.bin"
+        caminho.write_bytes(b"")
+
+        assert codec.SnapshotBinario().ler(str(caminho)) == []
+
+    def test_conteudo_invalido(self, tmp_path):
+        """Teste arquivo JSON ou truncado levanta ValueError"""
+        formato = codec.SnapshotBinario()
+        dados = formato.codificar(PRODUTOS)
+        for conteudo in [b"[]", dados[:40]]:
+            caminho = tmp_path / "produtos.bin"
+            caminho.write_bytes(conteudo)
+            with pytest.raises(ValueError):
+                formato.ler(str(caminho))
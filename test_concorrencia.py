@@ -0,0 +1,91 @@
+"""
+Testes de concorrência para compras simultâneas via /api/comprar
+"""
+import json
+import multiprocessing
+import threading
+
+import pytest
+
+import app as modulo_app
+from produto_manager import ProdutoManager
+
+ESTOQUE_INICIAL = 100
+THREADS = 4
+COMPRAS_POR_THREAD = 10
+
+
+@pytest.fixture(
+    params=[("estoque.json", False), ("estoque.json", True), ("estoque.db", False)],
+    ids=["snapshot", "journal", "sqlite"],
+)
+def arquivo_estoque(request, tmp_path):
+    """Arquivo de dados com um produto e o modo de armazenamento"""
+    nome, journal = request.param
+    arquivo = str(tmp_path / nome)
+    manager = ProdutoManager(arquivo, journal=journal)
+    manager.adicionar_produto("Ingresso", ESTOQUE_INICIAL, 10.0)
+    manager.fechar()
+    return arquivo, journal
+
+
+def _comprar_em_threads(arquivo: str, journal: bool) -> int:
+    """
+    Dispara compras de uma unidade em várias threads contra /api/comprar
+
+    Returns:
+        Número de compras confirmadas
+    """
+    modulo_app.manager = ProdutoManager(arquivo, journal=journal)
+    confirmadas = []
+
+    def comprar():
+        client = modulo_app.app.test_client()
+        for _ in range(COMPRAS_POR_THREAD):
+            response = client.post(
+                "/api/comprar",
+                data=json.dumps({"produto_id": 1, "quantidade": 1, "confirmar": True}),
+                content_type="application/json",
+            )
+            assert response.status_code in (200, 400)
+            if response.status_code == 200:
+                confirmadas.append(1)
+
+    threads = [threading.Thread(target=comprar) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(confirmadas)
+
+
+@pytest.mark.slow
+class TestComprasConcorrentes:
+    """Testes de compras simultâneas do mesmo produto"""
+
+    def test_threads_nao_vendem_alem_do_estoque(self, arquivo_estoque, monkeypatch):
+        """Teste compras em várias threads de um mesmo processo"""
+        arquivo, journal = arquivo_estoque
+        # Restaura o manager original da aplicação ao final do teste
+        monkeypatch.setattr(modulo_app, "manager", modulo_app.manager)
+
+        confirmadas = _comprar_em_threads(arquivo, journal)
+
+        restante = ProdutoManager(arquivo, journal=journal).buscar_produto_por_id(1)
+        assert confirmadas == THREADS * COMPRAS_POR_THREAD
+        assert restante["quantidade"] == ESTOQUE_INICIAL - confirmadas
+
+    def test_processos_nao_vendem_alem_do_estoque(self, arquivo_estoque):
+        """Teste compras em vários processos e threads sobre o mesmo arquivo"""
+        arquivo, journal = arquivo_estoque
+        processos = 4
+
+        contexto = multiprocessing.get_context("spawn")
+        with contexto.Pool(processos) as pool:
+            resultados = pool.starmap(_comprar_em_threads, [(arquivo, journal)] * processos)
+
+        restante = ProdutoManager(arquivo, journal=journal).buscar_produto_por_id(1)
+        tentativas = processos * THREADS * COMPRAS_POR_THREAD
+        assert tentativas > ESTOQUE_INICIAL
+        assert sum(resultados) == ESTOQUE_INICIAL
+        assert restante["quantidade"] == 0
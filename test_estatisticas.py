@@ -0,0 +1,106 @@
+"""
+Testes das colunas de estoque e das consultas agregadas
+"""
+import random
+
+import pytest
+
+import estatisticas
+from estatisticas import ColunasEstoque
+from produto import Produto
+
+# Com NumPy instalado, as consultas são conferidas nas duas implementações
+IMPLEMENTACOES = [
+    False,
+    pytest.param(
+        True, marks=pytest.mark.skipif(estatisticas.numpy is None, reason="NumPy não instalado")
+    ),
+]
+
+
+@pytest.fixture(params=IMPLEMENTACOES, ids=["python", "numpy"])
+def colunas(request):
+    """Colunas com alguns produtos"""
+    colunas = ColunasEstoque(usar_numpy=request.param)
+    colunas.construir(
+        [
+            Produto(1, "Mouse", 3, 50.0),
+            Produto(2, "Teclado", 0, 100.0),
+            Produto(3, "Monitor", 2, 900.0),
+            Produto(4, "Cabo", 10, 10.0),
+        ]
+    )
+    return colunas
+
+
+class TestColunasEstoque:
+    """Testes das consultas em Python puro e com NumPy"""
+
+    def test_resumo(self, colunas):
+        """Teste totais do estoque"""
+        assert colunas.resumo() == {
+            "produtos": 4,
+            "unidades": 15,
+            "sem_estoque": 1,
+            "valor_total": 2050.0,
+            "preco_minimo": 10.0,
+            "preco_maximo": 900.0,
+            "preco_medio": 265.0,
+        }
+
+    def test_atualizar(self, colunas):
+        """Teste inclusão e alteração incrementais"""
+        colunas.atualizar(Produto(2, "Teclado", 5, 100.0))
+        colunas.atualizar(Produto(5, "Hub", 1, 40.0))
+
+        assert len(colunas) == 5
+        assert colunas.resumo()["valor_total"] == 2590.0
+
+    def test_estoque_baixo(self, colunas):
+        """Teste ordem por quantidade e limite de resultados"""
+        assert colunas.estoque_baixo(5) == [2, 3, 1]
+        assert colunas.estoque_baixo(5, 2) == [2, 3]
+        assert colunas.estoque_baixo(0) == []
+
+    def test_maior_valor(self, colunas):
+        """Teste ordem por valor em estoque com desempate por ID"""
+        colunas.atualizar(Produto(4, "Cabo", 15, 10.0))
+
+        assert colunas.maior_valor(2) == [3, 1]
+        assert colunas.maior_valor(3) == [3, 1, 4]
+        assert colunas.maior_valor(10) == [3, 1, 4, 2]
+
+    def test_histograma(self, colunas):
+        """Teste faixas de mesma largura entre o menor e o maior preço"""
+        faixas = colunas.histograma_precos(2)
+
+        assert [f["produtos"] for f in faixas] == [3, 1]
+        assert faixas[0]["inicio"] == 10.0
+        assert faixas[0]["fim"] == faixas[1]["inicio"] == 455.0
+        assert faixas[1]["fim"] == 900.0
+        with pytest.raises(ValueError):
+            colunas.histograma_precos(0)
+
+    def test_histograma_preco_unico(self):
+        """Teste todos os produtos na primeira faixa quando os preços são iguais"""
+        colunas = ColunasEstoque(usar_numpy=False)
+        colunas.construir([Produto(1, "A", 1, 5.0), Produto(2, "B", 1, 5.0)])
+
+        assert [f["produtos"] for f in colunas.histograma_precos(3)] == [2, 0, 0]
+
+    @pytest.mark.skipif(estatisticas.numpy is None, reason="NumPy não instalado")
+    def test_implementacoes_equivalentes(self):
+        """Teste NumPy e Python puro retornam o mesmo em dados aleatórios"""
+        sorteio = random.Random(42)
+        produtos = [
+            Produto(i, f"P{i}", sorteio.randrange(20), round(sorteio.uniform(1, 500), 2))
+            for i in range(1, 2001)
+        ]
+        python, numpy = ColunasEstoque(usar_numpy=False), ColunasEstoque(usar_numpy=True)
+        python.construir(produtos)
+        numpy.construir(produtos)
+
+        assert python.resumo() == numpy.resumo()
+        assert python.estoque_baixo(3) == numpy.estoque_baixo(3)
+        assert python.maior_valor(50) == numpy.maior_valor(50)
+        assert python.histograma_precos(17) == numpy.histograma_precos(17)
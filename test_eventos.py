@@ -0,0 +1,72 @@
+"""
+Testes do barramento de eventos
+"""
+import threading
+
+import pytest
+
+from eventos import BarramentoEventos, EventosPerdidos, formatar
+
+
+class TestBarramentoEventos:
+    """Testes de publicação, leitura por sequência e descarte"""
+
+    def test_leitura_desde_sequencia(self):
+        """Teste eventos posteriores à sequência, em ordem"""
+        barramento = BarramentoEventos()
+        assert barramento.sequencia == 0
+        assert barramento.eventos_desde(0) == []
+
+        for i in range(5):
+            barramento.publicar("estoque", {"id": i})
+
+        assert [e.sequencia for e in barramento.eventos_desde(0)] == [1, 2, 3, 4, 5]
+        assert [e.dados["id"] for e in barramento.eventos_desde(3)] == [3, 4]
+        assert [e.sequencia for e in barramento.eventos_desde(1, maximo=2)] == [2, 3]
+        assert barramento.eventos_desde(5) == []
+
+    def test_espera_por_evento(self):
+        """Teste leitura bloqueia até a publicação e respeita o timeout"""
+        barramento = BarramentoEventos()
+        assert barramento.eventos_desde(0, timeout=0.01) == []
+
+        publicador = threading.Timer(0.05, barramento.publicar, ("adicionado", {"id": 1}))
+        publicador.start()
+        eventos = barramento.eventos_desde(0, timeout=5)
+        publicador.join()
+        assert [e.tipo for e in eventos] == ["adicionado"]
+
+    def test_eventos_perdidos(self):
+        """Teste sequência fora do buffer ou desconhecida"""
+        barramento = BarramentoEventos(capacidade=3)
+        for i in range(5):
+            barramento.publicar("estoque", {"id": i})
+
+        assert [e.sequencia for e in barramento.eventos_desde(2)] == [3, 4, 5]
+        with pytest.raises(EventosPerdidos):
+            barramento.eventos_desde(1)
+        with pytest.raises(EventosPerdidos):
+            barramento.eventos_desde(6)
+
+    def test_id_com_epoca(self):
+        """Teste ids de outro barramento (outro worker ou reinício) são perdidos"""
+        barramento = BarramentoEventos()
+        outro = BarramentoEventos()
+        barramento.publicar("estoque", {"id": 1})
+        outro.publicar("estoque", {"id": 2})
+
+        identificador = f"{barramento.epoca}:1"
+        assert formatar(barramento.epoca, 1, "estoque", {}).startswith(
+            f"id: {identificador}\n".encode()
+        )
+        assert barramento.sequencia_do_id(identificador) == 1
+        assert outro.sequencia_do_id(identificador) is None
+        with pytest.raises(EventosPerdidos):
+            outro.eventos_desde(outro.sequencia_do_id(identificador))
+        with pytest.raises(ValueError):
+            barramento.sequencia_do_id("1")
+
+    def test_capacidade_invalida(self):
+        """Teste capacidade deve ser positiva"""
+        with pytest.raises(ValueError):
+            BarramentoEventos(capacidade=0)
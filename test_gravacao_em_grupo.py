@@ -0,0 +1,109 @@
+"""
+Testes unitários para o módulo gravacao_em_grupo
+"""
+import threading
+
+import pytest
+
+from gravacao_em_grupo import GravadorEmGrupo
+
+
+class TestGravadorEmGrupo:
+    """Testes da gravação em lotes"""
+
+    def test_junta_registros_no_mesmo_lote(self):
+        """Teste registros enviados dentro do atraso são gravados juntos"""
+        gravados = []
+        gravador = GravadorEmGrupo(gravados.append, atraso_maximo=60)
+        primeiro = gravador.enviar([{"id": 1}])
+        segundo = gravador.enviar([{"id": 2}, {"id": 3}])
+
+        assert primeiro is segundo
+        gravador.fechar()
+        primeiro.aguardar()
+        assert gravados == [[{"id": 1}, {"id": 2}, {"id": 3}]]
+
+    def test_tamanho_maximo_dispara_gravacao(self):
+        """Teste lote cheio é gravado sem esperar o atraso"""
+        gravados = []
+        gravador = GravadorEmGrupo(gravados.append, atraso_maximo=60, tamanho_maximo=2)
+        lote = gravador.enviar([{"id": 1}, {"id": 2}])
+        seguinte = gravador.enviar([{"id": 3}])
+
+        lote.aguardar()
+        assert gravados == [[{"id": 1}, {"id": 2}]]
+        assert seguinte is not lote
+        gravador.fechar()
+        assert gravador.lotes_gravados == 2
+
+    def test_atraso_dispara_gravacao(self):
+        """Teste lote incompleto é gravado depois do atraso"""
+        gravados = []
+        gravador = GravadorEmGrupo(gravados.append, atraso_maximo=0.01)
+        gravador.enviar([{"id": 1}]).aguardar()
+
+        assert gravados == [[{"id": 1}]]
+        gravador.fechar()
+
+    def test_registros_durante_gravacao_vao_para_o_proximo_lote(self):
+        """Teste envios feitos enquanto um lote é gravado formam outro lote"""
+        gravando = threading.Event()
+        liberar = threading.Event()
+        gravados = []
+
+        def gravar(registros):
+            gravando.set()
+            liberar.wait()
+            gravados.append(list(registros))
+
+        gravador = GravadorEmGrupo(gravar, atraso_maximo=0)
+        primeiro = gravador.enviar([{"id": 1}])
+        gravando.wait()
+        segundo = gravador.enviar([{"id": 2}])
+        terceiro = gravador.enviar([{"id": 3}])
+        liberar.set()
+        gravador.fechar()
+
+        assert primeiro is not segundo
+        assert segundo is terceiro
+        assert gravados == [[{"id": 1}], [{"id": 2}, {"id": 3}]]
+
+    def test_erro_propagado_para_o_lote(self):
+        """Teste falha na gravação é relançada para quem aguarda o lote"""
+
+        def gravar(registros):
+            raise OSError("disco cheio")
+
+        gravador = GravadorEmGrupo(gravar, atraso_maximo=0)
+        lote = gravador.enviar([{"id": 1}])
+
+        with pytest.raises(OSError, match="disco cheio"):
+            lote.aguardar()
+        assert gravador.lotes_gravados == 0
+        gravador.fechar()
+
+    def test_descartar_lotes_pendentes(self):
+        """Teste lotes descartados recebem o erro e não são gravados"""
+        gravados = []
+        gravador = GravadorEmGrupo(gravados.append, atraso_maximo=60)
+        lote = gravador.enviar([{"id": 1}])
+        gravador.descartar(OSError("disco cheio"))
+        gravador.fechar()
+
+        with pytest.raises(OSError):
+            lote.aguardar()
+        assert gravados == []
+
+    def test_enviar_apos_fechar(self):
+        """Teste gravador fechado recusa registros"""
+        gravador = GravadorEmGrupo(lambda registros: None, atraso_maximo=0)
+        gravador.fechar()
+
+        with pytest.raises(RuntimeError):
+            gravador.enviar([{"id": 1}])
+
+    @pytest.mark.parametrize("atraso, tamanho", [(-1, 10), (0, 0)])
+    def test_parametros_invalidos(self, atraso, tamanho):
+        """Teste atraso negativo e tamanho não positivo"""
+        with pytest.raises(ValueError):
+            GravadorEmGrupo(lambda registros: None, atraso, tamanho)
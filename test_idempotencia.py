@@ -0,0 +1,171 @@
+"""
+Testes do cache de respostas por chave de idempotência
+"""
+import pytest
+
+from idempotencia import CacheIdempotencia, ConflitoIdempotencia
+
+
+class Relogio:
+    """Relógio controlado pelo teste"""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+def _executar(cache, chave, impressao="a", corpo=b"{}"):
+    """Inicia e conclui uma requisição com a chave"""
+    assert cache.iniciar(chave, impressao) is None
+    cache.concluir(chave, impressao, 201, corpo, "application/json")
+
+
+class TestCacheIdempotencia:
+    """Testes de guarda, repetição, conflito e validade"""
+
+    def test_repeticao_retorna_resposta_guardada(self):
+        """Teste segunda requisição recebe a resposta da primeira"""
+        cache = CacheIdempotencia()
+        _executar(cache, "k1", corpo=b'{"id": 1}')
+
+        resposta = cache.iniciar("k1", "a")
+        assert resposta.status == 201
+        assert resposta.corpo == b'{"id": 1}'
+        assert resposta.tipo == "application/json"
+
+    def test_conflitos(self):
+        """Teste chave em andamento (409) e reutilizada com outro conteúdo (422)"""
+        cache = CacheIdempotencia()
+        assert cache.iniciar("k1", "a") is None
+        with pytest.raises(ConflitoIdempotencia) as erro:
+            cache.iniciar("k1", "a")
+        assert erro.value.status == 409
+
+        cache.concluir("k1", "a", 200, b"", "text/plain")
+        with pytest.raises(ConflitoIdempotencia) as erro:
+            cache.iniciar("k1", "b")
+        assert erro.value.status == 422
+
+    def test_cancelar_permite_nova_tentativa(self):
+        """Teste chave cancelada pode ser executada de novo"""
+        cache = CacheIdempotencia()
+        assert cache.iniciar("k1", "a") is None
+        cache.cancelar("k1")
+        assert cache.iniciar("k1", "a") is None
+
+    def test_lru_e_validade(self):
+        """Teste descarte das menos usadas e das vencidas"""
+        relogio = Relogio()
+        cache = CacheIdempotencia(capacidade=2, ttl=60, relogio=relogio)
+        _executar(cache, "k1")
+        _executar(cache, "k2")
+        assert cache.iniciar("k1", "a") is not None
+        _executar(cache, "k3")
+
+        assert len(cache) == 2
+        assert cache.iniciar("k2", "a") is None
+        cache.cancelar("k2")
+
+        relogio.agora += 60
+        assert cache.iniciar("k1", "a") is None
+
+    def test_parametros_invalidos(self):
+        """Teste capacidade e validade devem ser positivas"""
+        with pytest.raises(ValueError):
+            CacheIdempotencia(capacidade=0)
+        with pytest.raises(ValueError):
+            CacheIdempotencia(ttl=0)
+
+
+class TestPersistencia:
+    """Testes do log ao lado do arquivo de dados"""
+
+    def test_sobrevive_a_reinicio(self, tmp_path):
+        """Teste nova instância carrega as respostas do log"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        cache = CacheIdempotencia(arquivo)
+        _executar(cache, "k1", corpo=b"\x00binario")
+        cache.fechar()
+
+        resposta = CacheIdempotencia(arquivo).iniciar("k1", "a")
+        assert resposta.corpo == b"\x00binario"
+
+    def test_respostas_de_outro_worker(self, tmp_path):
+        """Teste chave concluída em outra instância é vista sem reinício"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        worker_a = CacheIdempotencia(arquivo)
+        worker_b = CacheIdempotencia(arquivo)
+
+        _executar(worker_a, "k1")
+        _executar(worker_b, "k2")
+
+        assert worker_b.iniciar("k1", "a") is not None
+        assert worker_a.iniciar("k2", "a") is not None
+
+    def test_vencidas_nao_sao_carregadas(self, tmp_path):
+        """Teste respostas vencidas no log são ignoradas"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        relogio = Relogio()
+        _executar(CacheIdempotencia(arquivo, ttl=60, relogio=relogio), "k1")
+
+        relogio.agora += 60
+        assert CacheIdempotencia(arquivo, ttl=60, relogio=relogio).iniciar("k1", "a") is None
+
+    def test_compactacao(self, tmp_path):
+        """Teste log reescrito só com as respostas mantidas"""
+        arquivo = tmp_path / "produtos.json.idempotencia"
+        cache = CacheIdempotencia(str(arquivo), capacidade=3)
+        outro = CacheIdempotencia(str(arquivo), capacidade=3)
+        for i in range(7):
+            _executar(cache, f"k{i}")
+
+        assert len(arquivo.read_bytes().splitlines()) == 3
+        assert outro.iniciar("k6", "a") is not None
+        assert outro.iniciar("k0", "a") is None
+
+        _executar(outro, "k7")
+        assert cache.iniciar("k7", "a") is not None
+
+    def test_em_andamento_em_outro_worker(self, tmp_path):
+        """Teste repetição em outro worker durante a primeira execução recebe 409"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        worker_a = CacheIdempotencia(arquivo)
+        worker_b = CacheIdempotencia(arquivo)
+
+        assert worker_a.iniciar("k1", "a") is None
+        with pytest.raises(ConflitoIdempotencia) as erro:
+            worker_b.iniciar("k1", "a")
+        assert erro.value.status == 409
+
+        worker_a.concluir("k1", "a", 201, b"{}", "application/json")
+        assert worker_b.iniciar("k1", "a").status == 201
+
+        assert worker_a.iniciar("k2", "a") is None
+        worker_a.cancelar("k2")
+        assert worker_b.iniciar("k2", "a") is None
+
+    def test_andamento_abandonado_vence(self, tmp_path):
+        """Teste marca de um worker encerrado deixa de bloquear após o prazo"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        relogio = Relogio()
+        CacheIdempotencia(arquivo, relogio=relogio, prazo_andamento=30).iniciar("k1", "a")
+        worker_b = CacheIdempotencia(arquivo, relogio=relogio, prazo_andamento=30)
+        with pytest.raises(ConflitoIdempotencia):
+            worker_b.iniciar("k1", "a")
+
+        relogio.agora += 30
+        assert worker_b.iniciar("k1", "a") is None
+
+    def test_compactacao_mantem_andamento(self, tmp_path):
+        """Teste marca de andamento sobrevive à reescrita do log"""
+        arquivo = str(tmp_path / "produtos.json.idempotencia")
+        worker_a = CacheIdempotencia(arquivo, capacidade=2)
+        worker_b = CacheIdempotencia(arquivo, capacidade=2)
+        assert worker_a.iniciar("lento", "a") is None
+        for i in range(4):
+            _executar(worker_b, f"k{i}")
+
+        with pytest.raises(ConflitoIdempotencia):
+            worker_b.iniciar("lento", "a")
@@ -0,0 +1,135 @@
+"""
+Testes unitários para o módulo indices
+"""
+import pytest
+from indices import IndiceNome, IndiceOrdenado, normalizar
+
+
+@pytest.fixture
+def indice():
+    """Fixture com um índice de nomes preenchido"""
+    indice = IndiceNome()
+    indice.adicionar(1, "Café Torrado")
+    indice.adicionar(2, "Cafeteira Elétrica")
+    indice.adicionar(3, "Açúcar Refinado")
+    indice.adicionar(4, "café  torrado")
+    return indice
+
+
+class TestNormalizar:
+    """Testes para a normalização de nomes"""
+
+    def test_remove_acentos_e_maiusculas(self):
+        """Teste se acentos e maiúsculas são removidos"""
+        assert normalizar("Açúcar ÉLÉTRICO") == "acucar eletrico"
+
+    def test_espacos_colapsados(self):
+        """Teste se espaços repetidos são colapsados"""
+        assert normalizar("  Café   Torrado ") == "cafe torrado"
+
+    def test_casefold(self):
+        """Teste se o casefold trata caracteres especiais"""
+        assert normalizar("Straße") == "strasse"
+
+
+class TestIndiceNome:
+    """Testes para o índice de nomes"""
+
+    def test_exato(self, indice):
+        """Teste busca exata ignora acentos, maiúsculas e espaços"""
+        assert indice.exato("CAFE TORRADO") == {1, 4}
+
+    def test_prefixo(self, indice):
+        """Teste busca por prefixo"""
+        assert indice.prefixo("caf") == {1, 2, 4}
+        assert indice.prefixo("cafe t") == {1, 4}
+
+    def test_tokens(self, indice):
+        """Teste busca por prefixos de palavras"""
+        assert indice.tokens("eletr caf") == {2}
+        assert indice.tokens("refin") == {3}
+        assert indice.tokens("xyz") == set()
+
+    def test_contem(self, indice):
+        """Teste busca por substring"""
+        assert indice.contem("teira") == {2}
+        assert indice.contem("orrad") == {1, 4}
+        assert indice.contem("zzz") == set()
+
+    def test_contem_termo_curto(self, indice):
+        """Teste se termos de um ou dois caracteres casam no meio das palavras"""
+        assert indice.contem("ac") == {3}
+        assert indice.contem("fe") == {1, 2, 4}
+        assert indice.contem("") == set()
+
+    def test_remover(self, indice):
+        """Teste se remover tira o produto de todas as buscas"""
+        indice.remover(2)
+
+        assert indice.prefixo("cafet") == set()
+        assert indice.tokens("eletrica") == set()
+        assert indice.contem("teira") == set()
+        assert indice.contem("te") == set()
+        assert indice.contem("t") == {1, 4}
+        assert len(indice) == 3
+
+    def test_adicionar_atualiza_nome(self, indice):
+        """Teste se adicionar um ID existente substitui o nome anterior"""
+        indice.adicionar(3, "Sal Grosso")
+
+        assert indice.exato("açúcar refinado") == set()
+        assert indice.exato("sal grosso") == {3}
+        assert indice.chave(3) == "sal grosso"
+
+
+class TestIndiceOrdenado:
+    """Testes para o índice ordenado"""
+
+    def test_adicionar_mantem_ordem(self):
+        """Teste se inserções mantêm a ordem pela chave"""
+        indice = IndiceOrdenado()
+        indice.adicionar(1, "teclado")
+        indice.adicionar(2, "mouse")
+        indice.adicionar(3, "notebook")
+
+        assert indice.ids() == [2, 3, 1]
+
+    def test_empate_desfeito_pelo_id(self):
+        """Teste se chaves iguais ficam na ordem de ID"""
+        indice = IndiceOrdenado()
+        indice.adicionar(5, "cabo")
+        indice.adicionar(2, "cabo")
+
+        assert indice.ids() == [2, 5]
+
+    def test_construir_e_remover(self):
+        """Teste construir o índice de uma vez e remover entradas"""
+        indice = IndiceOrdenado()
+        indice.construir([(1, 30, "a"), (2, 10, "b"), (3, 20, "c")])
+        indice.remover(3)
+        indice.remover(99)
+
+        assert indice.ids() == [2, 1]
+        assert indice.valores() == ["b", "a"]
+        assert len(indice) == 2
+
+    def test_adicionar_reposiciona(self):
+        """Teste se adicionar um ID existente atualiza a posição"""
+        indice = IndiceOrdenado()
+        indice.construir([(1, 30, "a"), (2, 10, "b")])
+        indice.adicionar(2, 50, "b")
+
+        assert indice.ids() == [1, 2]
+        assert indice.valores() == ["a", "b"]
+
+    def test_faixa(self):
+        """Teste valores com chave entre os limites, inclusive"""
+        indice = IndiceOrdenado()
+        indice.construir([(1, 50.0, "a"), (2, 100.0, "b"), (3, 100.0, "c"), (4, 500.0, "d")])
+
+        assert list(indice.faixa(100.0, 500.0)) == ["b", "c", "d"]
+        assert list(indice.faixa(maximo=100.0)) == ["a", "b", "c"]
+        assert list(indice.faixa(60.0, 90.0)) == []
+        assert list(indice.faixa(100.0, apos=2)) == ["c", "d"]
+        assert indice.contar_faixa(100.0, 100.0) == 2
+        assert indice.contar_faixa(600.0, 10.0) == 0
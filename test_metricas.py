@@ -0,0 +1,114 @@
+"""
+Testes unitários para o módulo metricas
+"""
+import threading
+
+import pytest
+
+import metricas
+from metricas import RegistroMetricas
+
+
+class TestRegistroMetricas:
+    """Testes dos tipos de métrica e da exportação"""
+
+    def test_contador(self):
+        """Teste contador com e sem rótulos"""
+        registro = RegistroMetricas()
+        simples = registro.contador("eventos_total", "Eventos")
+        rotulado = registro.contador("erros_total", "Erros", ("tipo",))
+        simples.incrementar()
+        simples.incrementar(2)
+        rotulado.incrementar(1, 'disco "cheio"')
+
+        texto = registro.exportar()
+        assert "# TYPE eventos_total counter" in texto
+        assert "eventos_total 3" in texto
+        assert 'erros_total{tipo="disco \\"cheio\\""} 1' in texto
+
+    def test_histograma(self):
+        """Teste faixas acumuladas, soma e contagem"""
+        registro = RegistroMetricas()
+        histograma = registro.histograma("duracao_segundos", "Duração", ("rota",), (0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            histograma.observar(valor, "/")
+
+        linhas = registro.exportar().splitlines()
+        assert 'duracao_segundos_bucket{rota="/",le="0.1"} 2' in linhas
+        assert 'duracao_segundos_bucket{rota="/",le="1.0"} 3' in linhas
+        assert 'duracao_segundos_bucket{rota="/",le="+Inf"} 4' in linhas
+        assert 'duracao_segundos_sum{rota="/"} 3.65' in linhas
+        assert 'duracao_segundos_count{rota="/"} 4' in linhas
+        assert histograma.contagem("/") == 4
+
+    def test_medidor(self):
+        """Teste medidor lido na exportação e substituído pelo nome"""
+        registro = RegistroMetricas()
+        registro.medidor("itens", "Itens", lambda: 1)
+        registro.medidor("itens", "Itens", lambda: 7)
+
+        assert "itens 7" in registro.exportar().splitlines()
+
+    def test_nome_repetido(self):
+        """Teste contador e histograma com o mesmo nome"""
+        registro = RegistroMetricas()
+        registro.contador("eventos_total", "Eventos")
+
+        with pytest.raises(ValueError):
+            registro.histograma("eventos_total", "Eventos")
+
+    def test_contador_concorrente(self):
+        """Teste incrementos simultâneos não se perdem"""
+        contador = RegistroMetricas().contador("eventos_total", "Eventos")
+
+        def incrementar():
+            for _ in range(1000):
+                contador.incrementar()
+
+        threads = [threading.Thread(target=incrementar) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert contador.valor() == 8000
+
+
+class TestFases:
+    """Testes do acúmulo de fases por requisição"""
+
+    def test_fases_da_requisicao(self):
+        """Teste fases acumuladas entre iniciar e encerrar"""
+        antes = metricas.DURACAO_FASES.contagem("teste")
+        metricas.iniciar_requisicao()
+        with metricas.fase("teste"):
+            pass
+        metricas.registrar_fase("teste", 0.5)
+        fases = metricas.encerrar_requisicao()
+
+        assert set(fases) == {"teste"}
+        assert fases["teste"] >= 0.5
+        assert metricas.DURACAO_FASES.contagem("teste") == antes + 2
+
+    def test_fase_fora_de_requisicao(self):
+        """Teste fase sem requisição vai só para o histograma"""
+        metricas.encerrar_requisicao()
+        with metricas.fase("teste"):
+            pass
+
+        assert metricas.encerrar_requisicao() == {}
+
+    def test_fase_em_outra_thread(self):
+        """Teste fases de outra thread não entram na requisição atual"""
+        metricas.iniciar_requisicao()
+        thread = threading.Thread(target=metricas.registrar_fase, args=("teste", 1.0))
+        thread.start()
+        thread.join()
+
+        assert metricas.encerrar_requisicao() == {}
+
+    def test_server_timing(self):
+        """Teste formato do cabeçalho Server-Timing"""
+        texto = metricas.server_timing({"sincronizar": 0.0001, "render": 0.0125}, 0.02)
+
+        assert texto == "sincronizar;dur=0.10, render;dur=12.50, total;dur=20.00"
@@ -0,0 +1,53 @@
+"""
+Testes da linha de comando de migração entre formatos (migrar.py)
+"""
+import sys
+
+import pytest
+
+import migrar
+from produto_manager import ProdutoManager
+
+
+def _executar(monkeypatch, *argumentos):
+    """Executa migrar.main() com os argumentos informados"""
+    monkeypatch.setattr(sys, "argv", ["migrar.py", *argumentos])
+    migrar.main()
+
+
+class TestMigrar:
+    """Testes do comando de migração"""
+
+    def test_ida_e_volta_entre_formatos(self, tmp_path, monkeypatch, capsys):
+        """Teste json -> bin -> sqlite preserva o catálogo e o journal"""
+        origem = str(tmp_path / "produtos.json")
+        manager = ProdutoManager(origem, journal=True)
+        manager.adicionar_produto("Mouse", 10, 45.9)
+        manager.adicionar_produto("Café", 5, 20.0)
+        manager.comprar_produto(1, 3, confirmar=True)
+        manager.fechar()
+        binario = str(tmp_path / "produtos.bin")
+        sqlite = str(tmp_path / "produtos.db")
+
+        _executar(monkeypatch, origem, binario)
+        assert capsys.readouterr().out == f"2 produtos copiados de {origem} para {binario}\n"
+        _executar(monkeypatch, binario, sqlite)
+
+        manager = ProdutoManager(sqlite)
+        assert [(p["id"], p["produto"], p["quantidade"], p["valor"]) for p in manager.produtos] == [
+            (1, "Mouse", 7, 45.9),
+            (2, "Café", 5, 20.0),
+        ]
+        manager.fechar()
+
+    def test_destino_com_produtos(self, tmp_path, monkeypatch):
+        """Teste destino preenchido encerra com erro sem sobrescrever"""
+        origem = str(tmp_path / "produtos.json")
+        destino = str(tmp_path / "produtos.bin")
+        manager = ProdutoManager(origem)
+        manager.adicionar_produto("Mouse", 10, 45.9)
+        manager.fechar()
+        _executar(monkeypatch, origem, destino)
+
+        with pytest.raises(SystemExit, match="Erro: O destino já contém produtos"):
+            _executar(monkeypatch, origem, destino)
@@ -0,0 +1,82 @@
+"""
+Testes do perfilador de requisições
+"""
+import time
+
+import pytest
+
+from perfilador import PerfiladorRequisicoes
+
+
+def operacao_lenta():
+    """Função que aparece nas pilhas amostradas"""
+    time.sleep(0.05)
+
+
+def operacao_rapida():
+    """Função que aparece no relatório do cProfile"""
+    return sum(range(100))
+
+
+class TestPerfiladorRequisicoes:
+    """Testes de sorteio, limite de latência e buffer circular"""
+
+    def test_parametros_invalidos(self):
+        """Teste validação de fração, limite e capacidade"""
+        with pytest.raises(ValueError):
+            PerfiladorRequisicoes(fracao=1.5)
+        with pytest.raises(ValueError):
+            PerfiladorRequisicoes(limite_lento=-1)
+        with pytest.raises(ValueError):
+            PerfiladorRequisicoes(capacidade=0)
+
+    def test_cprofile_sorteado(self):
+        """Teste requisição sorteada é perfilada com cProfile"""
+        perfilador = PerfiladorRequisicoes(fracao=0.5, sortear=lambda: 0.1)
+
+        coleta = perfilador.iniciar()
+        operacao_rapida()
+        perfil = perfilador.concluir(coleta, "GET", "/", "/", 200)
+
+        assert perfil.tipo == "cprofile"
+        assert "operacao_rapida" in perfil.relatorio
+        assert perfilador.perfis() == [perfil]
+        assert perfilador.obter(perfil.id) == perfil
+
+    def test_nao_sorteado(self):
+        """Teste requisição fora da fração e sem limite não é perfilada"""
+        perfilador = PerfiladorRequisicoes(fracao=0.5, sortear=lambda: 0.9)
+
+        coleta = perfilador.iniciar()
+        assert coleta is None
+        assert perfilador.concluir(coleta, "GET", "/", "/", 200) is None
+        assert perfilador.perfis() == []
+
+    def test_amostragem_de_requisicao_lenta(self):
+        """Teste pilhas amostradas são guardadas quando a requisição passa do limite"""
+        perfilador = PerfiladorRequisicoes(limite_lento=0.02, intervalo_amostragem=0.001)
+        try:
+            coleta = perfilador.iniciar()
+            operacao_lenta()
+            perfil = perfilador.concluir(coleta, "POST", "/comprar/1", "/comprar/<int:id>", 302)
+
+            coleta = perfilador.iniciar()
+            rapido = perfilador.concluir(coleta, "GET", "/", "/", 200)
+        finally:
+            perfilador.fechar()
+
+        assert perfil.tipo == "amostragem"
+        assert perfil.duracao >= 0.05
+        assert "test_perfilador.py:operacao_lenta" in perfil.relatorio
+        assert rapido is None
+        assert perfilador.perfis() == [perfil]
+
+    def test_buffer_circular(self):
+        """Teste só os perfis mais recentes são mantidos"""
+        perfilador = PerfiladorRequisicoes(fracao=1.0, capacidade=2)
+
+        for caminho in ("/a", "/b", "/c"):
+            perfilador.concluir(perfilador.iniciar(), "GET", caminho, caminho, 200)
+
+        assert [p.caminho for p in perfilador.perfis()] == ["/c", "/b"]
+        assert perfilador.obter(1) is None
@@ -0,0 +1,61 @@
+"""
+Testes unitários para o módulo produto
+"""
+import json
+
+import pytest
+from produto import Produto
+
+DADOS = {"id": 1, "produto": "Mouse", "quantidade": 10, "valor": 50.0}
+
+
+class TestProduto:
+    """Testes da representação compacta de produtos"""
+
+    def test_leitura_como_dict(self):
+        """Teste acesso por chave, conversão e comparação com dicts"""
+        produto = Produto.de_dict(DADOS)
+
+        assert produto["produto"] == "Mouse"
+        assert produto.quantidade == 10
+        assert dict(produto) == DADOS
+        assert produto == DADOS
+        assert list(produto) == ["id", "produto", "quantidade", "valor"]
+
+    def test_chave_inexistente(self):
+        """Teste campo desconhecido levanta KeyError"""
+        produto = Produto.de_dict(DADOS)
+
+        with pytest.raises(KeyError):
+            produto["preco"]
+        assert produto.get("preco") is None
+
+    def test_sem_dict_de_instancia(self):
+        """Teste atributos ficam apenas em __slots__"""
+        produto = Produto.de_dict(DADOS)
+
+        assert not hasattr(produto, "__dict__")
+        with pytest.raises(AttributeError):
+            produto.preco = 1
+
+    def test_copia_independente(self):
+        """Teste cópia não compartilha o estoque"""
+        produto = Produto.de_dict(DADOS)
+        copia = produto.copy()
+        produto.quantidade = 3
+
+        assert copia.quantidade == 10
+
+    def test_nomes_internados(self):
+        """Teste produtos de mesmo nome compartilham a string"""
+        a = Produto(1, "".join(["Mou", "se"]), 1, 1.0)
+        b = Produto(2, "".join(["Mo", "use"]), 1, 1.0)
+
+        assert a.produto is b.produto
+
+    def test_serializa_no_mesmo_formato(self):
+        """Teste serialização JSON igual à de um dict"""
+        produto = Produto.de_dict(DADOS)
+
+        assert json.dumps(produto, default=dict) == json.dumps(DADOS)
+        assert produto.para_dict() == DADOS
@@ -4,6 +4,9 @@ Testes unitários para o módulo produto_manager
 import pytest
 import os
 import json
+import threading
+import time
+from produto import Produto
 from produto_manager import ProdutoManager
 
 
@@ -12,15 +15,17 @@ def manager():
     """Fixture que cria um gerenciador de produtos para testes"""
     test_file = "test_produtos.json"
     # Remove arquivo de teste se existir
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for arquivo in [test_file, test_file + ".reservas"]:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
 
     manager = ProdutoManager(test_file)
     yield manager
 
     # Limpeza após os testes
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for arquivo in [test_file, test_file + ".lock", test_file + ".bak", test_file + ".reservas"]:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
 
 
 class TestAdicionar:
@@ -121,6 +126,33 @@ class TestListar:
         assert produtos[1]["produto"] == "BANANA"
         assert produtos[2]["produto"] == "zebra"
 
+    def test_listar_produtos_alfabetica_ignora_acentos(self, manager):
+        """Teste ordenação alfabética ignorando acentos"""
+        manager.adicionar_produto("Uva", 1, 10)
+        manager.adicionar_produto("Água", 1, 10)
+        manager.adicionar_produto("Banana", 1, 10)
+
+        produtos = manager.listar_produtos_alfabetica()
+        assert [p["produto"] for p in produtos] == ["Água", "Banana", "Uva"]
+
+    def test_listar_produtos_alfabetica_apos_recarregar(self, manager):
+        """Teste se a ordem alfabética é reconstruída ao recarregar"""
+        manager.adicionar_produto("Teclado", 25, 350.00)
+        manager.adicionar_produto("Mouse", 50, 45.90)
+
+        recarregado = ProdutoManager(manager.data_file)
+        recarregado.adicionar_produto("Notebook", 10, 2500.00)
+
+        produtos = recarregado.listar_produtos_alfabetica()
+        assert [p["produto"] for p in produtos] == ["Mouse", "Notebook", "Teclado"]
+
+    def test_listar_produtos_alfabetica_reflete_compra(self, manager):
+        """Teste se a lista ordenada mostra o estoque atualizado"""
+        manager.adicionar_produto("Mouse", 50, 45.90)
+        manager.comprar_produto(1, 5, confirmar=True)
+
+        assert manager.listar_produtos_alfabetica()[0]["quantidade"] == 45
+
 
 class TestBuscar:
     """Testes para buscar produtos"""
@@ -278,6 +310,7 @@ class TestPersistencia:
 
         # Limpeza
         os.remove(test_file)
+        os.remove(test_file + ".lock")
 
     def test_arquivo_json_invalido(self):
         """Teste se lida com arquivo JSON inválido"""
@@ -292,9 +325,13 @@ class TestPersistencia:
 
         assert manager.produtos == []
         assert manager.proximo_id == 1
+        # O arquivo inválido é preservado para análise
+        with open(test_file + ".corrompido", encoding="utf-8") as f:
+            assert f.read() == "{ invalid json }"
 
         # Limpeza
-        os.remove(test_file)
+        os.remove(test_file + ".corrompido")
+        os.remove(test_file + ".lock")
 
 
 class TestIntegracao:
@@ -344,3 +381,899 @@ class TestIntegracao:
 
         assert p1["quantidade"] == 50
         assert p2["quantidade"] == 60
+
+
+@pytest.fixture
+def manager_journal():
+    """Fixture que cria um gerenciador em modo journal"""
+    test_file = "test_journal.json"
+    arquivos = [test_file, test_file + ".log", test_file + ".lock", test_file + ".bak"]
+    for arquivo in arquivos:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+    manager = ProdutoManager(test_file, journal=True)
+    yield manager
+
+    for arquivo in arquivos:
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+
+class TestJournal:
+    """Testes para o modo journal (log de alterações)"""
+
+    def test_alteracoes_anexadas_ao_log(self, manager_journal):
+        """Teste se cada alteração gera uma linha no journal"""
+        manager_journal.adicionar_produto("Mouse", 50, 45.90)
+        manager_journal.comprar_produto(1, 5, confirmar=True)
+
+        assert not os.path.exists(manager_journal.data_file)
+        with open(manager_journal.armazenamento.journal_file, "r", encoding="utf-8") as f:
+            registros = [json.loads(linha) for linha in f]
+
+        assert registros[0]["op"] == "adicionar"
+        assert registros[1] == {"op": "estoque", "id": 1, "quantidade": 45}
+
+    def test_reaplicar_journal(self, manager_journal):
+        """Teste se o journal é reaplicado ao carregar"""
+        manager_journal.adicionar_produto("Mouse", 50, 45.90)
+        manager_journal.adicionar_produto("Teclado", 25, 350.00)
+        manager_journal.comprar_produto(2, 5, confirmar=True)
+
+        recarregado = ProdutoManager(manager_journal.data_file, journal=True)
+
+        assert len(recarregado.produtos) == 2
+        assert recarregado.buscar_produto_por_id(2)["quantidade"] == 20
+        assert recarregado.proximo_id == 3
+
+    def test_linha_incompleta_ignorada(self, manager_journal):
+        """Teste se uma linha truncada no fim do journal é ignorada"""
+        manager_journal.adicionar_produto("Mouse", 50, 45.90)
+        with open(manager_journal.armazenamento.journal_file, "ab") as f:
+            f.write(b'{"op":"estoque","id":1,"quan')
+
+        recarregado = ProdutoManager(manager_journal.data_file, journal=True)
+
+        assert recarregado.buscar_produto_por_id(1)["quantidade"] == 50
+
+    def test_compactar(self, manager_journal):
+        """Teste se a compactação gera snapshot e esvazia o journal"""
+        manager_journal.adicionar_produto("Mouse", 50, 45.90)
+        manager_journal.comprar_produto(1, 10, confirmar=True)
+
+        manager_journal.compactar()
+
+        with open(manager_journal.data_file, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        assert dados[0]["quantidade"] == 40
+        assert os.path.getsize(manager_journal.armazenamento.journal_file) == 0
+
+        manager_journal.comprar_produto(1, 10, confirmar=True)
+        recarregado = ProdutoManager(manager_journal.data_file, journal=True)
+        assert recarregado.buscar_produto_por_id(1)["quantidade"] == 30
+
+    def test_compactacao_automatica(self, manager_journal):
+        """Teste se a compactação roda em segundo plano ao passar do limite"""
+        manager_journal.armazenamento.limite_journal = 200
+        for i in range(10):
+            manager_journal.adicionar_produto(f"Produto {i}", 10, 10.0)
+
+        manager_journal._compactacao.join()
+
+        recarregado = ProdutoManager(manager_journal.data_file, journal=True)
+        assert len(recarregado.produtos) == 10
+        assert os.path.exists(manager_journal.data_file)
+
+    def test_journal_incorporado_fora_do_modo_journal(self, manager_journal):
+        """Teste se o journal é incorporado ao snapshot no modo padrão"""
+        manager_journal.adicionar_produto("Mouse", 50, 45.90)
+
+        manager = ProdutoManager(manager_journal.data_file)
+
+        assert len(manager.produtos) == 1
+        assert not os.path.exists(manager_journal.armazenamento.journal_file)
+        with open(manager_journal.data_file, "r", encoding="utf-8") as f:
+            assert json.load(f)[0]["produto"] == "Mouse"
+
+
+class TestIndiceId:
+    """Testes para o índice de produtos por ID"""
+
+    def test_indice_atualizado_ao_adicionar(self, manager):
+        """Teste se produtos novos são encontrados pelo índice"""
+        for i in range(5):
+            manager.adicionar_produto(f"P{i}", 1, 10)
+
+        assert manager.buscar_produto_por_id(5)["produto"] == "P4"
+
+    def test_indice_reflete_compra(self, manager):
+        """Teste se o produto do índice é o mesmo alterado pela compra"""
+        manager.adicionar_produto("Mouse", 50, 45.90)
+        manager.comprar_produto(1, 5, confirmar=True)
+
+        assert manager.buscar_produto_por_id(1) is manager.produtos[0]
+        assert manager.buscar_produto_por_id(1)["quantidade"] == 45
+
+    def test_indice_reconstruido_ao_substituir_produtos(self, manager):
+        """Teste se atribuir a lista de produtos reconstrói o índice"""
+        manager.adicionar_produto("Mouse", 50, 45.90)
+
+        manager.produtos = [{"id": 7, "produto": "Cabo", "quantidade": 3, "valor": 9.9}]
+
+        assert manager.buscar_produto_por_id(1) is None
+        assert manager.buscar_produto_por_id(7)["produto"] == "Cabo"
+
+    def test_indice_apos_recarregar(self, manager):
+        """Teste se o índice é reconstruído ao recarregar o arquivo"""
+        manager.adicionar_produto("Mouse", 50, 45.90)
+        manager.adicionar_produto("Teclado", 25, 350.00)
+
+        manager._carregar_dados()
+
+        assert manager.buscar_produto_por_id(2) is manager.produtos[1]
+
+
+class TestPesquisar:
+    """Testes para a pesquisa por nome"""
+
+    def test_pesquisar_modos(self, manager):
+        """Teste os modos de pesquisa"""
+        manager.adicionar_produto("Café Torrado", 10, 20.0)
+        manager.adicionar_produto("Cafeteira", 5, 150.0)
+        manager.adicionar_produto("Pão de Queijo", 30, 2.5)
+
+        assert [p["id"] for p in manager.pesquisar("cafe torrado", "exato")] == [1]
+        assert [p["id"] for p in manager.pesquisar("CAF", "prefixo")] == [1, 2]
+        assert [p["id"] for p in manager.pesquisar("queijo pao")] == [3]
+        assert [p["id"] for p in manager.pesquisar("eteir", "contem")] == [2]
+        assert [p["id"] for p in manager.pesquisar("fe", "contem")] == [1, 2]
+
+    def test_pesquisar_limite(self, manager):
+        """Teste se o limite retorna os primeiros IDs"""
+        for i in range(5):
+            manager.adicionar_produto(f"Cabo {i}", 1, 10)
+
+        assert [p["id"] for p in manager.pesquisar("cabo", limite=2)] == [1, 2]
+
+    def test_pesquisar_termo_vazio(self, manager):
+        """Teste se termo vazio não retorna produtos"""
+        manager.adicionar_produto("Mouse", 50, 45.90)
+        assert manager.pesquisar("   ") == []
+
+    def test_pesquisar_modo_invalido(self, manager):
+        """Teste se modo inválido gera erro"""
+        with pytest.raises(ValueError, match="Modo de busca inválido"):
+            manager.pesquisar("mouse", "regex")
+
+    def test_pesquisar_apos_recarregar(self, manager):
+        """Teste se o índice de nomes é reconstruído ao recarregar"""
+        manager.adicionar_produto("Monitor", 5, 1200.00)
+
+        recarregado = ProdutoManager(manager.data_file)
+
+        assert recarregado.pesquisar("moni")[0]["produto"] == "Monitor"
+
+
+class TestPaginacao:
+    """Testes para paginação e projeção de campos"""
+
+    @pytest.fixture
+    def manager_cheio(self, manager):
+        """Gerenciador com cinco produtos cadastrados fora de ordem alfabética"""
+        for nome in ["Teclado", "Mouse", "Notebook", "Cabo", "Monitor"]:
+            manager.adicionar_produto(nome, 10, 100.0)
+        return manager
+
+    def test_listar_com_limite_e_cursor(self, manager_cheio):
+        """Teste paginação por cursor em ordem de ID"""
+        primeira = manager_cheio.listar_produtos(limite=2)
+        segunda = manager_cheio.listar_produtos(limite=2, cursor=primeira[-1]["id"])
+
+        assert [p["id"] for p in primeira] == [1, 2]
+        assert [p["id"] for p in segunda] == [3, 4]
+
+    def test_listar_alfabetica_com_cursor(self, manager_cheio):
+        """Teste paginação por cursor em ordem alfabética"""
+        primeira = manager_cheio.listar_produtos_alfabetica(limite=2)
+        segunda = manager_cheio.listar_produtos_alfabetica(cursor=primeira[-1]["id"])
+
+        assert [p["produto"] for p in primeira] == ["Cabo", "Monitor"]
+        assert [p["produto"] for p in segunda] == ["Mouse", "Notebook", "Teclado"]
+
+    def test_projecao_de_campos(self, manager_cheio):
+        """Teste se apenas os campos pedidos são retornados"""
+        produtos = manager_cheio.listar_produtos(limite=1, campos=["id", "produto"])
+
+        assert produtos == [{"id": 1, "produto": "Teclado"}]
+
+    def test_campo_invalido(self, manager_cheio):
+        """Teste se campos desconhecidos geram erro"""
+        with pytest.raises(ValueError, match="Campos inválidos: preco"):
+            manager_cheio.listar_produtos(campos=["id", "preco"])
+
+    def test_cursor_invalido(self, manager_cheio):
+        """Teste se cursor inexistente gera erro"""
+        with pytest.raises(ValueError, match="Cursor inválido"):
+            manager_cheio.listar_produtos(cursor=999)
+
+    def test_paginar_produtos_percorre_catalogo(self, manager_cheio):
+        """Teste se os cursores percorrem todo o catálogo sem repetições"""
+        vistos = []
+        cursor = None
+        while True:
+            pagina = manager_cheio.paginar_produtos("alfabetica", limite=2, cursor=cursor)
+            vistos.extend(p["produto"] for p in pagina["produtos"])
+            cursor = pagina["proximo_cursor"]
+            if cursor is None:
+                break
+
+        assert vistos == ["Cabo", "Monitor", "Mouse", "Notebook", "Teclado"]
+
+    def test_paginar_limite_invalido(self, manager_cheio):
+        """Teste se limite menor que um gera erro"""
+        with pytest.raises(ValueError, match="Limite deve ser maior que zero"):
+            manager_cheio.paginar_produtos(limite=0)
+
+    def test_produtos_fora_de_ordem_sao_ordenados_por_id(self, manager):
+        """Teste se uma lista carregada fora de ordem é ordenada por ID"""
+        manager.produtos = [
+            {"id": 2, "produto": "B", "quantidade": 1, "valor": 1.0},
+            {"id": 1, "produto": "A", "quantidade": 1, "valor": 1.0},
+        ]
+
+        assert [p["id"] for p in manager.listar_produtos(cursor=1)] == [2]
+
+
+class TestAdicionarEmLote:
+    """Testes para inclusão de produtos em lote"""
+
+    def test_adicionar_lote(self, manager):
+        """Teste se o lote recebe IDs sequenciais"""
+        resultado = manager.adicionar_produtos_em_lote(
+            [
+                {"produto": "Mouse", "quantidade": 50, "valor": 45.90},
+                {"produto": "Teclado", "quantidade": "25", "valor": "350.00"},
+            ]
+        )
+
+        assert [p["id"] for p in resultado["adicionados"]] == [1, 2]
+        assert resultado["adicionados"][1]["quantidade"] == 25
+        assert resultado["erros"] == []
+        assert manager.proximo_id == 3
+
+    def test_erros_por_registro(self, manager):
+        """Teste se registros inválidos são relatados sem barrar os válidos"""
+        resultado = manager.adicionar_produtos_em_lote(
+            [
+                {"produto": "", "quantidade": 1, "valor": 10},
+                {"produto": "Cabo", "quantidade": 1, "valor": 10},
+                {"produto": "Fonte", "quantidade": "dez", "valor": 10},
+                {"produto": "Hub"},
+                "texto",
+            ]
+        )
+
+        assert [p["produto"] for p in resultado["adicionados"]] == ["Cabo"]
+        assert resultado["erros"] == [
+            {"registro": 1, "erro": "Nome do produto é obrigatório"},
+            {"registro": 3, "erro": "Quantidade deve ser um número inteiro"},
+            {"registro": 4, "erro": "Campos obrigatórios ausentes: quantidade, valor"},
+            {
+                "registro": 5,
+                "erro": "Registro deve ser um objeto com produto, quantidade e valor",
+            },
+        ]
+
+    def test_lote_grava_uma_vez(self, manager, monkeypatch):
+        """Teste se o lote é persistido com uma única gravação"""
+        gravacoes = []
+        original = manager.armazenamento.gravar
+        monkeypatch.setattr(
+            manager.armazenamento,
+            "gravar",
+            lambda registros, produtos: gravacoes.append(len(registros))
+            or original(registros, produtos),
+        )
+
+        manager.adicionar_produtos_em_lote(
+            {"produto": f"P{i}", "quantidade": 1, "valor": 1} for i in range(100)
+        )
+
+        assert gravacoes == [100]
+        recarregado = ProdutoManager(manager.data_file)
+        assert len(recarregado.produtos) == 100
+        assert recarregado.pesquisar("p99", "exato")[0]["id"] == 100
+
+    def test_lote_vazio_nao_grava(self, manager):
+        """Teste se um lote sem registros válidos não cria o arquivo"""
+        resultado = manager.adicionar_produtos_em_lote([{"produto": ""}])
+
+        assert resultado["adicionados"] == []
+        assert not os.path.exists(manager.data_file)
+
+
+class TestComprarPedido:
+    """Testes para pedidos com vários produtos"""
+
+    @pytest.fixture
+    def manager_estoque(self, manager):
+        """Gerenciador com três produtos em estoque"""
+        manager.adicionar_produto("Mouse", 10, 50.00)
+        manager.adicionar_produto("Teclado", 5, 100.00)
+        manager.adicionar_produto("Monitor", 2, 1000.00)
+        return manager
+
+    def test_pedido_preview(self, manager_estoque):
+        """Teste prévia de pedido não altera o estoque"""
+        pedido = manager_estoque.comprar_produtos([(1, 2), (2, 1)])
+
+        assert [item["total"] for item in pedido["itens"]] == [100.00, 100.00]
+        assert pedido["total"] == 200.00
+        assert pedido["disponivel"] is True
+        assert pedido["confirmado"] is False
+        assert manager_estoque.buscar_produto_por_id(1)["quantidade"] == 10
+
+    def test_pedido_confirmado(self, manager_estoque):
+        """Teste pedido confirmado baixa todos os itens"""
+        pedido = manager_estoque.comprar_produtos([(1, 2), (3, 2), (1, 3)], confirmar=True)
+
+        assert pedido["confirmado"] is True
+        assert pedido["total"] == 2250.00
+        assert pedido["itens"][0]["produto"]["quantidade"] == 5
+        assert manager_estoque.buscar_produto_por_id(1)["quantidade"] == 5
+        assert manager_estoque.buscar_produto_por_id(3)["quantidade"] == 0
+
+        recarregado = ProdutoManager(manager_estoque.data_file)
+        assert recarregado.buscar_produto_por_id(1)["quantidade"] == 5
+
+    def test_pedido_atomico(self, manager_estoque):
+        """Teste se falta de estoque em um item não baixa nenhum"""
+        with pytest.raises(ValueError, match=r"Monitor \(disponível: 2\)"):
+            manager_estoque.comprar_produtos([(1, 2), (3, 3)], confirmar=True)
+
+        assert manager_estoque.buscar_produto_por_id(1)["quantidade"] == 10
+
+    def test_pedido_soma_itens_repetidos(self, manager_estoque):
+        """Teste se itens repetidos somam na conferência de estoque"""
+        pedido = manager_estoque.comprar_produtos([(2, 3), (2, 3)])
+
+        assert all(item["disponivel"] for item in pedido["itens"])
+        assert pedido["disponivel"] is False
+
+    def test_pedido_invalido(self, manager_estoque):
+        """Teste pedidos vazios, com produto inexistente ou quantidade inválida"""
+        with pytest.raises(ValueError, match="ao menos um item"):
+            manager_estoque.comprar_produtos([])
+        with pytest.raises(ValueError, match="Item 2: Produto com ID 99 não encontrado"):
+            manager_estoque.comprar_produtos([(1, 1), (99, 1)], confirmar=True)
+        with pytest.raises(ValueError, match="Item 1: Quantidade deve ser maior que zero"):
+            manager_estoque.comprar_produtos([(1, 0)])
+
+
+class TestIterarProdutos:
+    """Testes da iteração em lotes usada na exportação"""
+
+    @pytest.fixture
+    def manager_cheio(self, manager):
+        """Gerenciador com cinco produtos"""
+        for nome in ["Eva", "Dado", "Caju", "Bola", "Abacate"]:
+            manager.adicionar_produto(nome, 1, 1.0)
+        return manager
+
+    def test_lotes_em_ordem_de_id(self, manager_cheio):
+        """Teste lotes cobrem o catálogo inteiro na ordem de ID"""
+        lotes = list(manager_cheio.iterar_produtos(tamanho_lote=2))
+
+        assert [len(lote) for lote in lotes] == [2, 2, 1]
+        assert [p["id"] for lote in lotes for p in lote] == [1, 2, 3, 4, 5]
+
+    def test_lotes_alfabetica_com_campos(self, manager_cheio):
+        """Teste ordem alfabética com projeção sem o ID"""
+        lotes = manager_cheio.iterar_produtos("alfabetica", ["produto"], tamanho_lote=2)
+        nomes = [p["produto"] for lote in lotes for p in lote]
+
+        assert nomes == ["Abacate", "Bola", "Caju", "Dado", "Eva"]
+
+    def test_lotes_sao_copias(self, manager_cheio):
+        """Teste alterações de estoque não mudam um lote já lido"""
+        lote = next(manager_cheio.iterar_produtos())
+        manager_cheio.comprar_produto(1, 1, confirmar=True)
+
+        assert lote[0]["quantidade"] == 1
+
+    def test_produto_novo_durante_iteracao(self, manager_cheio):
+        """Teste produto cadastrado no meio da iteração é incluído"""
+        lotes = manager_cheio.iterar_produtos(tamanho_lote=5)
+        primeiro = next(lotes)
+        manager_cheio.adicionar_produto("Figo", 1, 1.0)
+
+        assert [p["id"] for p in primeiro + next(lotes)] == [1, 2, 3, 4, 5, 6]
+
+    def test_catalogo_vazio(self, manager):
+        """Teste catálogo vazio não gera lotes"""
+        assert list(manager.iterar_produtos()) == []
+
+    def test_parametros_invalidos(self, manager):
+        """Teste erros são levantados antes da iteração"""
+        with pytest.raises(ValueError, match="Ordem inválida"):
+            manager.iterar_produtos("preco")
+        with pytest.raises(ValueError, match="Campos inválidos"):
+            manager.iterar_produtos(campos=["preco"])
+        with pytest.raises(ValueError, match="Tamanho do lote"):
+            manager.iterar_produtos(tamanho_lote=0)
+
+
+class TestRepresentacaoCompacta:
+    """Testes do uso de Produto no gerenciador"""
+
+    def test_produtos_em_memoria_sao_compactos(self, manager):
+        """Teste dicts atribuídos e cadastrados viram Produto"""
+        manager.produtos = [{"id": 1, "produto": "Cabo", "quantidade": 3, "valor": 9.9}]
+        manager.adicionar_produto("Mouse", 5, 50.0)
+
+        assert all(isinstance(p, Produto) for p in manager.produtos)
+
+    def test_arquivo_mantem_formato(self, manager):
+        """Teste arquivo JSON continua com objetos no formato original"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        manager.comprar_produto(1, 2, confirmar=True)
+
+        with open(manager.data_file, encoding="utf-8") as f:
+            dados = json.load(f)
+        assert dados == [{"id": 1, "produto": "Mouse", "quantidade": 3, "valor": 50.0}]
+
+    def test_compra_retorna_copia(self, manager):
+        """Teste produto do resultado da compra não acompanha o estoque"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        resultado = manager.comprar_produto(1, 2, confirmar=True)
+        manager.comprar_produto(1, 1, confirmar=True)
+
+        assert resultado["produto"]["quantidade"] == 3
+
+
+class TestVersao:
+    """Testes da versão do catálogo"""
+
+    def test_versao_muda_a_cada_alteracao(self, manager):
+        """Teste cadastro, lote, compra e pedido renovam a versão"""
+        versoes = [manager.versao]
+        manager.adicionar_produto("Mouse", 10, 50.0)
+        versoes.append(manager.versao)
+        manager.adicionar_produtos_em_lote([{"produto": "Cabo", "quantidade": 1, "valor": 1}])
+        versoes.append(manager.versao)
+        manager.comprar_produto(1, 1, confirmar=True)
+        versoes.append(manager.versao)
+        manager.comprar_produtos([(1, 1), (2, 1)], confirmar=True)
+        versoes.append(manager.versao)
+
+        assert versoes == sorted(set(versoes))
+
+    def test_leitura_nao_muda_versao(self, manager):
+        """Teste consultas e prévias mantêm a versão"""
+        manager.adicionar_produto("Mouse", 10, 50.0)
+        versao = manager.versao
+        manager.listar_produtos()
+        manager.comprar_produto(1, 1)
+
+        assert manager.versao == versao
+
+    def test_versoes_distintas_entre_instancias(self, manager):
+        """Teste gerenciadores diferentes não compartilham versões"""
+        outro = ProdutoManager(manager.data_file)
+
+        assert outro.versao != manager.versao
+
+
+class TestEstatisticas:
+    """Testes das consultas agregadas sobre o estoque"""
+
+    def test_resumo_vazio(self, manager):
+        """Teste totais sem produtos"""
+        resumo = manager.resumo_estoque()
+
+        assert resumo["produtos"] == 0
+        assert resumo["valor_total"] == 0.0
+        assert resumo["preco_medio"] is None
+        assert manager.histograma_precos() == []
+
+    def test_atualizado_no_cadastro_e_na_compra(self, manager):
+        """Teste totais acompanham cadastros, compras e pedidos"""
+        manager.adicionar_produto("Mouse", 10, 50.0)
+        manager.adicionar_produtos_em_lote(
+            [{"produto": "Teclado", "quantidade": 2, "valor": 100.0}]
+        )
+        assert manager.resumo_estoque()["valor_total"] == 700.0
+
+        manager.comprar_produto(1, 4, confirmar=True)
+        manager.comprar_produtos([(2, 2)], confirmar=True)
+        resumo = manager.resumo_estoque()
+
+        assert resumo["unidades"] == 6
+        assert resumo["sem_estoque"] == 1
+        assert resumo["valor_total"] == 300.0
+        assert resumo["preco_medio"] == 75.0
+
+    def test_estoque_baixo_e_maior_valor(self, manager):
+        """Teste listas de estoque baixo e de maior valor em estoque"""
+        manager.adicionar_produto("Mouse", 3, 50.0)
+        manager.adicionar_produto("Teclado", 1, 100.0)
+        manager.adicionar_produto("Monitor", 8, 900.0)
+
+        assert [p["id"] for p in manager.produtos_estoque_baixo(5)] == [2, 1]
+        assert [p["id"] for p in manager.produtos_estoque_baixo(5, maximo=1)] == [2]
+        assert [p["id"] for p in manager.produtos_maior_valor(2)] == [3, 1]
+
+        manager.comprar_produto(3, 8, confirmar=True)
+        assert [p["id"] for p in manager.produtos_maior_valor(2)] == [1, 2]
+
+        with pytest.raises(ValueError):
+            manager.produtos_maior_valor(0)
+
+    def test_recarregado_com_os_produtos(self, manager):
+        """Teste colunas reconstruídas quando a lista de produtos é substituída"""
+        manager.adicionar_produto("Mouse", 3, 50.0)
+        manager.produtos = [{"id": 7, "produto": "Cabo", "quantidade": 4, "valor": 10.0}]
+
+        assert manager.resumo_estoque()["valor_total"] == 40.0
+        assert [p["id"] for p in manager.produtos_estoque_baixo(5)] == [7]
+
+
+class TestConsultar:
+    """Testes das consultas por faixa de valor e quantidade"""
+
+    @pytest.fixture
+    def catalogo(self, manager):
+        """Gerenciador com cinco produtos"""
+        for nome, quantidade, valor in [
+            ("Mouse", 10, 50.0),
+            ("Teclado", 0, 150.0),
+            ("Monitor", 3, 900.0),
+            ("Cabo", 0, 15.0),
+            ("Headset", 7, 300.0),
+        ]:
+            manager.adicionar_produto(nome, quantidade, valor)
+        return manager
+
+    @staticmethod
+    def ids(resultado):
+        return [p["id"] for p in resultado["produtos"]]
+
+    def test_faixa_de_valor(self, catalogo):
+        """Teste produtos entre dois valores, em ordem de ID e de valor"""
+        assert self.ids(catalogo.consultar_produtos(valor_min=100, valor_max=500)) == [2, 5]
+        resultado = catalogo.consultar_produtos(valor_min=40, ordem="valor")
+        assert self.ids(resultado) == [1, 2, 5, 3]
+        resultado = catalogo.consultar_produtos(valor_max=300, ordem="-valor")
+        assert self.ids(resultado) == [5, 2, 1, 4]
+
+    def test_quantidade_zero(self, catalogo):
+        """Teste produtos sem estoque"""
+        assert self.ids(catalogo.consultar_produtos(quantidade_max=0)) == [2, 4]
+
+    def test_duas_faixas(self, catalogo):
+        """Teste faixas de valor e quantidade combinadas"""
+        resultado = catalogo.consultar_produtos(valor_min=40, quantidade_min=1, ordem="alfabetica")
+        assert self.ids(resultado) == [5, 3, 1]
+
+    def test_indices_atualizados_na_compra(self, catalogo):
+        """Teste compra move o produto no índice de quantidade"""
+        catalogo.comprar_produto(1, 10, confirmar=True)
+        catalogo.comprar_produtos([(5, 5)], confirmar=True)
+
+        assert self.ids(catalogo.consultar_produtos(quantidade_max=0)) == [1, 2, 4]
+        resultado = catalogo.consultar_produtos(quantidade_min=1, ordem="quantidade")
+        assert self.ids(resultado) == [5, 3]
+
+    def test_paginacao(self, catalogo):
+        """Teste páginas por cursor na ordem do índice e em ordem decrescente"""
+        for ordem in ("valor", "-quantidade", "id"):
+            esperado = self.ids(catalogo.consultar_produtos(ordem=ordem))
+            vistos, cursor = [], None
+            while True:
+                pagina = catalogo.consultar_produtos(
+                    valor_min=10, ordem=ordem, limite=2, cursor=cursor
+                )
+                vistos += self.ids(pagina)
+                cursor = pagina["proximo_cursor"]
+                if cursor is None:
+                    break
+            assert vistos == esperado
+
+    def test_campos(self, catalogo):
+        """Teste projeção dos campos"""
+        resultado = catalogo.consultar_produtos(valor_min=900, campos=["produto"])
+        assert resultado == {"produtos": [{"produto": "Monitor"}], "proximo_cursor": None}
+
+    def test_parametros_invalidos(self, catalogo):
+        """Teste ordem, limite e cursor inválidos"""
+        with pytest.raises(ValueError):
+            catalogo.consultar_produtos(ordem="preco")
+        with pytest.raises(ValueError):
+            catalogo.consultar_produtos(limite=0)
+        with pytest.raises(ValueError):
+            catalogo.consultar_produtos(valor_min=1, cursor=99)
+
+
+class TestReservas:
+    """Testes das reservas de estoque entre a prévia e a confirmação"""
+
+    def test_reserva_reduz_disponivel(self, manager):
+        """Teste unidades reservadas não contam para outras compras"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        reserva = manager.reservar_produto(1, 3)
+
+        assert reserva["total"] == 150.0
+        assert reserva["expira_em"] > 0
+        assert manager.comprar_produto(1, 3)["disponivel"] is False
+        with pytest.raises(ValueError, match="Disponível: 2"):
+            manager.comprar_produto(1, 3, confirmar=True)
+        with pytest.raises(ValueError):
+            manager.reservar_produto(1, 3)
+        with pytest.raises(ValueError):
+            manager.comprar_produtos([(1, 3)], confirmar=True)
+        assert manager.buscar_produto_por_id(1)["quantidade"] == 5
+
+    def test_confirmar(self, manager):
+        """Teste confirmação baixa o estoque uma única vez"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        token = manager.reservar_produto(1, 5)["token"]
+
+        resultado = manager.confirmar_reserva(token)
+        assert resultado["confirmado"] is True
+        assert resultado["produto"]["quantidade"] == 0
+        with pytest.raises(ValueError, match="Reserva inexistente"):
+            manager.confirmar_reserva(token)
+
+        recarregado = ProdutoManager(manager.data_file)
+        assert recarregado.buscar_produto_por_id(1)["quantidade"] == 0
+
+    def test_confirmar_confere_produto_e_quantidade(self, manager):
+        """Teste reserva de outro produto ou quantidade não é confirmada nem liberada"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        manager.adicionar_produto("Teclado", 5, 90.0)
+        token = manager.reservar_produto(1, 2)["token"]
+
+        with pytest.raises(ValueError, match="Reserva inexistente"):
+            manager.confirmar_reserva(token, produto_id=2)
+        with pytest.raises(ValueError, match="Reserva inexistente"):
+            manager.confirmar_reserva(token, 1, quantidade=3)
+        assert manager.comprar_produto(1, 4)["disponivel"] is False
+
+        assert manager.confirmar_reserva(token, 1, 2)["produto"]["quantidade"] == 3
+
+    def test_cancelar(self, manager):
+        """Teste cancelamento devolve as unidades"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        token = manager.reservar_produto(1, 4)["token"]
+
+        assert manager.cancelar_reserva(token)
+        assert not manager.cancelar_reserva(token)
+        assert manager.comprar_produto(1, 5)["disponivel"] is True
+
+    def test_vencimento(self, manager):
+        """Teste reserva vencida devolve as unidades e não pode ser confirmada"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        token = manager.reservar_produto(1, 5, ttl=0.05)["token"]
+        assert manager.comprar_produto(1, 1)["disponivel"] is False
+
+        time.sleep(0.06)
+        assert manager.comprar_produto(1, 5)["disponivel"] is True
+        with pytest.raises(ValueError):
+            manager.confirmar_reserva(token)
+
+    def test_reserva_compartilhada_entre_workers(self, tmp_path):
+        """Teste reserva feita em um gerenciador vale nos outros do mesmo arquivo"""
+        arquivo = str(tmp_path / "produtos.json")
+        worker_a = ProdutoManager(arquivo)
+        worker_a.adicionar_produto("Mouse", 5, 50.0)
+        worker_b = ProdutoManager(arquivo)
+        token = worker_a.reservar_produto(1, 4)["token"]
+
+        assert worker_b.comprar_produto(1, 2)["disponivel"] is False
+        with pytest.raises(ValueError, match="Disponível: 1"):
+            worker_b.comprar_produto(1, 2, confirmar=True)
+
+        assert worker_b.confirmar_reserva(token)["produto"]["quantidade"] == 1
+        with pytest.raises(ValueError, match="Reserva inexistente"):
+            worker_a.confirmar_reserva(token)
+        worker_a.fechar()
+        worker_b.fechar()
+
+    def test_parametros_invalidos(self, manager):
+        """Teste produto inexistente, quantidade e validade inválidas"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+
+        with pytest.raises(ValueError):
+            manager.reservar_produto(99, 1)
+        with pytest.raises(ValueError):
+            manager.reservar_produto(1, 0)
+        with pytest.raises(ValueError):
+            manager.reservar_produto(1, 1, ttl=0)
+
+
+class TestEventos:
+    """Testes dos eventos publicados a cada alteração"""
+
+    def _eventos(self, manager, desde):
+        return [(e.tipo, e.dados) for e in manager.eventos.eventos_desde(desde)]
+
+    def test_cadastro_e_compras(self, manager):
+        """Teste eventos de cadastro, compra e pedido"""
+        inicio = manager.eventos.sequencia
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        manager.adicionar_produtos_em_lote([{"produto": "Teclado", "quantidade": 3, "valor": 10}])
+        manager.comprar_produto(1, 2)
+        manager.comprar_produto(1, 2, confirmar=True)
+        manager.comprar_produtos([(2, 1), (1, 1)], confirmar=True)
+
+        assert self._eventos(manager, inicio) == [
+            ("adicionado", {"id": 1, "produto": "Mouse", "quantidade": 5, "valor": 50.0}),
+            ("adicionado", {"id": 2, "produto": "Teclado", "quantidade": 3, "valor": 10.0}),
+            ("comprado", {"id": 1, "quantidade": 3, "disponivel": 3, "comprado": 2}),
+            ("comprado", {"id": 2, "quantidade": 2, "disponivel": 2, "comprado": 1}),
+            ("comprado", {"id": 1, "quantidade": 2, "disponivel": 2, "comprado": 1}),
+        ]
+
+    def test_reservas_alteram_disponivel(self, manager):
+        """Teste reserva e cancelamento publicam o estoque disponível"""
+        manager.adicionar_produto("Mouse", 5, 50.0)
+        inicio = manager.eventos.sequencia
+        token = manager.reservar_produto(1, 4)["token"]
+        manager.cancelar_reserva(token)
+        manager.cancelar_reserva(token)
+
+        assert self._eventos(manager, inicio) == [
+            ("estoque", {"id": 1, "quantidade": 5, "disponivel": 1}),
+            ("estoque", {"id": 1, "quantidade": 5, "disponivel": 5}),
+        ]
+
+    @pytest.mark.parametrize("journal", [True, False])
+    def test_alteracoes_de_outro_processo(self, tmp_path, journal):
+        """Teste alterações aplicadas na sincronização (com ou sem journal) são publicadas"""
+        arquivo = str(tmp_path / "produtos.json")
+        primeiro = ProdutoManager(arquivo, journal=journal)
+        segundo = ProdutoManager(arquivo, journal=journal)
+        inicio = segundo.eventos.sequencia
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+        segundo.sincronizar()
+        primeiro.comprar_produto(1, 4, confirmar=True)
+        segundo.sincronizar()
+
+        # Sem journal, o snapshot relido é comparado com a memória
+        assert self._eventos(segundo, inicio) == [
+            ("adicionado", {"id": 1, "produto": "Mouse", "quantidade": 10, "valor": 50.0}),
+            ("estoque", {"id": 1, "quantidade": 6, "disponivel": 6}),
+        ]
+        primeiro.fechar()
+        segundo.fechar()
+
+
+class TestSincronizar:
+    """Testes da sincronização entre gerenciadores (workers) do mesmo arquivo"""
+
+    @pytest.fixture(params=["json", "journal", "sqlite"])
+    def par(self, request, tmp_path):
+        """Dois gerenciadores sobre o mesmo armazenamento"""
+        arquivo = str(tmp_path / ("produtos.db" if request.param == "sqlite" else "produtos.json"))
+        journal = request.param == "journal"
+        primeiro = ProdutoManager(arquivo, journal=journal)
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+        segundo = ProdutoManager(arquivo, journal=journal)
+        yield primeiro, segundo, request.param
+        primeiro.fechar()
+        segundo.fechar()
+
+    def test_sem_alteracoes(self, par):
+        """Teste sincronizar sem gravações de outros processos"""
+        _, segundo, _ = par
+        versao = segundo.versao
+
+        assert not segundo.sincronizar()
+        assert segundo.versao == versao
+
+    def test_aplica_cadastro_e_compra(self, par):
+        """Teste alterações de outro gerenciador aparecem após sincronizar"""
+        primeiro, segundo, modo = par
+        mouse = segundo.buscar_produto_por_id(1)
+        primeiro.adicionar_produto("Teclado", 5, 100.0)
+        primeiro.comprar_produto(1, 4, confirmar=True)
+
+        assert segundo.sincronizar()
+        assert segundo.buscar_produto_por_id(1)["quantidade"] == 6
+        assert segundo.buscar_produto_por_nome("teclado")["id"] == 2
+        assert [p["id"] for p in segundo.listar_produtos_alfabetica()] == [1, 2]
+        assert segundo.proximo_id == 3
+        assert segundo.resumo_estoque()["valor_total"] == 800.0
+        # O journal aplica as alterações sem recriar os produtos; no SQLite a
+        # busca por ID lê o banco e devolve uma cópia
+        assert (segundo.buscar_produto_por_id(1) is mouse) == (modo == "journal")
+
+    def test_sqlite_consulta_sem_sincronizar(self, tmp_path):
+        """Teste buscas e páginas no SQLite já veem o que outro worker gravou"""
+        arquivo = str(tmp_path / "produtos.db")
+        primeiro = ProdutoManager(arquivo)
+        segundo = ProdutoManager(arquivo)
+        primeiro.adicionar_produto("Teclado", 5, 100.0)
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+
+        assert segundo.buscar_produto_por_id(1)["produto"] == "Teclado"
+        assert segundo.buscar_produto_por_nome("MOUSE")["id"] == 2
+        assert [p["produto"] for p in segundo.listar_produtos_alfabetica(limite=1)] == ["Mouse"]
+        primeiro.fechar()
+        segundo.fechar()
+
+    def test_apos_compactacao(self, tmp_path):
+        """Teste compactação feita por outro gerenciador força releitura completa"""
+        arquivo = str(tmp_path / "produtos.json")
+        primeiro = ProdutoManager(arquivo, journal=True)
+        primeiro.adicionar_produto("Mouse", 10, 50.0)
+        segundo = ProdutoManager(arquivo, journal=True)
+        primeiro.comprar_produto(1, 1, confirmar=True)
+        primeiro.compactar()
+        primeiro.comprar_produto(1, 1, confirmar=True)
+
+        assert segundo.sincronizar()
+        assert segundo.buscar_produto_por_id(1)["quantidade"] == 8
+        primeiro.fechar()
+        segundo.fechar()
+
+
+class TestGravacaoEmGrupo:
+    """Testes da gravação em grupo das alterações"""
+
+    @pytest.fixture(params=["json", "journal", "sqlite"])
+    def arquivo(self, request, tmp_path):
+        """Arquivo de dados e modo journal de cada armazenamento"""
+        nome = "produtos.db" if request.param == "sqlite" else "produtos.json"
+        return str(tmp_path / nome), request.param == "journal"
+
+    def test_compras_confirmadas_estao_gravadas(self, arquivo):
+        """Teste compra só retorna depois de gravada"""
+        data_file, journal = arquivo
+        manager = ProdutoManager(data_file, journal=journal, atraso_gravacao=0.001)
+        manager.adicionar_produto("Mouse", 10, 50.0)
+        manager.comprar_produto(1, 3, confirmar=True)
+        manager.comprar_produtos([(1, 2)], confirmar=True)
+
+        outro = ProdutoManager(data_file, journal=journal)
+        assert outro.buscar_produto_por_id(1)["quantidade"] == 5
+        outro.fechar()
+        manager.fechar()
+
+    def test_compras_concorrentes_compartilham_gravacoes(self, arquivo):
+        """Teste compras simultâneas são gravadas em poucos lotes"""
+        data_file, journal = arquivo
+        manager = ProdutoManager(data_file, journal=journal, atraso_gravacao=0.05)
+        manager.adicionar_produto("Mouse", 100, 50.0)
+        lotes_antes = manager._gravador.lotes_gravados
+
+        threads = [
+            threading.Thread(target=manager.comprar_produto, args=(1, 1, True)) for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert manager._gravador.lotes_gravados - lotes_antes < 20
+        manager.fechar()
+        outro = ProdutoManager(data_file, journal=journal)
+        assert outro.buscar_produto_por_id(1)["quantidade"] == 80
+        outro.fechar()
+
+    def test_falha_na_gravacao_descarta_alteracao(self, tmp_path, monkeypatch):
+        """Teste erro ao gravar o lote é relançado e a memória volta ao gravado"""
+        manager = ProdutoManager(str(tmp_path / "produtos.json"), atraso_gravacao=0)
+        manager.adicionar_produto("Mouse", 10, 50.0)
+
+        def falhar(registros, produtos):
+            raise OSError("disco cheio")
+
+        monkeypatch.setattr(manager.armazenamento, "gravar", falhar)
+        with pytest.raises(OSError):
+            manager.comprar_produto(1, 4, confirmar=True)
+
+        assert manager.buscar_produto_por_id(1)["quantidade"] == 10
+        monkeypatch.undo()
+        manager.fechar()
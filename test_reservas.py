@@ -0,0 +1,113 @@
+"""
+Testes da tabela de reservas de estoque
+"""
+from reservas import TabelaReservas
+
+
+class Relogio:
+    """Relógio controlado pelo teste"""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+class TestTabelaReservas:
+    """Testes de reserva, liberação e vencimento"""
+
+    def test_reservar_e_liberar(self):
+        """Teste total reservado por produto"""
+        tabela = TabelaReservas(ttl_padrao=60, relogio=Relogio())
+        primeira = tabela.reservar(1, 3)
+        tabela.reservar(1, 2)
+        tabela.reservar(2, 1)
+
+        assert tabela.reservado(1) == 5
+        assert tabela.liberar(primeira.token) == primeira
+        assert tabela.liberar(primeira.token) is None
+        assert tabela.reservado(1) == 2
+        assert len(tabela) == 2
+
+    def test_vencimento(self):
+        """Teste reservas vencidas deixam de contar e não podem ser usadas"""
+        relogio = Relogio()
+        tabela = TabelaReservas(ttl_padrao=60, relogio=relogio)
+        curta = tabela.reservar(1, 3, ttl=10)
+        longa = tabela.reservar(1, 2)
+
+        relogio.agora += 10
+        assert tabela.obter(curta.token) is None
+        assert tabela.obter(longa.token) == longa
+        assert tabela.reservado(1) == 2
+        assert tabela.segundos_restantes(longa) == 50
+
+        relogio.agora += 50
+        assert tabela.reservado(1) == 0
+        assert len(tabela) == 0
+
+    def test_entradas_liberadas_ignoradas_no_heap(self):
+        """Teste reserva liberada antes de vencer não é descontada de novo"""
+        relogio = Relogio()
+        tabela = TabelaReservas(ttl_padrao=10, relogio=relogio)
+        reserva = tabela.reservar(1, 3)
+        tabela.liberar(reserva.token)
+        tabela.reservar(1, 4, ttl=20)
+
+        relogio.agora += 15
+        assert tabela.reservado(1) == 4
+
+    def test_muitas_reservas(self):
+        """Teste milhares de reservas vencendo em ordem de vencimento"""
+        relogio = Relogio()
+        tabela = TabelaReservas(relogio=relogio)
+        for i in range(5000):
+            tabela.reservar(i % 10, 1, ttl=1 + i % 100)
+
+        relogio.agora += 50
+        assert len(tabela) == 5000 - 50 * 50
+        assert sum(tabela.reservado(i) for i in range(10)) == len(tabela)
+
+
+class TestReservasCompartilhadas:
+    """Testes das reservas compartilhadas por um log entre processos"""
+
+    def test_reserva_vista_por_outra_tabela(self, tmp_path):
+        """Teste reserva e liberação feitas em uma tabela aparecem na outra"""
+        arquivo = str(tmp_path / "produtos.json.reservas")
+        relogio = Relogio()
+        worker_a = TabelaReservas(60, relogio, arquivo)
+        worker_b = TabelaReservas(60, relogio, arquivo)
+
+        reserva = worker_a.reservar(1, 3)
+        assert worker_b.reservado(1) == 3
+        assert worker_b.obter(reserva.token) == reserva
+
+        assert worker_b.liberar(reserva.token) == reserva
+        assert worker_a.reservado(1) == 0
+        assert worker_a.liberar(reserva.token) is None
+
+        relogio.agora += 60
+        assert TabelaReservas(60, relogio, arquivo).reservado(1) == 0
+
+    def test_compactacao(self, tmp_path, monkeypatch):
+        """Teste log reescrito só com as reservas em aberto"""
+        import reservas
+
+        monkeypatch.setattr(reservas, "LINHAS_COMPACTACAO", 4)
+        arquivo = tmp_path / "produtos.json.reservas"
+        worker_a = TabelaReservas(60, Relogio(), str(arquivo))
+        worker_b = TabelaReservas(60, Relogio(), str(arquivo))
+        aberta = worker_a.reservar(1, 2)
+        for _ in range(5):
+            worker_a.liberar(worker_a.reservar(2, 1).token)
+        assert worker_b.reservado(1) == 2
+        worker_a.reservar(2, 1)
+
+        # 12 operações anexadas; as liberadas saíram na compactação
+        assert len(arquivo.read_bytes().splitlines()) < 12
+        assert worker_b.reservado(1) == 2
+        assert worker_b.reservado(2) == 1
+        assert worker_b.liberar(aberta.token) == aberta
+        assert worker_a.reservado(1) == 0